@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制列式数据包
+图表只需要每个用户的少数数值列，不必解析整个分析JSON：
+文件头为JSON（列名、类型、偏移、字典），其后是按8字节对齐的小端定长数组，
+前端 fetch().arrayBuffer() 后直接创建 TypedArray 视图，不复制、不解析
+"""
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from compact_payload import decode_compact
+from metric_ranks import metric_matrix
+
+DEFAULT_BUNDLE_PATH = "data/analytics_columns.bin"
+BUNDLE_FORMAT = 'columnar-v1'
+MAGIC = b'UPCB'
+ALIGNMENT = 8
+LABEL_FIELDS = ('level', 'type', 'primary_type', 'overall_sentiment')  # 维度的类型标签字段，取第一个存在的
+HOUR_MAX = np.iinfo(np.uint16).max
+
+# numpy类型 -> 文件头中的类型名（与前端 TypedArray 构造函数一一对应）
+DTYPES = {
+    'uint8': np.dtype('<u1'),
+    'uint16': np.dtype('<u2'),
+    'uint32': np.dtype('<u4'),
+    'float32': np.dtype('<f4'),
+    'float64': np.dtype('<f8')
+}
+
+
+def _code_dtype(num_values):
+    return 'uint8' if num_values <= 0xFF else 'uint16' if num_values <= 0xFFFF else 'uint32'
+
+
+def _encode_labels(values):
+    """字符串列字典编码，缺失值编码为字典中的 '未知'"""
+    codes, labels = pd.factorize(pd.Series(values, dtype=object).fillna('未知'))
+    labels = [str(label) for label in labels]
+    return codes.astype(DTYPES[_code_dtype(len(labels))]), labels
+
+
+def dimension_label(dimension):
+    """维度的类型标签（level/type/primary_type/overall_sentiment 中第一个字符串字段），没有时返回None"""
+    if isinstance(dimension, dict):
+        for field in LABEL_FIELDS:
+            if isinstance(dimension.get(field), str):
+                return dimension[field]
+    return None
+
+
+def user_hour_matrix(messages_df, user_ids):
+    """用户×24小时 的消息数矩阵（uint16，超出上限截断），行顺序与 user_ids 一致"""
+    rows = pd.Index(pd.Series(user_ids).astype(str)).get_indexer(messages_df['user_id'].astype(str))
+    hours = pd.to_numeric(messages_df['hour'], errors='coerce').to_numpy()
+    valid = (rows >= 0) & ~np.isnan(hours)
+    counts = np.bincount(rows[valid] * 24 + hours[valid].astype(np.int64), minlength=len(user_ids) * 24)
+    return np.minimum(counts.reshape(len(user_ids), 24), HOUR_MAX).astype(DTYPES['uint16'])
+
+
+def _hours_from_profiles(users_data):
+    """画像中自带 time_pattern.hour_distribution 时（旧版数据文件）从中取小时分布"""
+    matrix = np.zeros((len(users_data), 24), dtype=np.int64)
+    for row, user in enumerate(users_data):
+        hours = user.get('dimensions', {}).get('time_pattern', {}).get('hour_distribution') or {}
+        items = enumerate(hours) if isinstance(hours, list) else hours.items()
+        for hour, count in items:
+            matrix[row, int(hour)] = count
+    return np.minimum(matrix, HOUR_MAX).astype(DTYPES['uint16'])
+
+
+def build_columns(users_data, hour_matrix=None):
+    """把用户画像整理为列：{列名: 定长数组}，以及标签列的字典"""
+    num_users = len(users_data)
+    columns = {
+        'user_id': pd.to_numeric(pd.Series([user['user_id'] for user in users_data], dtype=object),
+                                 errors='coerce').to_numpy(dtype=DTYPES['float64']),
+        'message_count': np.array([user.get('message_count', 0) for user in users_data], dtype=DTYPES['uint32'])
+    }
+    dictionaries = {}
+
+    columns['main_group'], dictionaries['groups'] = _encode_labels([user.get('main_group') for user in users_data])
+
+    # 所属群组为变长列表：CSR 形式（偏移 + 群组编码），与 main_group 共用 groups 字典
+    groups = dictionaries['groups']
+    group_index = {group: code for code, group in enumerate(groups)}
+    # 与前端按群组筛选一致：有 all_groups 列表时用它，否则用 main_group
+    memberships = [
+        [group for group in user['all_groups'] if isinstance(group, str)] if isinstance(user.get('all_groups'), list)
+        else [user['main_group']] if isinstance(user.get('main_group'), str) else []
+        for user in users_data
+    ]
+    for group in {group for member in memberships for group in member} - set(group_index):
+        group_index[group] = len(groups)
+        groups.append(group)
+    columns['main_group'] = columns['main_group'].astype(DTYPES[_code_dtype(len(groups))])
+    columns['group_offsets'] = np.concatenate([[0], np.cumsum([len(member) for member in memberships])]).astype(DTYPES['uint32'])
+    columns['group_codes'] = np.array([group_index[group] for member in memberships for group in member],
+                                      dtype=DTYPES[_code_dtype(len(groups))])
+
+    dimension_names = sorted({name for user in users_data for name in user.get('dimensions', {})})
+    for name in dimension_names:
+        labels = [dimension_label(user.get('dimensions', {}).get(name)) for user in users_data]
+        if any(label is not None for label in labels):
+            columns[name], dictionaries[name] = _encode_labels(labels)
+
+    matrix, names = metric_matrix(users_data)
+    for column, name in enumerate(names):
+        if name != 'message_count':
+            columns[name] = matrix[:, column].astype(DTYPES['float32'])
+
+    columns['hours'] = hour_matrix if hour_matrix is not None else _hours_from_profiles(users_data)
+    assert columns['hours'].shape == (num_users, 24), 'hour_matrix 行数必须与用户数一致'
+    return columns, dictionaries
+
+
+def save_bundle(users_data, path=DEFAULT_BUNDLE_PATH, hour_matrix=None):
+    """写入列式数据包：MAGIC + uint32文件头长度 + JSON文件头 + 对齐的列数据"""
+    columns, dictionaries = build_columns(users_data, hour_matrix)
+    layout, offset = [], 0
+    for name, values in columns.items():
+        dtype = next(key for key, value in DTYPES.items() if value == values.dtype)
+        layout.append({'name': name, 'dtype': dtype, 'offset': offset, 'length': int(values.size),
+                       'shape': list(values.shape)})
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = {'format': BUNDLE_FORMAT, 'num_users': len(users_data), 'dictionaries': dictionaries, 'columns': layout}
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+    header_bytes = header_bytes.ljust(data_start - len(MAGIC) - 4, b' ')
+
+    bundle_dir = os.path.dirname(path)
+    if bundle_dir:
+        os.makedirs(bundle_dir, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for column in layout:
+            f.seek(data_start + column['offset'])  # 偏移相对数据区起点，按8字节对齐
+            f.write(np.ascontiguousarray(columns[column['name']]).tobytes())
+    print(f"列式数据包已保存到 {path}：{len(users_data)} 个用户，{len(layout)} 列，{os.path.getsize(path) / 1024:.1f}KB")
+
+
+def load_bundle(path=DEFAULT_BUNDLE_PATH):
+    """读取列式数据包，返回 (文件头, {列名: 数组})；数组是文件缓冲区上的只读视图"""
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} 不是列式数据包')
+    header_length = struct.unpack_from('<I', buffer, len(MAGIC))[0]
+    data_start = len(MAGIC) + 4 + header_length
+    header = json.loads(buffer[len(MAGIC) + 4:data_start].decode('utf-8'))
+    if header.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"不支持的数据包格式: {header.get('format')}")
+
+    columns = {}
+    for column in header['columns']:
+        values = np.frombuffer(buffer, dtype=DTYPES[column['dtype']], count=column['length'],
+                               offset=data_start + column['offset'])
+        columns[column['name']] = values.reshape(column['shape'])
+    return header, columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='二进制列式数据包：从分析JSON生成或查看')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='从分析数据JSON生成列式数据包')
+    build_parser.add_argument('input', nargs='?', default='data/analytics_with_content_types.json')
+    build_parser.add_argument('-o', '--output', default=DEFAULT_BUNDLE_PATH)
+
+    info_parser = subparsers.add_parser('info', help='查看数据包中的列')
+    info_parser.add_argument('path', nargs='?', default=DEFAULT_BUNDLE_PATH)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        with open(args.input, 'r', encoding='utf-8') as f:
+            # 分析JSON可能已转换为紧凑格式，先还原字典编码
+            save_bundle(decode_compact(json.load(f))['users'], args.output)
+    else:
+        header, columns = load_bundle(args.path)
+        print(f"{header['format']}：{header['num_users']} 个用户")
+        for name, values in columns.items():
+            labels = header['dictionaries'].get(name)
+            suffix = f"，字典 {len(labels)} 项" if labels else ''
+            print(f"  {name:<20} {str(values.dtype):<8} {str(values.shape):<14} {values.nbytes / 1024:>8.1f}KB{suffix}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的分析数据格式
+用户记录中反复出现的群组名、标签、类型标签改为字典编码的整数，24小时分布改为定长整数数组，
+输出不缩进；前端 decodeCompactPayload 原地还原字典编码，其余代码无需改动
+"""
+
+import argparse
+import copy
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+COMPACT_FORMAT = 'compact-v1'
+LABEL_KEYS = ('type', 'level', 'primary_type', 'secondary_type', 'overall_sentiment', 'description')
+HOURS = [str(hour) for hour in range(24)]
+CODEC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'payload-codec.js')
+
+# 在node（与Chrome同为V8）中计时 JSON.parse 与前端 decodeCompactPayload；每次重新解析，因为解码是原地替换
+_NODE_BENCHMARK = r'''
+const fs = require('fs');
+const vm = require('vm');
+vm.runInThisContext(fs.readFileSync(process.argv[1], 'utf8'));
+const repeat = Number(process.argv[2]);
+const result = {};
+for (const path of process.argv.slice(3)) {
+    const text = fs.readFileSync(path, 'utf8');
+    let parse = Infinity, total = Infinity;
+    for (let i = 0; i < repeat; i++) {
+        let start = process.hrtime.bigint();
+        JSON.parse(text);
+        parse = Math.min(parse, Number(process.hrtime.bigint() - start) / 1e6);
+        start = process.hrtime.bigint();
+        decodeCompactPayload(JSON.parse(text));
+        total = Math.min(total, Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    result[path] = [parse, total];
+}
+console.log(JSON.stringify(result));
+'''
+
+
+class _Dictionary:
+    """字符串 -> 整数编码，编码顺序即首次出现顺序"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _encode_dimension(dimension, labels):
+    """单个维度：类型标签字段转为编码，完整的24小时分布转为数组"""
+    encoded = dict(dimension)
+    for key in LABEL_KEYS:
+        if isinstance(dimension.get(key), str):
+            encoded[key] = labels.encode(dimension[key])
+    hours = dimension.get('hour_distribution')
+    if isinstance(hours, dict) and sorted(hours) == sorted(HOURS):
+        encoded['hour_distribution'] = [hours[hour] for hour in HOURS]
+    return encoded
+
+
+def _decode_dimension(dimension, labels):
+    decoded = dict(dimension)
+    for key in LABEL_KEYS:
+        code = dimension.get(key)
+        if isinstance(code, int) and not isinstance(code, bool):
+            decoded[key] = labels[code]
+    hours = dimension.get('hour_distribution')
+    if isinstance(hours, list):
+        decoded['hour_distribution'] = dict(zip(HOURS, hours))
+    return decoded
+
+
+def encode_compact(data):
+    """把分析数据转换为紧凑格式；只改写用户记录中固定位置的字段，stats 等部分原样保留"""
+    groups, tags, labels = _Dictionary(), _Dictionary(), _Dictionary()
+    users = []
+    for user in data['users']:
+        encoded = dict(user)
+        if isinstance(user.get('main_group'), str):
+            encoded['main_group'] = groups.encode(user['main_group'])
+        if isinstance(user.get('all_groups'), list):
+            encoded['all_groups'] = [groups.encode(group) for group in user['all_groups']]
+        if isinstance(user.get('dimensions'), dict):
+            encoded['dimensions'] = {
+                name: _encode_dimension(dimension, labels) if isinstance(dimension, dict) else dimension
+                for name, dimension in user['dimensions'].items()
+            }
+        summary = user.get('profile_summary')
+        if isinstance(summary, dict):
+            encoded['profile_summary'] = _encode_dimension(summary, labels)
+            if isinstance(summary.get('tags'), list):
+                encoded['profile_summary']['tags'] = [tags.encode(tag) for tag in summary['tags']]
+        users.append(encoded)
+
+    compact = {key: value for key, value in data.items() if key != 'users'}
+    compact['format'] = COMPACT_FORMAT
+    compact['dictionaries'] = {'groups': groups.values, 'tags': tags.values, 'labels': labels.values}
+    compact['users'] = users
+    return compact
+
+
+def decode_compact(compact):
+    """紧凑格式还原为原始结构，用于校验；前端 decodeCompactPayload 只还原字典编码，24小时分布保持数组"""
+    if compact.get('format') != COMPACT_FORMAT:
+        return compact
+    dictionaries = compact['dictionaries']
+    groups, tags, labels = dictionaries['groups'], dictionaries['tags'], dictionaries['labels']
+
+    users = []
+    for encoded in compact['users']:
+        user = dict(encoded)
+        if isinstance(encoded.get('main_group'), int):
+            user['main_group'] = groups[encoded['main_group']]
+        if isinstance(encoded.get('all_groups'), list):
+            user['all_groups'] = [groups[code] for code in encoded['all_groups']]
+        if isinstance(encoded.get('dimensions'), dict):
+            user['dimensions'] = {
+                name: _decode_dimension(dimension, labels) if isinstance(dimension, dict) else dimension
+                for name, dimension in encoded['dimensions'].items()
+            }
+        summary = encoded.get('profile_summary')
+        if isinstance(summary, dict):
+            user['profile_summary'] = _decode_dimension(summary, labels)
+            if isinstance(summary.get('tags'), list):
+                user['profile_summary']['tags'] = [tags[code] for code in summary['tags']]
+        users.append(user)
+
+    data = {key: value for key, value in compact.items() if key not in ('format', 'dictionaries', 'users')}
+    data['users'] = users
+    return data
+
+
+def dumps_compact(data):
+    return json.dumps(encode_compact(data), ensure_ascii=False, separators=(',', ':'))
+
+
+def save_compact(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(dumps_compact(data))
+    print(f"紧凑格式数据已保存到 {path}")
+
+
+def scale_users(data, factor):
+    """复制用户（改写user_id）模拟 factor 倍用户量"""
+    users = []
+    for copy_index in range(factor):
+        for user in data['users']:
+            scaled = copy.deepcopy(user)
+            scaled['user_id'] = f"{user['user_id']}{copy_index:03d}" if copy_index else user['user_id']
+            users.append(scaled)
+    return {**data, 'users': users}
+
+
+def _parse_seconds(text, decode=None, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parsed = json.loads(text)
+        if decode is not None:
+            decode(parsed)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _node_seconds(texts, repeat=3):
+    """用node计时各文本的 (JSON.parse, JSON.parse + decodeCompactPayload)，单位毫秒"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i, text in enumerate(texts):
+            paths.append(os.path.join(tmp_dir, f"{i}.json"))
+            with open(paths[-1], 'w', encoding='utf-8') as f:
+                f.write(text)
+        output = subprocess.run(['node', '-e', _NODE_BENCHMARK, CODEC_SCRIPT, str(repeat), *paths],
+                                capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output)
+    return [timings[path] for path in paths]
+
+
+def benchmark(path, factors=(1, 10, 100), node=False):
+    """对比现有文件格式（缩进JSON）、不缩进JSON和紧凑格式的体积与解析耗时
+
+    Python列的解码用本模块的参考实现（重建字典）；node=True 时另外在node（V8）中计时
+    JSON.parse 与前端 decodeCompactPayload。每个用户量最后一行给出紧凑格式相对不缩进JSON的比值：
+    紧凑格式只在体积上占优，解析+解码并不比直接解析不缩进JSON快
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    if node and shutil.which('node') is None:
+        print("未找到node，跳过前端解码计时")
+        node = False
+
+    header = f"{'用户数':>8} {'格式':<10} {'体积(KB)':>10} {'gzip(KB)':>10} {'解析(ms)':>10} {'解析+解码(ms)':>14}"
+    if node:
+        header += f" {'V8解析(ms)':>12} {'V8解析+解码(ms)':>16}"
+    print(header)
+    for factor in factors:
+        data = scale_users(base, factor)
+        compact_text = dumps_compact(data)
+        assert decode_compact(json.loads(compact_text)) == data, '紧凑格式还原结果与原数据不一致'
+        variants = [
+            ('当前格式', json.dumps(data, ensure_ascii=False, indent=2), None),
+            ('不缩进', json.dumps(data, ensure_ascii=False, separators=(',', ':')), None),
+            ('紧凑格式', compact_text, decode_compact)
+        ]
+        node_timings = _node_seconds([text for _, text, _ in variants]) if node else [None] * len(variants)
+
+        rows = []
+        for (name, text, decode), node_timing in zip(variants, node_timings):
+            raw = text.encode('utf-8')
+            parse_ms = _parse_seconds(text) * 1000
+            decode_ms = _parse_seconds(text, decode) * 1000 if decode else parse_ms
+            row = [len(raw), len(gzip.compress(raw, 6)), parse_ms, decode_ms] + (node_timing or [])
+            rows.append(row)
+            line = (f"{len(data['users']):>8} {name:<10} {row[0] / 1024:>10.1f} "
+                    f"{row[1] / 1024:>10.1f} {parse_ms:>10.1f} {decode_ms:>14.1f}")
+            if node_timing:
+                line += f" {node_timing[0]:>12.1f} {node_timing[1]:>16.1f}"
+            print(line)
+
+        # 紧凑格式 / 不缩进JSON：小于1表示紧凑格式更小或更快
+        ratios = [compact / minified for compact, minified in zip(rows[2], rows[1])]
+        line = (f"{'':>8} {'紧凑/不缩进':<10} {ratios[0]:>10.2f} {ratios[1]:>10.2f} "
+                f"{ratios[2]:>10.2f} {ratios[3]:>14.2f}")
+        if node:
+            line += f" {ratios[4]:>12.2f} {ratios[5]:>16.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='紧凑分析数据格式：转换与基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    encode_parser = subparsers.add_parser('encode', help='把分析数据JSON转换为紧凑格式')
+    encode_parser.add_argument('input', help='输入JSON')
+    encode_parser.add_argument('-o', '--output', help='输出路径，默认在输入文件名后加 .compact')
+
+    bench_parser = subparsers.add_parser('benchmark', help='对比体积与解析耗时')
+    bench_parser.add_argument('input', nargs='?', default='data/analytics_with_content_types.json')
+    bench_parser.add_argument('--factors', default='1,10,100', help='用户量倍数，逗号分隔')
+    bench_parser.add_argument('--node', action='store_true', help='同时用node计时前端解码（需要node）')
+
+    args = parser.parse_args()
+    if args.command == 'encode':
+        with open(args.input, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        root, ext = os.path.splitext(args.input)
+        save_compact(data, args.output or f"{root}.compact{ext}")
+    else:
+        benchmark(args.input, [int(factor) for factor in args.factors.split(',')], args.node)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,22 @@
 基于关键词匹配和用户行为特征进行智能分类
 """
 
+import heapq
 import json
 import random
 import re
 from collections import defaultdict, Counter
 
+import numpy as np
+
+from count_cube import DEFAULT_CUBE_CELLS_PATH, DEFAULT_CUBE_PATH, rebuild_cube
+from snapshot_delta import DEFAULT_DELTA_PATH, record_snapshot
+
+# 表情符号字符范围（预编译，避免每个用户重复编译）
+EMOJI_CHARS = '\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF'
+EMOJI_PATTERN = re.compile(f'[{EMOJI_CHARS}]')
+QUESTION_CHARS = ('?', '？')
+
 class ContentTypeClassifier:
     def __init__(self):
         # 发言类型关键词定义
@@ -67,6 +78,37 @@ class ContentTypeClassifier:
             '社会技巧型': 0.03
         }
 
+        self.content_types = list(self.content_type_keywords)
+        self._build_matcher()
+
+    def _build_matcher(self):
+        """构建覆盖全部类型关键词、问号和表情的单一匹配器
+
+        使用零宽先行断言在每个位置匹配最长的候选串；较短的候选串若是它的子串，
+        其类型位已合并进该候选串的掩码，因此结果与逐类型子串查找完全一致。
+        """
+        keyword_types = defaultdict(int)
+        for type_index, content_type in enumerate(self.content_types):
+            for keyword in self.content_type_keywords[content_type]:
+                keyword_types[keyword.lower()] |= 1 << type_index
+
+        candidates = set(keyword_types) | set(QUESTION_CHARS)
+        self.match_info = {}
+        for candidate in candidates:
+            type_mask = 0
+            for keyword, mask in keyword_types.items():
+                if keyword in candidate:
+                    type_mask |= mask
+            self.match_info[candidate] = (
+                type_mask,
+                candidate[0] in QUESTION_CHARS,
+                bool(EMOJI_PATTERN.match(candidate[0]))
+            )
+
+        alternatives = sorted(candidates, key=len, reverse=True)
+        pattern = '|'.join(re.escape(candidate) for candidate in alternatives)
+        self.matcher = re.compile(f'(?=({pattern}|[{EMOJI_CHARS}]))')
+
     def has_keywords(self, text, keywords):
         """检查文本中是否包含关键词"""
         if not text:
@@ -113,8 +155,6 @@ class ContentTypeClassifier:
         questions = 0
         emoji_count = 0
 
-        emoji_pattern = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]')
-
         for message in messages:
             if isinstance(message, dict):
                 text = message.get('content', '')
@@ -124,7 +164,7 @@ class ContentTypeClassifier:
             total_length += len(text)
             if '?' in text or '？' in text:
                 questions += 1
-            emoji_count += len(emoji_pattern.findall(text))
+            emoji_count += len(EMOJI_PATTERN.findall(text))
 
         total_messages = len(messages)
         patterns['avg_length'] = total_length / total_messages
@@ -133,41 +173,109 @@ class ContentTypeClassifier:
 
         return patterns
 
+    def scan_message(self, text):
+        """单次扫描消息，返回 (类型位掩码, 是否提问, 表情数)"""
+        type_mask = 0
+        is_question = False
+        emoji_count = 0
+        for match in self.matcher.finditer(text.lower()):
+            matched = match.group(1)
+            info = self.match_info.get(matched)
+            if info is None:
+                # 非关键词的表情字符
+                emoji_count += 1
+                continue
+            type_mask |= info[0]
+            is_question = is_question or info[1]
+            emoji_count += info[2]
+        return type_mask, is_question, emoji_count
+
+    def compute_score_matrix(self, users):
+        """批量计算 用户×类型 得分矩阵（已应用模式加权）
+
+        返回 (scores, has_messages)：scores 形状为 (用户数, 类型数)，
+        has_messages 标记哪些用户有样本消息
+        """
+        num_users = len(users)
+        num_types = len(self.content_types)
+
+        user_indices = []
+        type_masks = []
+        questions = []
+        emojis = []
+        lengths = []
+
+        for user_index, user in enumerate(users):
+            for message in user.get('sample_messages', []) or []:
+                text = message.get('content', '') if isinstance(message, dict) else str(message)
+                text = text or ''
+                type_mask, is_question, emoji_count = self.scan_message(text)
+                user_indices.append(user_index)
+                type_masks.append(type_mask)
+                questions.append(is_question)
+                emojis.append(emoji_count)
+                lengths.append(len(text))
+
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        message_counts = np.bincount(user_indices, minlength=num_users).astype(float)
+        has_messages = message_counts > 0
+        safe_counts = np.where(has_messages, message_counts, 1.0)
+
+        # 每条消息的类型命中位展开为 (消息数, 类型数)，再按用户求和
+        type_bits = (np.asarray(type_masks, dtype=np.int64)[:, None] >> np.arange(num_types)) & 1
+        scores = np.zeros((num_users, num_types))
+        for type_index in range(num_types):
+            scores[:, type_index] = np.bincount(user_indices, weights=type_bits[:, type_index], minlength=num_users)
+        scores /= safe_counts[:, None]
+
+        avg_length = np.bincount(user_indices, weights=np.asarray(lengths, dtype=float), minlength=num_users) / safe_counts
+        question_ratio = np.bincount(user_indices, weights=np.asarray(questions, dtype=float), minlength=num_users) / safe_counts
+        emoji_ratio = np.bincount(user_indices, weights=np.asarray(emojis, dtype=float), minlength=num_users) / safe_counts
+
+        # 基于模式调整分数（向量化）
+        column = {content_type: i for i, content_type in enumerate(self.content_types)}
+        scores[emoji_ratio > 0.3, column['表情包型']] *= 2
+        question_heavy = question_ratio > 0.4
+        scores[question_heavy, column['考试型']] *= 1.5
+        scores[question_heavy, column['学习方法型']] *= 1.5
+        long_messages = avg_length > 50
+        scores[long_messages, column['技术型']] *= 1.3
+        scores[long_messages, column['学习方法型']] *= 1.3
+
+        return scores, has_messages
+
+    def classify_users(self, users, score_matrix=None):
+        """批量为用户分类内容类型
+
+        score_matrix: 可选，compute_score_matrix 的返回值，避免重复计算
+        """
+        scores, has_messages = score_matrix if score_matrix is not None else self.compute_score_matrix(users)
+        best_indices = scores.argmax(axis=1)
+        results = []
+
+        for user_index, user in enumerate(users):
+            if not has_messages[user_index]:
+                # 如果没有消息，基于用户名或其他特征进行简单分类
+                results.append(self.fallback_classification(user))
+                continue
+
+            user_scores = scores[user_index]
+            if user_scores[best_indices[user_index]] > 0:
+                best_type = self.content_types[best_indices[user_index]]
+            else:
+                # 如果没有匹配，随机分配一个类型
+                best_type = random.choice(self.content_types)
+
+            results.append({
+                'type': best_type,
+                'scores': {content_type: float(score) for content_type, score in zip(self.content_types, user_scores)}
+            })
+
+        return results
+
     def classify_user_content_type(self, user):
         """为单个用户分类内容类型"""
-        messages = user.get('sample_messages', [])
-        if not messages:
-            # 如果没有消息，基于用户名或其他特征进行简单分类
-            return self.fallback_classification(user)
-
-        scores = {}
-        for content_type in self.content_type_keywords:
-            scores[content_type] = self.calculate_keyword_score(messages, content_type)
-
-        # 分析消息模式
-        patterns = self.analyze_message_patterns(messages)
-
-        # 基于模式调整分数
-        if patterns['emoji_ratio'] > 0.3:
-            scores['表情包型'] *= 2
-        if patterns['question_ratio'] > 0.4:
-            scores['考试型'] *= 1.5
-            scores['学习方法型'] *= 1.5
-        if patterns['avg_length'] > 50:
-            scores['技术型'] *= 1.3
-            scores['学习方法型'] *= 1.3
-
-        # 选择得分最高的类型
-        if max(scores.values()) > 0:
-            best_type = max(scores, key=scores.get)
-        else:
-            # 如果没有匹配，随机分配一个类型
-            best_type = random.choice(list(self.content_type_keywords.keys()))
-
-        return {
-            'type': best_type,
-            'scores': scores
-        }
+        return self.classify_users([user])[0]
 
     def fallback_classification(self, user):
         """备用分类方法"""
@@ -183,15 +291,68 @@ class ContentTypeClassifier:
             # 随机分配
             return {'type': random.choice(list(self.content_type_keywords.keys()))}
 
-    def ensure_balanced_distribution(self, users):
-        """确保各类型分布均衡"""
+    def rebalance_assignments(self, assignments, scores, target_counts, receivers=None):
+        """基于得分矩阵的确定性重平衡
+
+        assignments: 每个用户当前类型的列索引；scores: 用户×类型得分矩阵；
+        target_counts: 每列的目标人数；receivers: 可以接收用户的列（布尔数组），默认全部列。
+        只把超额类型中的用户移到不足类型，
+        每个不足类型维护一个按得分损失排序的候选队列，全局按损失从小到大依次移动，
+        复杂度 O(n·k·log n)。返回新的 assignments 和移动列表 [(用户, 原类型, 新类型)]。
+        """
+        assignments = np.asarray(assignments).copy()
+        num_types = scores.shape[1]
+        counts = np.bincount(assignments, minlength=num_types)
+        excess = np.maximum(counts - target_counts, 0)
+        deficit = np.maximum(target_counts - counts, 0)
+        if receivers is not None:
+            deficit = np.where(receivers, deficit, 0)
+
+        candidates = np.flatnonzero(excess[assignments] > 0)
+        if len(candidates) == 0 or deficit.sum() == 0:
+            return assignments, []
+
+        current_scores = scores[candidates, assignments[candidates]]
+
+        # 每个不足类型的候选队列：按 (得分损失, 用户序号) 排序
+        queues = {}
+        for type_index in np.flatnonzero(deficit > 0):
+            losses = current_scores - scores[candidates, type_index]
+            order = np.lexsort((candidates, losses))
+            queues[type_index] = (losses[order], candidates[order])
+
+        heap = [(queue[0][0], int(queue[1][0]), int(t), 0) for t, queue in queues.items()]
+        heapq.heapify(heap)
+        moved = np.zeros(len(assignments), dtype=bool)
+        moves = []
+
+        while heap:
+            loss, user_index, type_index, position = heapq.heappop(heap)
+            source_type = assignments[user_index]
+
+            if deficit[type_index] == 0:
+                continue  # 该类型已补足，丢弃其队列
+            if not moved[user_index] and excess[source_type] > 0:
+                assignments[user_index] = type_index
+                moved[user_index] = True
+                excess[source_type] -= 1
+                deficit[type_index] -= 1
+                moves.append((user_index, source_type, type_index))
+
+            losses, users = queues[type_index]
+            if position + 1 < len(users) and deficit[type_index] > 0:
+                heapq.heappush(heap, (losses[position + 1], int(users[position + 1]), type_index, position + 1))
+
+        return assignments, moves
+
+    def ensure_balanced_distribution(self, users, scores=None):
+        """确保各类型分布均衡（按得分损失最小的原则确定性地重分配）
+
+        scores: compute_score_matrix 得到的得分矩阵；未提供时从用户的 content_type.scores 中读取
+        """
         total_users = len(users)
-        current_distribution = defaultdict(int)
-
-        # 统计当前分布
-        for user in users:
-            content_type = user['dimensions']['content_type']['type']
-            current_distribution[content_type] += 1
+        current_types = [user['dimensions']['content_type']['type'] for user in users]
+        current_distribution = Counter(current_types)
 
         print(f"当前分布: {dict(current_distribution)}")
 
@@ -202,39 +363,43 @@ class ContentTypeClassifier:
 
         print(f"目标分布: {target_counts}")
 
-        # 重新分配过多的用户
-        for content_type, current_count in current_distribution.items():
-            target_count = target_counts.get(content_type, 10)
+        # 不在目标表中的类型（如"未知"）追加为得分为0的列：超过默认值10人时可以移出，但不会接收用户
+        columns = self.content_types + sorted(set(current_distribution) - set(self.content_types))
+        column_index = {content_type: i for i, content_type in enumerate(columns)}
+
+        score_matrix = np.zeros((total_users, len(columns)))
+        if scores is not None:
+            score_matrix[:, :scores.shape[1]] = scores
+        else:
+            for user_index, user in enumerate(users):
+                for content_type, score in (user['dimensions']['content_type'].get('scores') or {}).items():
+                    if content_type in column_index:
+                        score_matrix[user_index, column_index[content_type]] = score
 
-            if current_count > target_count:
-                # 找出需要重新分类的用户
-                users_of_this_type = [u for u in users if u['dimensions']['content_type']['type'] == content_type]
-                excess_count = current_count - target_count
+        targets = np.array([target_counts.get(content_type, 10) for content_type in columns])
+        assignments = np.array([column_index[content_type] for content_type in current_types], dtype=np.int64)
 
-                # 随机选择需要重新分类的用户
-                random.shuffle(users_of_this_type)
+        receivers = np.array([content_type in target_counts for content_type in columns])
 
-                for i in range(min(excess_count, len(users_of_this_type))):
-                    user = users_of_this_type[i]
+        _, moves = self.rebalance_assignments(assignments, score_matrix, targets, receivers)
 
-                    # 找一个需要更多用户的类型
-                    needed_types = [ct for ct, target in target_counts.items()
-                                  if current_distribution[ct] < target]
+        move_summary = Counter()
+        for user_index, source_type, target_type in moves:
+            users[user_index]['dimensions']['content_type']['type'] = columns[target_type]
+            move_summary[(columns[source_type], columns[target_type])] += 1
 
-                    if needed_types:
-                        new_type = random.choice(needed_types)
-                        user['dimensions']['content_type']['type'] = new_type
-                        current_distribution[content_type] -= 1
-                        current_distribution[new_type] += 1
-                        try:
-                            print(f"用户重分类: {content_type} -> {new_type}")
-                        except UnicodeEncodeError:
-                            print(f"用户重分类: {content_type} -> {new_type}")
+        for (source_type, target_type), count in sorted(move_summary.items()):
+            print(f"用户重分类: {source_type} -> {target_type} × {count}")
 
         return users
 
-    def process_users(self, input_file, output_file):
-        """处理用户数据，重新分类内容类型"""
+    def process_users(self, input_file, output_file, delta_path=None, cells_path=None, cube_path=DEFAULT_CUBE_PATH):
+        """处理用户数据，重新分类内容类型
+
+        delta_path: 快照增量记录文件；提供时与上一版比较记录增量，版本号写入 metadata.snapshot_version
+        cells_path: 立方体单元格计数文件；提供时按重分类后的类型重建数据立方体（cube_path），
+                    /api/cube 的发言类型与仪表板一致
+        """
         try:
             # 读取原始数据
             with open(input_file, 'r', encoding='utf-8') as f:
@@ -242,14 +407,10 @@ class ContentTypeClassifier:
 
             print(f"开始处理 {len(data['users'])} 个用户...")
 
-            # 重新分类每个用户
-            for i, user in enumerate(data['users']):
-                if i % 20 == 0:
-                    print(f"处理进度: {i}/{len(data['users'])}")
-
-                # 分类内容类型
-                content_type_result = self.classify_user_content_type(user)
-
+            # 批量重新分类所有用户
+            score_matrix = self.compute_score_matrix(data['users'])
+            content_type_results = self.classify_users(data['users'], score_matrix)
+            for user, content_type_result in zip(data['users'], content_type_results):
                 # 更新用户数据
                 if 'dimensions' not in user:
                     user['dimensions'] = {}
@@ -257,7 +418,7 @@ class ContentTypeClassifier:
                 user['dimensions']['content_type'] = content_type_result
 
             # 确保分布均衡
-            data['users'] = self.ensure_balanced_distribution(data['users'])
+            data['users'] = self.ensure_balanced_distribution(data['users'], score_matrix[0])
 
             # 更新统计信息
             content_type_dist = Counter()
@@ -267,6 +428,13 @@ class ContentTypeClassifier:
 
             data['stats']['content_type_distribution'] = dict(content_type_dist)
 
+            if cells_path:
+                rebuild_cube(data['users'], cells_path, cube_path)
+
+            # 增量按仪表板实际加载的数据（重分类之后）记录，轮询合并时不会覆盖重分类结果
+            if delta_path:
+                data.setdefault('metadata', {})['snapshot_version'] = record_snapshot(data, delta_path)
+
             # 保存结果
             with open(output_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
@@ -288,7 +456,7 @@ def main():
     output_file = "data/analytics_with_content_types.json"
 
     print("开始发言类型重分类...")
-    result = classifier.process_users(input_file, output_file)
+    result = classifier.process_users(input_file, output_file, DEFAULT_DELTA_PATH, DEFAULT_CUBE_CELLS_PATH)
     print("分类完成！")
 
 if __name__ == "__main__":
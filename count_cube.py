@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+消息计数立方体（OLAP）
+在 (群组, 日期, 小时, 发言类型, 发言量等级) 五个维度上预计算消息数，
+保存为紧凑的NumPy数组和维度字典；任意切片查询只需对数组子块求和。
+处理器同时保存按 (用户, 群组, 日期, 小时) 聚合的单元格计数，发言类型重分类后据此按新类型重建立方体
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ['group', 'day', 'hour', 'content_type', 'volume_level']
+DEFAULT_CUBE_PATH = "data/count_cube.npz"
+DEFAULT_CUBE_CELLS_PATH = "data/count_cube_cells.npz"
+CELL_COLUMNS = ['user_id', 'group', 'day', 'hour']
+UNKNOWN_LABEL = '未知'
+
+
+def user_cells(messages_df):
+    """按 (用户, 群组, 日期, 小时) 聚合的消息数
+
+    小时缺失或不在0-23的消息不计入（小时维度固定为0-23，计入0点会虚增午夜的计数）
+    """
+    hours = messages_df['hour'].fillna(-1).astype(int).to_numpy()
+    valid_hours = (hours >= 0) & (hours < 24)
+    if not valid_hours.all():
+        print(f"数据立方体：{int((~valid_hours).sum())} 条消息小时缺失或越界，未计入")
+    cells = pd.DataFrame({
+        'user_id': messages_df['user_id'].astype(str).to_numpy(),
+        'group': messages_df['group_name'].fillna(UNKNOWN_LABEL).astype(str).to_numpy(),
+        'day': messages_df['date'].fillna(UNKNOWN_LABEL).astype(str).to_numpy(),
+        'hour': hours
+    })[valid_hours]
+    return cells.groupby(CELL_COLUMNS, sort=False).size().rename('count').reset_index()
+
+
+def save_cells(cells, path=DEFAULT_CUBE_CELLS_PATH):
+    cells_dir = os.path.dirname(path)
+    if cells_dir:
+        os.makedirs(cells_dir, exist_ok=True)
+    np.savez_compressed(path, **{
+        'user_id': cells['user_id'].to_numpy(dtype=str),
+        'group': cells['group'].to_numpy(dtype=str),
+        'day': cells['day'].to_numpy(dtype=str),
+        'hour': cells['hour'].to_numpy(dtype=np.uint8),
+        'count': cells['count'].to_numpy(dtype=np.uint32)
+    })
+    print(f"立方体单元格计数已保存到 {path}，{len(cells)} 个单元格")
+
+
+def load_cells(path=DEFAULT_CUBE_CELLS_PATH):
+    with np.load(path) as data:
+        return pd.DataFrame({column: data[column] for column in CELL_COLUMNS + ['count']})
+
+
+def user_attributes(users_data):
+    """立方体使用的用户属性：以字符串 user_id 为索引的发言类型和发言量等级
+
+    发言类型取 type（快速处理器、发言类型重分类），没有时取 primary_type（增强处理器）
+    """
+    content_types = []
+    for user in users_data:
+        content_type = user['dimensions']['content_type']
+        content_types.append(content_type.get('type', content_type.get('primary_type')))
+    return pd.DataFrame({
+        'content_type': content_types,
+        'volume_level': [user['dimensions']['message_volume']['level'] for user in users_data]
+    }, index=[str(user['user_id']) for user in users_data])
+
+
+def rebuild_cube(users_data, cells_path=DEFAULT_CUBE_CELLS_PATH, cube_path=DEFAULT_CUBE_PATH):
+    """按用户当前的发言类型和发言量等级，从单元格计数重建并保存立方体；没有单元格文件时返回None"""
+    if not os.path.exists(cells_path):
+        print(f"未找到立方体单元格计数 {cells_path}，数据立方体未更新（请先运行数据处理脚本）")
+        return None
+    cube = CountCube.from_cells(load_cells(cells_path), user_attributes(users_data))
+    cube.save(cube_path)
+    return cube
+
+
+class CountCube:
+    def __init__(self, counts, labels):
+        """counts: 五维计数数组；labels: 每个维度的标签列表（与数组轴顺序一致）"""
+        self.counts = counts
+        self.labels = labels
+        self.label_index = {dim: {label: i for i, label in enumerate(values)} for dim, values in labels.items()}
+
+    @classmethod
+    def build(cls, messages_df, user_attributes):
+        """从消息表构建立方体
+
+        user_attributes: 以字符串 user_id 为索引、包含 content_type 和 volume_level 列的DataFrame
+        """
+        return cls.from_cells(user_cells(messages_df), user_attributes)
+
+    @classmethod
+    def from_cells(cls, cells, user_attributes):
+        """从 (用户, 群组, 日期, 小时) 单元格计数构建立方体，用户按 user_attributes 映射到类型和等级"""
+        attributes = user_attributes.reindex(cells['user_id'].to_numpy())
+
+        columns = {
+            'group': cells['group'].to_numpy(),
+            'day': cells['day'].to_numpy(),
+            'hour': cells['hour'].astype(int).to_numpy(),
+            'content_type': attributes['content_type'].fillna(UNKNOWN_LABEL).astype(str).to_numpy(),
+            'volume_level': attributes['volume_level'].fillna(UNKNOWN_LABEL).astype(str).to_numpy()
+        }
+
+        codes = []
+        labels = {}
+        for dim in CUBE_DIMENSIONS:
+            if dim == 'hour':
+                # 小时维度固定为0-23，便于前端直接按下标使用
+                labels[dim] = list(range(24))
+                codes.append(columns[dim])
+            else:
+                # 排序后的维度字典，日期维度因此天然有序，可按区间切片
+                dim_codes, dim_labels = pd.factorize(columns[dim], sort=True)
+                labels[dim] = [str(label) for label in dim_labels]
+                codes.append(dim_codes)
+
+        shape = tuple(len(labels[dim]) for dim in CUBE_DIMENSIONS)
+        flat_index = np.ravel_multi_index(codes, shape) if len(cells) else np.zeros(0, dtype=np.int64)
+        counts = np.zeros(int(np.prod(shape)), dtype=np.int64)
+        np.add.at(counts, flat_index, cells['count'].to_numpy(dtype=np.int64))
+        counts = counts.reshape(shape)
+
+        # 按最大计数选择最小的无符号整数类型
+        dtype = np.uint16 if counts.max(initial=0) < 2 ** 16 else np.uint32
+        return cls(counts.astype(dtype), labels)
+
+    def save(self, path=DEFAULT_CUBE_PATH):
+        """保存为压缩npz，维度字典以JSON字符串形式存入"""
+        cube_dir = os.path.dirname(path)
+        if cube_dir:
+            os.makedirs(cube_dir, exist_ok=True)
+        np.savez_compressed(path, counts=self.counts, labels=json.dumps(self.labels, ensure_ascii=False))
+        print(f"数据立方体已保存到 {path}，形状 {self.counts.shape}")
+
+    @classmethod
+    def load(cls, path=DEFAULT_CUBE_PATH):
+        with np.load(path) as data:
+            return cls(data['counts'], json.loads(str(data['labels'])))
+
+    def _positions(self, dim, values):
+        """将标签筛选转换为轴上的下标；未知标签被忽略"""
+        if dim == 'hour':
+            return [int(value) for value in values if 0 <= int(value) < 24]
+        index = self.label_index[dim]
+        return [index[str(value)] for value in values if str(value) in index]
+
+    def query(self, filters=None, date_from=None, date_to=None, by=None):
+        """切片求和
+
+        filters: {维度: [标签, ...]}；date_from/date_to: 日期区间（含端点）；
+        by: 保留的维度列表（最多两个），其余维度求和
+        """
+        filters = filters or {}
+        by = by or []
+        sliced = self.counts
+        kept_labels = {}
+
+        for axis, dim in enumerate(CUBE_DIMENSIONS):
+            positions = np.arange(len(self.labels[dim]))
+            if dim == 'day' and (date_from or date_to):
+                # 日期维度有序，区间筛选直接二分
+                days = self.labels['day']
+                start = int(np.searchsorted(days, date_from, side='left')) if date_from else 0
+                end = int(np.searchsorted(days, date_to, side='right')) if date_to else len(days)
+                positions = positions[start:end]
+            if dim in filters:
+                positions = positions[np.isin(positions, self._positions(dim, filters[dim]))]
+            if len(positions) != len(self.labels[dim]):
+                sliced = np.take(sliced, positions, axis=axis)
+            kept_labels[dim] = [self.labels[dim][p] for p in positions]
+
+        sum_axes = tuple(axis for axis, dim in enumerate(CUBE_DIMENSIONS) if dim not in by)
+        result = sliced.sum(axis=sum_axes, dtype=np.int64)
+
+        # 按请求的维度顺序排列结果轴
+        kept_dims = [dim for dim in CUBE_DIMENSIONS if dim in by]
+        if len(kept_dims) > 1:
+            result = np.transpose(result, [kept_dims.index(dim) for dim in by])
+
+        return {
+            'by': by,
+            'labels': {dim: kept_labels[dim] for dim in by},
+            'counts': result.tolist(),
+            'total': int(result.sum())
+        }
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据源抽象 - 统一CSV备份和SQLite消息存储的读取接口
+处理器通过 load_users / load_messages 读取数据，不关心底层存储
+"""
+
+import os
+
+import pandas as pd
+
+from message_dedup import MessageDeduplicator
+from message_store import DEFAULT_DB_PATH, MESSAGE_COLUMNS, MessageStore
+from snapshot_ingest import DATA_ROOT, SnapshotIngestor, discover_message_files
+
+STREAM_CHUNK_ROWS = 50000
+
+
+class CsvDataSource:
+    """从CSV备份读取数据：自动发现所有 data_backup_* 快照"""
+
+    def __init__(self, base_path=DATA_ROOT, deduplicate=True, max_workers=None, use_processes=False):
+        self.base_path = base_path
+        self.deduplicate = deduplicate
+        self.ingestor = SnapshotIngestor(base_path, max_workers=max_workers, use_processes=use_processes)
+        self.dedup_report = None
+
+    def load_users(self, columns=None):
+        """读取并合并所有快照的用户CSV"""
+        return self.ingestor.load_users(columns)
+
+    def load_messages(self, columns=None):
+        """并发读取所有快照的消息CSV，按时间戳合并并跨文件去重"""
+        deduplicator = MessageDeduplicator() if self.deduplicate else None
+        messages = self.ingestor.load_messages(columns, deduplicator=deduplicator)
+
+        if deduplicator is not None:
+            self.dedup_report = deduplicator.report()
+            for source, stats in self.dedup_report['sources'].items():
+                print(f"去重 {source}: {stats['total']} 条中重复 {stats['duplicates']} 条")
+
+        return messages
+
+    def iter_messages(self, chunksize=STREAM_CHUNK_ROWS):
+        """逐个消息CSV分块读取，产出 (来源, DataFrame)；不合并、不去重，内存只占一个分块"""
+        for path in discover_message_files(self.base_path):
+            for chunk in pd.read_csv(path, encoding='utf-8', dtype={'message_id': str}, chunksize=chunksize):
+                chunk['snapshot'] = os.path.basename(os.path.dirname(path))
+                if 'source_db' not in chunk.columns:
+                    chunk['source_db'] = os.path.basename(path)
+                yield os.path.relpath(path, self.base_path), chunk
+
+    def describe(self):
+        return f"csv:{self.base_path}"
+
+
+class SqliteDataSource:
+    """从SQLite消息存储读取数据"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"数据库不存在: {db_path}，请先运行 python message_store.py import")
+        self.db_path = db_path
+        self.store = MessageStore(db_path)
+        # 导入时已按message_id upsert，读取时无需再去重
+        self.dedup_report = None
+
+    def load_users(self, columns=None):
+        return self.store.load_users(columns)
+
+    def load_messages(self, columns=None):
+        return self.store.load_messages(columns)
+
+    def iter_messages(self, chunksize=STREAM_CHUNK_ROWS):
+        """分块读取消息表，产出 (来源, DataFrame)"""
+        sql = f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages"
+        for chunk in pd.read_sql_query(sql, self.store.connect(), chunksize=chunksize):
+            yield self.db_path, chunk
+
+    def describe(self):
+        return f"sqlite:{self.db_path}"
+
+
+def create_data_source(kind='csv', path=None):
+    """按类型创建数据源：csv 或 sqlite"""
+    if kind == 'sqlite':
+        return SqliteDataSource(path or DEFAULT_DB_PATH)
+    if kind == 'csv':
+        return CsvDataSource(path or DATA_ROOT)
+    raise ValueError(f"未知数据源类型: {kind}")
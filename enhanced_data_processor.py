@@ -11,15 +11,72 @@ import json
 import re
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-import jieba
 import os
+import argparse
+
+from data_sources import CsvDataSource, create_data_source
+from social_graph import SocialGraph
+from sessionization import DEFAULT_IDLE_GAP, sessionize
+from reply_latency import ReplyLatencyStats
+from count_cube import DEFAULT_CUBE_CELLS_PATH, DEFAULT_CUBE_PATH, CountCube, save_cells, user_attributes, user_cells
+from group_profiles import DEFAULT_GROUP_PROFILES_PATH, GroupProfileTable
+from timeline import DEFAULT_TIMELINE_PATH, TimelineStore
+from similar_users import DEFAULT_SIMILARITY_PATH, DEFAULT_SIMILAR_USERS_PATH, SimilarityIndex
+from personas import PERSONA_MODEL_PATHS, load_or_create_model, summarize_clusters
+from near_duplicates import NearDuplicateDetector
+from tokenization import DEFAULT_TOKEN_CACHE_PATH, TokenCache, build_keyword_profiles
+from trends import TREND_PATHS, load_or_create_trends
+from columnar_bundle import DEFAULT_BUNDLE_PATH, save_bundle, user_hour_matrix
+from metric_ranks import assign_ranks, descending_order_statistics
+from sample_preview import (DEFAULT_BOOTSTRAP, DEFAULT_SAMPLE_REPORT_PATH, build_preview, print_preview,
+                            sample_messages, save_preview)
+from profile_details import count_mentions
+from keyword_flags import KeywordFlags
 
 class EnhancedUserProfileProcessor:
-    def __init__(self):
-        """初始化处理器"""
+    def __init__(self, data_source=None, session_gap=DEFAULT_IDLE_GAP, persona_clusters=0, exclude_duplicates=False,
+                 light_profiles=False, sample_size=0, sample_seed=0, token_cache_path=DEFAULT_TOKEN_CACHE_PATH):
+        """初始化处理器
+
+        session_gap: 会话切分的空闲间隔（秒）
+        persona_clusters: 群像聚类的簇数，0表示不聚类
+        exclude_duplicates: 是否在维度计算中剔除近重复消息
+        light_profiles: 只输出摘要字段，详细字段由服务器按需计算（见 profile_details.py）
+        sample_size: 抽样预览时每个用户抽取的消息数，0表示使用全部消息（见 sample_preview.py）
+        sample_seed: 抽样和自助重抽样的随机种子
+        token_cache_path: 分词缓存文件，None表示不读写磁盘缓存（只用各维度计算方法时无需分词）
+        """
+        self.data_source = data_source or CsvDataSource()
         self.users_df = None
         self.messages_df = None
         self.processed_users = {}
+        self.social_graph = None
+        self.session_gap = session_gap
+        self.session_stats = None
+        self.session_summary = {}
+        self.reply_latency = None
+        self.count_cube = None
+        self.cube_cells = None
+        self.group_profiles = None
+        self.timelines = None
+        self.similarity_index = None
+        self.persona_clusters = persona_clusters
+        self.persona_model = None
+        self.exclude_duplicates = exclude_duplicates
+        self.duplicate_detector = None
+        self.duplicate_summary = {}
+        self.token_cache = TokenCache(token_cache_path)
+        self.user_keywords = {}
+        self.group_keywords = {}
+        self.trend_sketch = None
+        self.weekly_starts = []
+        self.weekly_timelines = {}
+        self.keyword_flags = None
+        self.light_profiles = light_profiles
+        self.mention_counts = None
+        self.sample_size = sample_size
+        self.sample_seed = sample_seed
+        self.population_counts = None
 
         # 发言类型分类关键词库
         self.content_type_keywords = {
@@ -47,16 +104,18 @@ class EnhancedUserProfileProcessor:
 
     def load_data(self):
         """加载原始CSV数据"""
-        print("正在加载数据...")
-        base_path = "用于数据分析的用户数据/data_backup_0901"
+        print(f"正在加载数据... ({self.data_source.describe()})")
 
         try:
-            self.users_df = pd.read_csv(f"{base_path}/users_enhanced.csv", encoding='utf-8')
-            messages_df1 = pd.read_csv(f"{base_path}/messages_backup_data_enhanced.csv", encoding='utf-8')
-            messages_df2 = pd.read_csv(f"{base_path}/messages_maibot_main_enhanced.csv", encoding='utf-8')
+            self.users_df = self.data_source.load_users()
 
             # 合并消息数据，只过滤武小纺机器人
-            self.messages_df = pd.concat([messages_df1, messages_df2], ignore_index=True)
+            if self.sample_size:
+                # 抽样预览：流式读取消息，每个用户蓄水池抽样 sample_size 条
+                self.messages_df, self.population_counts = sample_messages(
+                    self.data_source, self.sample_size, self.sample_seed)
+            else:
+                self.messages_df = self.data_source.load_messages()
             # 只过滤武小纺机器人(user_id: 3655943918)，其他用户都是真实用户
             self.messages_df = self.messages_df[
                 (self.messages_df['user_id'] != 3655943918) &
@@ -96,21 +155,26 @@ class EnhancedUserProfileProcessor:
             'daily_average': round(daily_average, 1)
         }
 
-    def calculate_time_pattern_dimension(self, user_messages):
-        """计算时间习惯维度分析"""
+    def calculate_time_pattern_dimension(self, user_messages, details=True):
+        """计算时间习惯维度分析
+
+        details: 是否输出24小时分布等详细字段（--light 时为False，详细字段由服务器按需计算）
+        """
         if len(user_messages) == 0:
-            return {'type': '未知', 'distribution': {}, 'peak_hours': []}
+            return {'type': '未知', 'distribution': {}, 'peak_hours': []} if details else {'type': '未知', 'peak_hours': []}
 
         # 时间段分布统计
         hour_counts = user_messages['hour'].value_counts()
         total_messages = len(user_messages)
 
+        # 只对小时列计数，不按掩码复制整张消息表
+        hours = user_messages['hour'].to_numpy()
         time_distribution = {
-            '早上(6-10)': user_messages[(user_messages['hour'] >= 6) & (user_messages['hour'] < 10)].shape[0] / total_messages,
-            '上午(10-12)': user_messages[(user_messages['hour'] >= 10) & (user_messages['hour'] < 12)].shape[0] / total_messages,
-            '下午(12-18)': user_messages[(user_messages['hour'] >= 12) & (user_messages['hour'] < 18)].shape[0] / total_messages,
-            '晚上(18-23)': user_messages[(user_messages['hour'] >= 18) & (user_messages['hour'] < 23)].shape[0] / total_messages,
-            '深夜(23-6)': user_messages[((user_messages['hour'] >= 23) | (user_messages['hour'] < 6))].shape[0] / total_messages
+            '早上(6-10)': int(((hours >= 6) & (hours < 10)).sum()) / total_messages,
+            '上午(10-12)': int(((hours >= 10) & (hours < 12)).sum()) / total_messages,
+            '下午(12-18)': int(((hours >= 12) & (hours < 18)).sum()) / total_messages,
+            '晚上(18-23)': int(((hours >= 18) & (hours < 23)).sum()) / total_messages,
+            '深夜(23-6)': int(((hours >= 23) | (hours < 6)).sum()) / total_messages
         }
 
         # 分类逻辑
@@ -131,6 +195,9 @@ class EnhancedUserProfileProcessor:
         # 获取最活跃的3个小时
         peak_hours = hour_counts.head(3).index.tolist()
 
+        if not details:
+            return {'type': time_type, 'peak_hours': peak_hours}
+
         return {
             'type': time_type,
             'distribution': {k: round(v, 3) for k, v in time_distribution.items()},
@@ -138,17 +205,17 @@ class EnhancedUserProfileProcessor:
             'hourly_stats': hour_counts.to_dict()
         }
 
-    def calculate_content_type_dimension(self, user_messages):
+    def calculate_content_type_dimension(self, user_messages, details=True):
         """计算发言类型维度分析"""
         if len(user_messages) == 0:
-            return {'primary_type': '未知', 'distribution': {}}
+            return {'primary_type': '未知', 'distribution': {}} if details else {'primary_type': '未知'}
 
         # 统计各类型关键词出现次数
         type_scores = defaultdict(int)
         total_messages = len(user_messages)
 
-        for _, message in user_messages.iterrows():
-            content = str(message.get('message_content', ''))
+        for content in user_messages['message_content'].tolist():
+            content = str(content)
 
             for content_type, keywords in self.content_type_keywords.items():
                 for keyword in keywords:
@@ -157,6 +224,8 @@ class EnhancedUserProfileProcessor:
                         break  # 每条消息每种类型最多计1分
 
         if not type_scores:
+            if not details:
+                return {'primary_type': '闲聊型'}
             return {
                 'primary_type': '闲聊型',
                 'distribution': {'闲聊型': 1.0}
@@ -168,14 +237,20 @@ class EnhancedUserProfileProcessor:
 
         # 确定主要类型
         primary_type = max(distribution.keys(), key=lambda k: distribution[k])
+        if not details:
+            return {'primary_type': primary_type}
 
         return {
             'primary_type': primary_type,
             'distribution': {k: round(v, 3) for k, v in distribution.items()}
         }
 
-    def calculate_social_behavior_dimension(self, user_messages, all_messages):
-        """计算社交行为维度分析"""
+    def calculate_social_behavior_dimension(self, user_messages, all_messages, mentions=None, details=True):
+        """计算社交行为维度分析
+
+        mentions: 预先统计的 (被提及消息数, 消息总数)；未提供时逐条扫描 all_messages
+        details: 是否输出各项比率等详细字段
+        """
         if len(user_messages) == 0:
             return {'type': '未知', 'metrics': {}}
 
@@ -184,45 +259,74 @@ class EnhancedUserProfileProcessor:
 
         # 计算各项指标
 
-        # 1. 话题发起率 - 首条消息比例（简化版：没有回复关系的消息）
-        non_reply_messages = user_messages[user_messages['reply_to'].isna() | (user_messages['reply_to'] == '')]
-        initiate_rate = len(non_reply_messages) / total_messages
+        # 1. 话题发起率 - 用户开启的会话占其参与会话的比例（无会话数据时退化为无回复关系消息比例）
+        session_metrics = self.session_metrics_for(user_id)
+        session_metrics_output = {}
+        if session_metrics is not None:
+            initiate_rate = session_metrics['initiate_rate']
+            median_delay = session_metrics['median_response_delay']
+            session_metrics_output = {
+                'sessions_opened': int(session_metrics['sessions_opened']),
+                'sessions_joined': int(session_metrics['sessions_joined']),
+                'median_response_delay': None if np.isnan(median_delay) else round(median_delay, 1)
+            }
+        else:
+            non_reply_count = int((user_messages['reply_to'].isna() | (user_messages['reply_to'] == '')).sum())
+            initiate_rate = non_reply_count / total_messages
 
         # 2. 回复率 - 有回复关系的消息比例
-        reply_messages = user_messages[user_messages['reply_to'].notna() & (user_messages['reply_to'] != '')]
-        reply_rate = len(reply_messages) / total_messages
+        reply_count = int((user_messages['reply_to'].notna() & (user_messages['reply_to'] != '')).sum())
+        reply_rate = reply_count / total_messages
 
         # 3. 提问率
+        contents = [str(content) for content in user_messages['message_content'].tolist()]
         question_count = 0
-        for _, message in user_messages.iterrows():
-            content = str(message.get('message_content', ''))
+        for content in contents:
             if any(keyword in content for keyword in self.question_keywords):
                 question_count += 1
         question_rate = question_count / total_messages
 
         # 4. 附和率
         agreement_count = 0
-        for _, message in user_messages.iterrows():
-            content = str(message.get('message_content', ''))
+        for content in contents:
             if any(word in content for word in self.agreement_words):
                 agreement_count += 1
         agreement_rate = agreement_count / total_messages
 
         # 5. 被@频率（简化版：检查其他人消息中是否提到该用户）
-        user_nickname = user_messages.iloc[0]['user_nickname']
-        mentioned_count = 0
-        for _, message in all_messages.iterrows():
-            if message['user_id'] != user_id:  # 其他人的消息
-                content = str(message.get('message_content', ''))
-                if f'@{user_nickname}' in content or user_nickname in content:
-                    mentioned_count += 1
-        mention_rate = mentioned_count / len(all_messages) if len(all_messages) > 0 else 0
+        if mentions is not None:
+            mentioned_count, total_count = mentions
+        else:
+            user_nickname = user_messages.iloc[0]['user_nickname']
+            mentioned_count = 0
+            for _, message in all_messages.iterrows():
+                if message['user_id'] != user_id:  # 其他人的消息
+                    content = str(message.get('message_content', ''))
+                    if f'@{user_nickname}' in content or user_nickname in content:
+                        mentioned_count += 1
+            total_count = len(all_messages)
+        mention_rate = mentioned_count / total_count if total_count > 0 else 0
 
         # 社交类型判断 - 统一标准
         # 计算综合社交评分
         interaction_score = (initiate_rate * 40 + question_rate * 30 + reply_rate * 20 + mention_rate * 100) * 100
         influence_score = (initiate_rate * 50 + question_rate * 30 + agreement_rate * 20) * 100
 
+        # 有回复关系图时使用图指标作为互动/影响力得分
+        graph_metrics = None
+        if self.social_graph is not None and self.social_graph.num_edges > 0:
+            graph_metrics = self.social_graph.metrics_for(user_id)
+        graph_metrics_output = {}
+        if graph_metrics is not None:
+            interaction_score = graph_metrics['interaction_score']
+            influence_score = graph_metrics['influence_score']
+            graph_metrics_output = {
+                'in_degree': int(graph_metrics['in_degree']),
+                'out_degree': int(graph_metrics['out_degree']),
+                'reciprocity': round(graph_metrics['reciprocity'], 3),
+                'pagerank': round(graph_metrics['pagerank'], 6)
+            }
+
         # 统一分类标准
         if initiate_rate > 0.25 or question_rate > 0.15:
             social_type = '主动社交型'
@@ -233,35 +337,48 @@ class EnhancedUserProfileProcessor:
         else:
             social_type = '社交观察型'
 
-        return {
-            'type': social_type,
-            'metrics': {
-                'initiate_rate': round(initiate_rate, 3),
+        metrics = {
+            'initiate_rate': round(initiate_rate, 3),
+            'interactionScore': round(interaction_score, 1),
+            'influenceScore': round(influence_score, 1),
+            # 为前端提供百分比格式的数据
+            'firstMessageRatio': round(initiate_rate * 100, 1),
+            **graph_metrics_output,
+            **session_metrics_output
+        }
+        if details:
+            metrics.update({
                 'reply_rate': round(reply_rate, 3),
                 'question_rate': round(question_rate, 3),
                 'agreement_rate': round(agreement_rate, 3),
                 'mention_rate': round(mention_rate, 5),
-                'interactionScore': round(interaction_score, 1),
-                'influenceScore': round(influence_score, 1),
-                # 为前端提供百分比格式的数据
-                'firstMessageRatio': round(initiate_rate * 100, 1),
                 'questionFrequency': round(question_rate * 100, 1),
                 'mentionFrequency': round(mention_rate * 1000, 1),  # 转换为千分比
                 'replyRatio': round(reply_rate * 100, 1),
                 'beMentionedRatio': round(mention_rate * 100, 1)
-            }
+            })
+
+        return {
+            'type': social_type,
+            'metrics': metrics
         }
 
-    def calculate_sentiment_dimension(self, user_messages):
+    def session_metrics_for(self, user_id):
+        """该用户的会话切分指标，无会话数据时返回None"""
+        if self.session_stats is None or user_id not in self.session_stats.index:
+            return None
+        return self.session_stats.loc[user_id].to_dict()
+
+    def calculate_sentiment_dimension(self, user_messages, details=True):
         """计算情感倾向维度分析"""
         if len(user_messages) == 0:
-            return {'overall_sentiment': '中性', 'positive_ratio': 0.5, 'negative_ratio': 0.5}
+            return {'overall_sentiment': '中性', 'positive_ratio': 0.5, 'negative_ratio': 0.5} if details else {'overall_sentiment': '中性'}
 
         positive_count = 0
         negative_count = 0
 
-        for _, message in user_messages.iterrows():
-            content = str(message.get('message_content', ''))
+        for content in user_messages['message_content'].tolist():
+            content = str(content)
 
             # 检查积极词汇
             if any(word in content for word in self.sentiment_keywords['positive']):
@@ -273,6 +390,8 @@ class EnhancedUserProfileProcessor:
 
         total_emotional = positive_count + negative_count
         if total_emotional == 0:
+            if not details:
+                return {'overall_sentiment': '中性'}
             return {
                 'overall_sentiment': '中性',
                 'positive_ratio': 0.5,
@@ -289,6 +408,8 @@ class EnhancedUserProfileProcessor:
             overall_sentiment = '消极型'
         else:
             overall_sentiment = '中性'
+        if not details:
+            return {'overall_sentiment': overall_sentiment}
 
         return {
             'overall_sentiment': overall_sentiment,
@@ -296,24 +417,24 @@ class EnhancedUserProfileProcessor:
             'negative_ratio': round(negative_ratio, 3)
         }
 
-    def calculate_interaction_style_dimension(self, user_messages):
+    def calculate_interaction_style_dimension(self, user_messages, details=True):
         """计算提问回答维度分析"""
         if len(user_messages) == 0:
-            return {'type': '未知', 'question_ratio': 0, 'answer_ratio': 0}
+            return {'type': '未知', 'question_ratio': 0, 'answer_ratio': 0} if details else {'type': '未知'}
 
         total_messages = len(user_messages)
         question_count = 0
         answer_count = 0
 
-        for _, message in user_messages.iterrows():
-            content = str(message.get('message_content', ''))
+        for content, reply_to in zip(user_messages['message_content'].tolist(), user_messages['reply_to'].tolist()):
+            content = str(content)
 
             # 检查是否为提问
             if any(keyword in content for keyword in self.question_keywords):
                 question_count += 1
 
             # 检查是否为回答（包含回复关系或答案性质的词汇）
-            if (message.get('reply_to') and message.get('reply_to') != '') or \
+            if (reply_to and reply_to != '') or \
                any(word in content for word in ['答案', '解释', '方法', '步骤', '建议', '可以', '应该']):
                 answer_count += 1
 
@@ -327,6 +448,8 @@ class EnhancedUserProfileProcessor:
             interaction_type = '回答型'
         else:
             interaction_type = '平衡型'
+        if not details:
+            return {'type': interaction_type}
 
         return {
             'type': interaction_type,
@@ -346,20 +469,33 @@ class EnhancedUserProfileProcessor:
             'platform': user_info.get('platform', 'unknown')
         }
 
-        # 7维度分析
+        # 被提及次数已一次性统计，不再逐用户扫描全部消息
+        mentions = None
+        if self.mention_counts is not None:
+            mentions = (self.mention_counts.get(user_id, 0), len(all_messages))
+
+        # 7维度分析（轻量模式不计算详细字段）
+        details = not self.light_profiles
         dimensions = {
             'message_volume': self.calculate_message_volume_dimension(user_messages),
-            'time_pattern': self.calculate_time_pattern_dimension(user_messages),
-            'content_type': self.calculate_content_type_dimension(user_messages),
-            'social_behavior': self.calculate_social_behavior_dimension(user_messages, all_messages),
-            'sentiment': self.calculate_sentiment_dimension(user_messages),
-            'interaction_style': self.calculate_interaction_style_dimension(user_messages),
+            'time_pattern': self.calculate_time_pattern_dimension(user_messages, details),
+            'content_type': self.calculate_content_type_dimension(user_messages, details),
+            'social_behavior': self.calculate_social_behavior_dimension(user_messages, all_messages, mentions, details),
+            'sentiment': self.calculate_sentiment_dimension(user_messages, details),
+            'interaction_style': self.calculate_interaction_style_dimension(user_messages, details),
             'member_status': {
                 'type': '新成员' if len(user_messages) < 50 else '老成员',  # 简化判断
                 'days_active': user_messages['date'].nunique() if len(user_messages) > 0 and 'date' in user_messages.columns else 0
             }
         }
 
+        # 回复延迟分位数
+        if self.reply_latency is not None:
+            dimensions['social_behavior']['reply_latency'] = self.reply_latency.profile_for(user_id)
+
+        # 周时间线（消息数与时间习惯随时间的变化）
+        dimensions['time_pattern']['weekly'] = self.weekly_timelines.get(str(user_id), {})
+
         # 生成综合标签
         tags = []
 
@@ -427,10 +563,52 @@ class EnhancedUserProfileProcessor:
 
         return user_profile
 
+    def detect_near_duplicates(self):
+        """MinHash-LSH近重复检测；启用 exclude_duplicates 时从后续维度计算中剔除重复消息"""
+        self.duplicate_detector = NearDuplicateDetector().detect(self.messages_df)
+        self.duplicate_summary = self.duplicate_detector.summary(self.messages_df)
+        self.duplicate_summary['excluded'] = self.exclude_duplicates
+        print(f"近重复检测: {self.duplicate_summary['clusters']} 个重复簇，重复消息 {self.duplicate_summary['duplicate_messages']} 条")
+
+        if self.exclude_duplicates:
+            self.messages_df = self.messages_df[~self.duplicate_detector.is_duplicate]
+            print(f"已剔除重复消息，剩余 {len(self.messages_df)} 条")
+
     def process_all_users(self):
         """处理所有用户数据"""
         print("开始处理用户画像...")
 
+        # 近重复/刷屏检测（需在其他全表统计之前完成）
+        self.detect_near_duplicates()
+
+        # 构建回复关系图（全量向量化计算）
+        self.social_graph = SocialGraph.from_messages(self.messages_df)
+        self.social_graph.compute_metrics()
+        print(f"回复关系图: {self.social_graph.summary()}")
+
+        # 会话切分（按chat和时间全量排序一次）
+        self.session_stats, self.session_summary = sessionize(self.messages_df, self.session_gap)
+        print(f"会话切分: {self.session_summary}")
+
+        # 回复延迟分布（有序数组连接回复与原消息）
+        self.reply_latency = ReplyLatencyStats.from_messages(self.messages_df)
+
+        # 每条消息的关键词命中标记：各关键词表只扫描一次，时间线/相似用户/分群组画像共用
+        self.keyword_flags = self.build_keyword_flags()
+
+        # 每日特征计数 + 前缀和，得到每个用户的周时间线
+        self.timelines = TimelineStore.build(self.messages_df, self.keyword_flags, time_rules='enhanced')
+        self.weekly_starts, self.weekly_timelines = self.timelines.weekly_summaries()
+
+        # 相似用户索引（归一化特征向量的余弦相似度）
+        self.similarity_index = SimilarityIndex.build(self.messages_df, self.keyword_flags)
+
+        # jieba分词（按内容哈希缓存）与TF-IDF关键词
+        self.user_keywords, self.group_keywords = build_keyword_profiles(self.messages_df, self.token_cache)
+
+        # 所有用户的被提及次数一次统计（逐用户扫描全部消息是批处理中最慢的部分）
+        self.mention_counts = count_mentions(self.messages_df)
+
         # 按用户ID分组统计消息
         user_message_groups = self.messages_df.groupby('user_id')
 
@@ -465,8 +643,19 @@ class EnhancedUserProfileProcessor:
 
             # 处理该用户
             user_profile = self.process_single_user(user_id, user_info, user_messages, self.messages_df)
+            user_profile['duplicate_check'] = self.duplicate_detector.profile_for(user_id)
+            user_profile['keywords'] = self.user_keywords.get(str(user_id), [])
             processed_users.append(user_profile)
 
+        # 覆盖全部历史的时间线窗口与画像的时间习惯类型应一致（两者使用同一套规则）
+        mismatched = self.timelines.mismatched_time_types(
+            {user['user_id']: user['dimensions']['time_pattern']['type'] for user in processed_users})
+        if mismatched:
+            print(f"警告：{len(mismatched)} 个用户的全程时间线窗口与画像时间习惯类型不一致，例如 {mismatched[:5]}")
+
+        # 各指标排名和百分位（每个指标一次argsort）
+        assign_ranks(processed_users)
+
         print(f"用户画像处理完成，共处理 {len(processed_users)} 个用户")
         return processed_users
 
@@ -492,14 +681,15 @@ class EnhancedUserProfileProcessor:
 
         # 计算发言量分类阈值
         message_counts = [user['dimensions']['message_volume']['total_messages'] for user in users_data]
-        message_counts.sort(reverse=True)
 
         total_users = len(message_counts)
-        thresholds = {
-            'major_speaker': message_counts[int(total_users * 0.15)] if total_users > 10 else 100,
-            'stable_speaker': message_counts[int(total_users * 0.60)] if total_users > 10 else 20,
-            'occasional_speaker': message_counts[int(total_users * 0.85)] if total_users > 10 else 5
-        }
+        if total_users > 10:
+            # 降序第15%/60%/85%位置的顺序统计量（np.partition，无需整体排序）
+            positions = [int(total_users * share) for share in (0.15, 0.60, 0.85)]
+            major, stable, occasional = descending_order_statistics(message_counts, positions)
+            thresholds = {'major_speaker': int(major), 'stable_speaker': int(stable), 'occasional_speaker': int(occasional)}
+        else:
+            thresholds = {'major_speaker': 100, 'stable_speaker': 20, 'occasional_speaker': 5}
 
         # 重新分类用户并统计
         for user in users_data:
@@ -541,10 +731,75 @@ class EnhancedUserProfileProcessor:
             'social_behavior_distribution': dict(social_behavior_stats),
             'sentiment_distribution': dict(sentiment_stats),
             'group_distribution': dict(group_stats),
+            'social_graph': self.social_graph.summary() if self.social_graph is not None else {},
+            'sessions': self.session_summary,
+            'reply_latency_distribution': self.reply_latency.global_distribution() if self.reply_latency is not None else {},
+            'timeline': {'window_days': 7, 'window_starts': self.weekly_starts},
+            'near_duplicates': self.duplicate_summary,
+            'group_keywords': self.group_keywords,
             'thresholds': thresholds,
             'update_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
+    def build_count_cube(self, users_data):
+        """按用户最终的发言类型和发言量等级构建消息计数立方体"""
+        self.cube_cells = user_cells(self.messages_df)
+        self.count_cube = CountCube.from_cells(self.cube_cells, user_attributes(users_data))
+        return self.count_cube
+
+    def build_trends(self):
+        """增量更新 (群组, 日期) 的Count-Min Sketch，返回各群组近7天的突发话题"""
+        self.trend_sketch = load_or_create_trends(self.content_type_keywords, TREND_PATHS['enhanced'],
+                                                  self.data_source.describe(), self.exclude_duplicates)
+        added = self.trend_sketch.update(self.messages_df, self.content_type_keywords)
+        print(f"趋势草图计入新消息 {added} 条")
+        return self.trend_sketch.trending_all()
+
+    def build_keyword_flags(self):
+        """当前消息表的关键词命中标记（与 messages_df 逐行对齐）"""
+        return KeywordFlags.build(
+            self.messages_df, self.content_type_keywords, self.question_keywords,
+            self.sentiment_keywords['positive'], self.sentiment_keywords['negative'], self.agreement_words
+        )
+
+    def build_group_profiles(self):
+        """分群组画像：以 (群组, 用户) 为键一次分组计算，只存储实际发言的组合"""
+        if self.keyword_flags is None:
+            self.keyword_flags = self.build_keyword_flags()
+        self.group_profiles = GroupProfileTable.build(self.messages_df, self.keyword_flags, self.session_gap)
+        return self.group_profiles
+
+    def build_personas(self, users_data):
+        """在相似用户特征矩阵上做 Mini-Batch K-Means，为每个用户写入群像编号和距离，返回各簇摘要"""
+        index = self.similarity_index
+        self.persona_model = load_or_create_model(self.persona_clusters, index.feature_names,
+                                                  PERSONA_MODEL_PATHS['enhanced'])
+        self.persona_model.fit(index.vectors)
+        labels, distances = self.persona_model.predict(index.vectors)
+
+        # 规则类型与索引行对齐，用于给簇命名
+        profiles = {u['user_id']: u['dimensions'] for u in users_data}
+        member_types = {
+            dimension: [profiles[user_id][dimension][key] if user_id in profiles else '未知' for user_id in index.user_ids]
+            for dimension, key in (('content_type', 'primary_type'), ('time_pattern', 'type'))
+        }
+        summaries = summarize_clusters(self.persona_model, index.vectors, labels, distances, member_types)
+
+        for user in users_data:
+            row = index.user_index.get(user['user_id'])
+            if row is None:
+                user['persona'] = None
+                continue
+            cluster = int(labels[row])
+            user['persona'] = {
+                'cluster': cluster,
+                'label': summaries[cluster]['label'],
+                'distance': round(float(distances[row]), 4)
+            }
+
+        print(f"群像聚类完成: {[(s['label'], s['size']) for s in summaries]}")
+        return summaries
+
     def generate_enhanced_analytics(self):
         """生成增强版分析数据"""
         if not self.load_data():
@@ -556,13 +811,24 @@ class EnhancedUserProfileProcessor:
         # 计算全局统计
         global_stats = self.calculate_global_statistics(users_data)
 
+        # 预计算多维消息计数立方体
+        self.build_count_cube(users_data)
+        global_stats['trends'] = self.build_trends()
+
+        # 可选：数据驱动的群像聚类
+        if self.persona_clusters:
+            global_stats['personas'] = self.build_personas(users_data)
+
         # 构建最终数据结构
         analytics_data = {
             'stats': global_stats,
             'users': users_data,
             'metadata': {
                 'processing_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'data_source': 'enhanced_csv_processing',
+                'data_source': f'enhanced_processing:{self.data_source.describe()}',
+                'deduplication': self.data_source.dedup_report,
+                'count_cube': DEFAULT_CUBE_PATH,
+                'light_profiles': self.light_profiles,
                 'dimensions_count': 7,
                 'features': [
                     'message_volume_classification',
@@ -578,6 +844,48 @@ class EnhancedUserProfileProcessor:
 
         return analytics_data
 
+    def generate_sample_preview(self, bootstrap=DEFAULT_BOOTSTRAP):
+        """抽样预览：在每个用户的抽样消息上计算7维度画像，给出比率的置信区间和可能翻转的类型标签
+
+        会话、回复关系图等需要完整对话的统计不在样本上构建，社交维度在预览中标为不可用
+        """
+        if not self.load_data():
+            return None
+
+        # 社交维度不输出，被提及次数仍一次统计，避免单用户计算逐条扫描全部样本
+        self.mention_counts = count_mentions(self.messages_df)
+        nicknames = self.users_df.drop_duplicates('user_id').set_index('user_id')['nickname'].to_dict()
+        user_messages = dict(tuple(self.messages_df.groupby('user_id')))
+        report = build_preview(
+            user_messages, self.population_counts,
+            lambda user_id, messages: self.process_single_user(
+                user_id, {'nickname': nicknames.get(user_id)}, messages, self.messages_df),
+            self.sample_size, nicknames, bootstrap, self.sample_seed,
+            replicate_fn=lambda user_id, messages: {'dimensions': self.sample_dimensions(messages)}
+        )
+        report['metadata']['data_source'] = f'enhanced_processing:{self.data_source.describe()}'
+        return self.clean_nan_values(report)
+
+    def sample_dimensions(self, user_messages):
+        """样本上可估计的维度（自助重抽样时只计算这些，发言量和社交维度不参与估计）"""
+        return {
+            'time_pattern': self.calculate_time_pattern_dimension(user_messages),
+            'content_type': self.calculate_content_type_dimension(user_messages),
+            'sentiment': self.calculate_sentiment_dimension(user_messages),
+            'interaction_style': self.calculate_interaction_style_dimension(user_messages)
+        }
+
+    def clean_nan_values(self, obj):
+        """递归清理对象中的NaN值"""
+        if isinstance(obj, dict):
+            return {k: self.clean_nan_values(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [self.clean_nan_values(item) for item in obj]
+        elif isinstance(obj, float) and np.isnan(obj):
+            return None  # 将NaN转换为None (JSON中的null)
+        else:
+            return obj
+
     def save_to_json(self, data, filename='enhanced_analytics.json'):
         """保存处理结果到JSON文件"""
         print(f"保存数据到 {filename}...")
@@ -604,9 +912,37 @@ class EnhancedUserProfileProcessor:
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='用户画像7维度深度数据处理')
+    parser.add_argument('--source', choices=['csv', 'sqlite'], default='csv', help='数据源类型 (默认: csv)')
+    parser.add_argument('--path', help='CSV备份目录或SQLite数据库路径')
+    parser.add_argument('--session-gap', type=float, default=DEFAULT_IDLE_GAP / 60, help='会话切分空闲间隔（分钟，默认30）')
+    parser.add_argument('--personas', type=int, default=0, metavar='K', help='对用户特征做K簇群像聚类 (默认: 不聚类)')
+    parser.add_argument('--exclude-duplicates', action='store_true', help='维度计算中剔除近重复消息（复制粘贴、刷屏）')
+    parser.add_argument('--group-profiles', action='store_true', help=f'同时生成分群组画像 ({DEFAULT_GROUP_PROFILES_PATH})')
+    parser.add_argument('--light', action='store_true', help='只输出画像摘要，详细字段由统一服务器按需从消息库计算')
+    parser.add_argument('--sample', type=int, default=0, metavar='K',
+                        help=f'抽样预览：每个用户抽取K条消息，输出置信区间和可能翻转的类型 ({DEFAULT_SAMPLE_REPORT_PATH})')
+    parser.add_argument('--sample-seed', type=int, default=0, help='抽样随机种子 (默认: 0)')
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP, help=f'抽样预览的自助重抽样次数 (默认: {DEFAULT_BOOTSTRAP})')
+    args = parser.parse_args()
+
     print("=== 用户画像7维度深度数据处理 ===")
 
-    processor = EnhancedUserProfileProcessor()
+    processor = EnhancedUserProfileProcessor(
+        create_data_source(args.source, args.path), session_gap=args.session_gap * 60,
+        persona_clusters=args.personas, exclude_duplicates=args.exclude_duplicates, light_profiles=args.light,
+        sample_size=args.sample, sample_seed=args.sample_seed
+    )
+
+    if args.sample:
+        # 抽样预览只输出预览报告，不覆盖正式的分析数据
+        report = processor.generate_sample_preview(args.bootstrap)
+        if report:
+            print_preview(report)
+            save_preview(report, DEFAULT_SAMPLE_REPORT_PATH)
+        else:
+            print("数据处理失败！")
+        return
 
     # 生成增强分析数据
     analytics_data = processor.generate_enhanced_analytics()
@@ -617,6 +953,19 @@ def main():
 
         # 同时保存一份备份到原文件名（兼容现有前端）
         processor.save_to_json(analytics_data, 'analytics.json')
+        processor.count_cube.save(DEFAULT_CUBE_PATH)
+        save_cells(processor.cube_cells, DEFAULT_CUBE_CELLS_PATH)
+        processor.timelines.save(DEFAULT_TIMELINE_PATH)
+        processor.similarity_index.save(DEFAULT_SIMILARITY_PATH)
+        processor.similarity_index.save_top_k_lists(DEFAULT_SIMILAR_USERS_PATH)
+        processor.token_cache.save()
+        processor.trend_sketch.save(TREND_PATHS['enhanced'])
+        users = analytics_data['users']
+        save_bundle(users, DEFAULT_BUNDLE_PATH, user_hour_matrix(processor.messages_df, [user['user_id'] for user in users]))
+        if processor.persona_model is not None:
+            processor.persona_model.save(PERSONA_MODEL_PATHS['enhanced'])
+        if args.group_profiles:
+            processor.build_group_profiles().save(DEFAULT_GROUP_PROFILES_PATH)
 
         print("\n处理完成！新的分析数据已生成，支持7维度用户画像分析。")
     else:
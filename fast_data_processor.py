@@ -11,12 +11,67 @@ import json
 from collections import Counter, defaultdict
 from datetime import datetime
 import os
+import argparse
+
+from data_sources import CsvDataSource, create_data_source
+from social_graph import SocialGraph
+from sessionization import DEFAULT_IDLE_GAP, sessionize
+from reply_latency import ReplyLatencyStats
+from count_cube import DEFAULT_CUBE_CELLS_PATH, DEFAULT_CUBE_PATH, CountCube, save_cells, user_attributes, user_cells
+from group_profiles import DEFAULT_GROUP_PROFILES_PATH, GroupProfileTable
+from timeline import DEFAULT_TIMELINE_PATH, TimelineStore
+from similar_users import DEFAULT_SIMILARITY_PATH, DEFAULT_SIMILAR_USERS_PATH, SimilarityIndex
+from personas import PERSONA_MODEL_PATHS, load_or_create_model, summarize_clusters
+from near_duplicates import NearDuplicateDetector
+from tokenization import DEFAULT_TOKEN_CACHE_PATH, TokenCache, build_keyword_profiles
+from trends import TREND_PATHS, load_or_create_trends
+from columnar_bundle import DEFAULT_BUNDLE_PATH, save_bundle, user_hour_matrix
+from metric_ranks import assign_ranks, descending_order_statistics
+from keyword_flags import KeywordFlags
+from sample_preview import (DEFAULT_BOOTSTRAP, DEFAULT_SAMPLE_REPORT_PATH, build_preview, print_preview,
+                            sample_messages, save_preview)
 
 class FastUserProfileProcessor:
-    def __init__(self):
-        """初始化处理器"""
+    def __init__(self, data_source=None, session_gap=DEFAULT_IDLE_GAP, persona_clusters=0, exclude_duplicates=False,
+                 sample_size=0, sample_seed=0, keywords=False):
+        """初始化处理器
+
+        session_gap: 会话切分的空闲间隔（秒）
+        persona_clusters: 群像聚类的簇数，0表示不聚类
+        exclude_duplicates: 是否在维度计算中剔除近重复消息
+        sample_size: 抽样预览时每个用户抽取的消息数，0表示使用全部消息（见 sample_preview.py）
+        sample_seed: 抽样和自助重抽样的随机种子
+        keywords: 是否做jieba分词并生成TF-IDF关键词（较慢，默认关闭）
+        """
+        self.data_source = data_source or CsvDataSource()
         self.users_df = None
         self.messages_df = None
+        self.social_graph = None
+        self.session_gap = session_gap
+        self.session_stats = None
+        self.session_summary = {}
+        self.reply_latency = None
+        self.count_cube = None
+        self.cube_cells = None
+        self.group_profiles = None
+        self.timelines = None
+        self.similarity_index = None
+        self.persona_clusters = persona_clusters
+        self.persona_model = None
+        self.exclude_duplicates = exclude_duplicates
+        self.duplicate_detector = None
+        self.duplicate_summary = {}
+        self.keywords = keywords
+        self.token_cache = TokenCache(DEFAULT_TOKEN_CACHE_PATH)
+        self.user_keywords = {}
+        self.group_keywords = {}
+        self.trend_sketch = None
+        self.weekly_starts = []
+        self.weekly_timelines = {}
+        self.keyword_flags = None
+        self.sample_size = sample_size
+        self.sample_seed = sample_seed
+        self.population_counts = None
 
         # 简化的关键词库
         self.content_keywords = {
@@ -33,21 +88,23 @@ class FastUserProfileProcessor:
 
     def load_data(self):
         """快速加载数据"""
-        print("快速加载数据...")
-        base_path = "用于数据分析的用户数据/data_backup_0901"
+        print(f"快速加载数据... ({self.data_source.describe()})")
 
         try:
             # 只读取必要的列
             user_cols = ['user_id', 'nickname', 'group_name', 'platform']
-            message_cols = ['user_id', 'hour', 'date', 'message_content', 'reply_to', 'is_ai_message']
+            message_cols = ['message_id', 'chat_id', 'timestamp', 'user_id', 'hour', 'date',
+                            'group_name', 'message_content', 'reply_to', 'is_ai_message']
 
-            self.users_df = pd.read_csv(f"{base_path}/users_enhanced.csv", encoding='utf-8', usecols=user_cols)
-
-            msg1 = pd.read_csv(f"{base_path}/messages_backup_data_enhanced.csv", encoding='utf-8', usecols=message_cols)
-            msg2 = pd.read_csv(f"{base_path}/messages_maibot_main_enhanced.csv", encoding='utf-8', usecols=message_cols)
+            self.users_df = self.data_source.load_users(user_cols)
 
             # 合并并只过滤武小纺机器人
-            self.messages_df = pd.concat([msg1, msg2], ignore_index=True)
+            if self.sample_size:
+                # 抽样预览：流式读取消息，每个用户蓄水池抽样 sample_size 条
+                self.messages_df, self.population_counts = sample_messages(
+                    self.data_source, self.sample_size, self.sample_seed, message_cols + ['user_nickname'])
+            else:
+                self.messages_df = self.data_source.load_messages(message_cols)
             # 只过滤武小纺机器人(user_id: 3655943918)，其他用户都是真实用户
             self.messages_df = self.messages_df[
                 (self.messages_df['user_id'] != 3655943918) &
@@ -115,8 +172,12 @@ class FastUserProfileProcessor:
             'night_ratio': round(night, 3)
         }
 
-    def analyze_social_behavior(self, messages_data):
-        """快速社交行为分析"""
+    def analyze_social_behavior(self, messages_data, graph_metrics=None, session_metrics=None):
+        """快速社交行为分析
+
+        graph_metrics: 回复关系图中该用户的指标，有回复边时用于计算真实的被回复率和互动/影响力得分
+        session_metrics: 会话切分指标，用于计算真实的话题发起率
+        """
         if len(messages_data) == 0:
             return '一般型', {}
 
@@ -131,12 +192,38 @@ class FastUserProfileProcessor:
         reply_rate = replies / total
 
         # 统一分类标准，与enhanced保持一致
-        initiate_rate = question_rate  # 简化处理，用问题率代表发起率
-        mention_rate = 0.001 if replies > 0 else 0  # 简化处理
+        session_metrics_output = {}
+        if session_metrics is not None:
+            # 话题发起率：用户开启的会话占其参与会话的比例
+            initiate_rate = session_metrics['initiate_rate']
+            median_delay = session_metrics['median_response_delay']
+            session_metrics_output = {
+                'initiate_rate': round(initiate_rate, 3),
+                'sessions_opened': int(session_metrics['sessions_opened']),
+                'sessions_joined': int(session_metrics['sessions_joined']),
+                'median_response_delay': None if np.isnan(median_delay) else round(median_delay, 1)
+            }
+        else:
+            initiate_rate = question_rate  # 简化处理，用问题率代表发起率
+
+        graph_metrics_output = {}
+        if graph_metrics is not None:
+            # 被回复次数占全部消息的比例，与enhanced的被提及率口径一致
+            mention_rate = graph_metrics['in_degree'] / max(len(self.messages_df), 1)
+            interaction_score = graph_metrics['interaction_score']
+            influence_score = graph_metrics['influence_score']
+            graph_metrics_output = {
+                'in_degree': int(graph_metrics['in_degree']),
+                'out_degree': int(graph_metrics['out_degree']),
+                'reciprocity': round(graph_metrics['reciprocity'], 3),
+                'pagerank': round(graph_metrics['pagerank'], 6)
+            }
+        else:
+            mention_rate = 0.001 if replies > 0 else 0  # 无回复图时的简化处理
 
-        # 计算综合社交评分
-        interaction_score = (initiate_rate * 40 + question_rate * 30 + reply_rate * 20 + mention_rate * 100) * 100
-        influence_score = (initiate_rate * 50 + question_rate * 30 + reply_rate * 20) * 100
+            # 计算综合社交评分
+            interaction_score = (initiate_rate * 40 + question_rate * 30 + reply_rate * 20 + mention_rate * 100) * 100
+            influence_score = (initiate_rate * 50 + question_rate * 30 + reply_rate * 20) * 100
 
         # 统一分类标准
         if initiate_rate > 0.15 or question_rate > 0.15:
@@ -158,9 +245,29 @@ class FastUserProfileProcessor:
             'questionFrequency': round(question_rate * 100, 1),
             'mentionFrequency': round(mention_rate * 1000, 1),
             'replyRatio': round(reply_rate * 100, 1),
-            'beMentionedRatio': round(mention_rate * 100, 1)
+            'beMentionedRatio': round(mention_rate * 100, 1),
+            **graph_metrics_output,
+            **session_metrics_output
         }
 
+    def build_keyword_flags(self):
+        """当前消息表的关键词命中标记（与 messages_df 逐行对齐）"""
+        return KeywordFlags.build(
+            self.messages_df, self.content_keywords, self.question_words, self.positive_words, self.negative_words
+        )
+
+    def graph_metrics_for(self, user_id):
+        """回复图中有边时返回该用户的图指标，否则返回None"""
+        if self.social_graph is None or self.social_graph.num_edges == 0:
+            return None
+        return self.social_graph.metrics_for(user_id)
+
+    def session_metrics_for(self, user_id):
+        """该用户的会话切分指标，无会话数据时返回None"""
+        if self.session_stats is None or user_id not in self.session_stats.index:
+            return None
+        return self.session_stats.loc[user_id].to_dict()
+
     def analyze_sentiment(self, contents):
         """快速情感分析"""
         if len(contents) == 0:
@@ -210,7 +317,9 @@ class FastUserProfileProcessor:
 
         content_type = self.classify_content_type(contents)
         time_type, time_stats = self.analyze_time_pattern(hours)
-        social_type, social_metrics = self.analyze_social_behavior(user_messages)
+        social_type, social_metrics = self.analyze_social_behavior(
+            user_messages, self.graph_metrics_for(user_id), self.session_metrics_for(user_id)
+        )
         sentiment_type, sentiment_score = self.analyze_sentiment(contents)
 
         # 生成标签
@@ -258,18 +367,22 @@ class FastUserProfileProcessor:
                 'message_volume': {
                     'level': volume_level,
                     'count': msg_count,
-                    'rank': 0  # 后续计算
+                    'daily_average': round(msg_count / max(user_messages['date'].nunique(), 1), 1) if msg_count else 0,
+                    'rank': 0,  # 后续计算
+                    'percentile': 0
                 },
                 'content_type': {
                     'type': content_type
                 },
                 'time_pattern': {
                     'type': time_type,
-                    'stats': time_stats
+                    'stats': time_stats,
+                    'weekly': self.weekly_timelines.get(str(user_id), {})
                 },
                 'social_behavior': {
                     'type': social_type,
-                    'metrics': social_metrics
+                    'metrics': social_metrics,
+                    'reply_latency': self.reply_latency.profile_for(user_id) if self.reply_latency is not None else {}
                 },
                 'sentiment': {
                     'type': sentiment_type,
@@ -284,6 +397,17 @@ class FastUserProfileProcessor:
             }
         }
 
+    def detect_near_duplicates(self):
+        """MinHash-LSH近重复检测；启用 exclude_duplicates 时从后续维度计算中剔除重复消息"""
+        self.duplicate_detector = NearDuplicateDetector().detect(self.messages_df)
+        self.duplicate_summary = self.duplicate_detector.summary(self.messages_df)
+        self.duplicate_summary['excluded'] = self.exclude_duplicates
+        print(f"近重复检测: {self.duplicate_summary['clusters']} 个重复簇，重复消息 {self.duplicate_summary['duplicate_messages']} 条")
+
+        if self.exclude_duplicates:
+            self.messages_df = self.messages_df[~self.duplicate_detector.is_duplicate]
+            print(f"已剔除重复消息，剩余 {len(self.messages_df)} 条")
+
     def process_all_users_fast(self):
         """快速处理所有用户"""
         print("开始快速处理用户画像...")
@@ -303,6 +427,35 @@ class FastUserProfileProcessor:
                 if user_row['group_name'] not in user_info_dict[user_id]['all_groups']:
                     user_info_dict[user_id]['all_groups'].append(user_row['group_name'])
 
+        # 近重复/刷屏检测（需在其他全表统计之前完成）
+        self.detect_near_duplicates()
+
+        # 构建回复关系图（全量向量化计算）
+        self.social_graph = SocialGraph.from_messages(self.messages_df)
+        self.social_graph.compute_metrics()
+        print(f"回复关系图: {self.social_graph.summary()}")
+
+        # 会话切分（按chat和时间全量排序一次）
+        self.session_stats, self.session_summary = sessionize(self.messages_df, self.session_gap)
+        print(f"会话切分: {self.session_summary}")
+
+        # 回复延迟分布（有序数组连接回复与原消息）
+        self.reply_latency = ReplyLatencyStats.from_messages(self.messages_df)
+
+        # 每条消息的关键词命中标记：各关键词表只扫描一次，时间线/相似用户/分群组画像共用
+        self.keyword_flags = self.build_keyword_flags()
+
+        # 每日特征计数 + 前缀和，得到每个用户的周时间线
+        self.timelines = TimelineStore.build(self.messages_df, self.keyword_flags, time_rules='fast')
+        self.weekly_starts, self.weekly_timelines = self.timelines.weekly_summaries()
+
+        # 相似用户索引（归一化特征向量的余弦相似度）
+        self.similarity_index = SimilarityIndex.build(self.messages_df, self.keyword_flags)
+
+        # jieba分词（按内容哈希缓存）与TF-IDF关键词
+        if self.keywords:
+            self.user_keywords, self.group_keywords = build_keyword_profiles(self.messages_df, self.token_cache)
+
         # 批量处理消息数据
         user_message_groups = self.messages_df.groupby('user_id')
         processed_users = []
@@ -322,12 +475,19 @@ class FastUserProfileProcessor:
 
             # 快速处理
             user_profile = self.process_user_fast(user_id, user_info, user_messages)
+            user_profile['duplicate_check'] = self.duplicate_detector.profile_for(user_id)
+            user_profile['keywords'] = self.user_keywords.get(str(user_id), [])
             processed_users.append(user_profile)
 
-        # 计算排名
-        processed_users.sort(key=lambda x: x['message_count'], reverse=True)
-        for i, user in enumerate(processed_users):
-            user['dimensions']['message_volume']['rank'] = i + 1
+        # 覆盖全部历史的时间线窗口与画像的时间习惯类型应一致（两者使用同一套规则）
+        mismatched = self.timelines.mismatched_time_types(
+            {user['user_id']: user['dimensions']['time_pattern']['type'] for user in processed_users})
+        if mismatched:
+            print(f"警告：{len(mismatched)} 个用户的全程时间线窗口与画像时间习惯类型不一致，例如 {mismatched[:5]}")
+
+        # 计算各指标排名和百分位，按发言量排名输出
+        message_ranks = assign_ranks(processed_users)
+        processed_users = [processed_users[i] for i in np.argsort(message_ranks, kind='stable')]
 
         print(f"快速处理完成，共 {len(processed_users)} 个用户")
         return processed_users
@@ -345,28 +505,25 @@ class FastUserProfileProcessor:
             'time_pattern_distribution': Counter(),
             'social_behavior_distribution': Counter(),
             'sentiment_distribution': Counter(),
+            'social_graph': self.social_graph.summary() if self.social_graph is not None else {},
+            'sessions': self.session_summary,
+            'reply_latency_distribution': self.reply_latency.global_distribution() if self.reply_latency is not None else {},
+            'timeline': {'window_days': 7, 'window_starts': self.weekly_starts},
+            'near_duplicates': self.duplicate_summary,
+            'group_keywords': self.group_keywords,
             'update_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
         # 重新分类发言量（基于实际分布）
         message_counts = [u['message_count'] for u in users_data]
-        message_counts.sort(reverse=True)
 
         total = len(message_counts)
         if total > 10:
-            # 计算正确的百分位阈值
-            # 前15%的下界（主要发言人门槛）
-            major_threshold_index = int(total * 0.15) - 1  # 第15%位置
-            # 前60%的下界（稳定发言人门槛）
-            stable_threshold_index = int(total * 0.60) - 1  # 第60%位置
-            # 前85%的下界（少量发言人门槛）
-            occasional_threshold_index = int(total * 0.85) - 1  # 第85%位置
-
-            thresholds = {
-                'major': message_counts[major_threshold_index] if major_threshold_index >= 0 else message_counts[0],
-                'stable': message_counts[stable_threshold_index] if stable_threshold_index >= 0 else 1,
-                'occasional': message_counts[occasional_threshold_index] if occasional_threshold_index >= 0 else 1
-            }
+            # 前15%/60%/85%位置的下界（主要/稳定/少量发言人门槛），np.partition 取顺序统计量
+            positions = [max(int(total * share) - 1, 0) for share in (0.15, 0.60, 0.85)]
+            major, stable, occasional = descending_order_statistics(message_counts, positions)
+
+            thresholds = {'major': int(major), 'stable': int(stable), 'occasional': int(occasional)}
 
             print(f"分类阈值计算: 总用户{total}人")
             print(f"主要发言人阈值(前15%): >= {thresholds['major']}条消息")
@@ -403,6 +560,58 @@ class FastUserProfileProcessor:
 
         return stats
 
+    def build_count_cube(self, users_data):
+        """按用户最终的内容类型和发言量等级构建消息计数立方体"""
+        self.cube_cells = user_cells(self.messages_df)
+        self.count_cube = CountCube.from_cells(self.cube_cells, user_attributes(users_data))
+        return self.count_cube
+
+    def build_trends(self):
+        """增量更新 (群组, 日期) 的Count-Min Sketch，返回各群组近7天的突发话题"""
+        self.trend_sketch = load_or_create_trends(self.content_keywords, TREND_PATHS['fast'],
+                                                  self.data_source.describe(), self.exclude_duplicates)
+        added = self.trend_sketch.update(self.messages_df, self.content_keywords)
+        print(f"趋势草图计入新消息 {added} 条")
+        return self.trend_sketch.trending_all()
+
+    def build_group_profiles(self):
+        """分群组画像：以 (群组, 用户) 为键一次分组计算，只存储实际发言的组合"""
+        if self.keyword_flags is None:
+            self.keyword_flags = self.build_keyword_flags()
+        self.group_profiles = GroupProfileTable.build(self.messages_df, self.keyword_flags, self.session_gap)
+        return self.group_profiles
+
+    def build_personas(self, users_data):
+        """在相似用户特征矩阵上做 Mini-Batch K-Means，为每个用户写入群像编号和距离，返回各簇摘要"""
+        index = self.similarity_index
+        self.persona_model = load_or_create_model(self.persona_clusters, index.feature_names,
+                                                  PERSONA_MODEL_PATHS['fast'])
+        self.persona_model.fit(index.vectors)
+        labels, distances = self.persona_model.predict(index.vectors)
+
+        # 规则类型与索引行对齐，用于给簇命名
+        profiles = {u['user_id']: u['dimensions'] for u in users_data}
+        member_types = {
+            dimension: [profiles[user_id][dimension][key] if user_id in profiles else '未知' for user_id in index.user_ids]
+            for dimension, key in (('content_type', 'type'), ('time_pattern', 'type'))
+        }
+        summaries = summarize_clusters(self.persona_model, index.vectors, labels, distances, member_types)
+
+        for user in users_data:
+            row = index.user_index.get(user['user_id'])
+            if row is None:
+                user['persona'] = None
+                continue
+            cluster = int(labels[row])
+            user['persona'] = {
+                'cluster': cluster,
+                'label': summaries[cluster]['label'],
+                'distance': round(float(distances[row]), 4)
+            }
+
+        print(f"群像聚类完成: {[(s['label'], s['size']) for s in summaries]}")
+        return summaries
+
     def generate_fast_analytics(self):
         """快速生成分析数据"""
         if not self.load_data():
@@ -410,6 +619,10 @@ class FastUserProfileProcessor:
 
         users_data = self.process_all_users_fast()
         stats = self.calculate_stats_fast(users_data)
+        self.build_count_cube(users_data)
+        stats['trends'] = self.build_trends()
+        if self.persona_clusters:
+            stats['personas'] = self.build_personas(users_data)
 
         return {
             'stats': stats,
@@ -417,10 +630,31 @@ class FastUserProfileProcessor:
             'metadata': {
                 'processing_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 'processor_version': 'fast_v1.0',
+                'data_source': self.data_source.describe(),
+                'deduplication': self.data_source.dedup_report,
+                'count_cube': DEFAULT_CUBE_PATH,
                 'features': ['快速发言量分析', '内容类型分类', '时间习惯分析', '社交行为分析', '情感倾向分析']
             }
         }
 
+    def generate_sample_preview(self, bootstrap=DEFAULT_BOOTSTRAP):
+        """抽样预览：在每个用户的抽样消息上计算画像，给出比率的置信区间和可能翻转的类型标签
+
+        会话、回复关系图等需要完整对话的统计不在样本上构建，社交维度在预览中标为不可用
+        """
+        if not self.load_data():
+            return None
+
+        nicknames = self.users_df.drop_duplicates('user_id').set_index('user_id')['nickname'].to_dict()
+        user_messages = dict(tuple(self.messages_df.groupby('user_id')))
+        report = build_preview(
+            user_messages, self.population_counts,
+            lambda user_id, messages: self.process_user_fast(user_id, {'nickname': nicknames.get(user_id)}, messages),
+            self.sample_size, nicknames, bootstrap, self.sample_seed
+        )
+        report['metadata']['data_source'] = self.data_source.describe()
+        return self.clean_nan_values(report)
+
     def clean_nan_values(self, obj):
         """递归清理对象中的NaN值"""
         if isinstance(obj, dict):
@@ -457,13 +691,54 @@ class FastUserProfileProcessor:
         print(f"内容类型分布: {stats['content_type_distribution']}")
 
 def main():
+    parser = argparse.ArgumentParser(description='快速用户画像处理器')
+    parser.add_argument('--source', choices=['csv', 'sqlite'], default='csv', help='数据源类型 (默认: csv)')
+    parser.add_argument('--path', help='CSV备份目录或SQLite数据库路径')
+    parser.add_argument('--session-gap', type=float, default=DEFAULT_IDLE_GAP / 60, help='会话切分空闲间隔（分钟，默认30）')
+    parser.add_argument('--personas', type=int, default=0, metavar='K', help='对用户特征做K簇群像聚类 (默认: 不聚类)')
+    parser.add_argument('--exclude-duplicates', action='store_true', help='维度计算中剔除近重复消息（复制粘贴、刷屏）')
+    parser.add_argument('--group-profiles', action='store_true', help=f'同时生成分群组画像 ({DEFAULT_GROUP_PROFILES_PATH})')
+    parser.add_argument('--keywords', action='store_true', help='jieba分词并生成用户/群组TF-IDF关键词（较慢）')
+    parser.add_argument('--sample', type=int, default=0, metavar='K',
+                        help=f'抽样预览：每个用户抽取K条消息，输出置信区间和可能翻转的类型 ({DEFAULT_SAMPLE_REPORT_PATH})')
+    parser.add_argument('--sample-seed', type=int, default=0, help='抽样随机种子 (默认: 0)')
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP, help=f'抽样预览的自助重抽样次数 (默认: {DEFAULT_BOOTSTRAP})')
+    args = parser.parse_args()
+
     print("=== 快速用户画像处理器 ===")
 
-    processor = FastUserProfileProcessor()
+    processor = FastUserProfileProcessor(
+        create_data_source(args.source, args.path), session_gap=args.session_gap * 60,
+        persona_clusters=args.personas, exclude_duplicates=args.exclude_duplicates,
+        sample_size=args.sample, sample_seed=args.sample_seed, keywords=args.keywords
+    )
+
+    if args.sample:
+        # 抽样预览只输出预览报告，不覆盖正式的分析数据
+        report = processor.generate_sample_preview(args.bootstrap)
+        if report:
+            print_preview(report)
+            save_preview(report, DEFAULT_SAMPLE_REPORT_PATH)
+        else:
+            print("❌ 处理失败！")
+        return
     analytics_data = processor.generate_fast_analytics()
 
     if analytics_data:
         processor.save_to_json(analytics_data)
+        processor.count_cube.save(DEFAULT_CUBE_PATH)
+        save_cells(processor.cube_cells, DEFAULT_CUBE_CELLS_PATH)
+        processor.timelines.save(DEFAULT_TIMELINE_PATH)
+        processor.similarity_index.save(DEFAULT_SIMILARITY_PATH)
+        processor.similarity_index.save_top_k_lists(DEFAULT_SIMILAR_USERS_PATH)
+        processor.token_cache.save()
+        processor.trend_sketch.save(TREND_PATHS['fast'])
+        users = analytics_data['users']
+        save_bundle(users, DEFAULT_BUNDLE_PATH, user_hour_matrix(processor.messages_df, [user['user_id'] for user in users]))
+        if processor.persona_model is not None:
+            processor.persona_model.save(PERSONA_MODEL_PATHS['fast'])
+        if args.group_profiles:
+            processor.build_group_profiles().save(DEFAULT_GROUP_PROFILES_PATH)
         print("\n✅ 快速处理完成！现在可以启动前端界面查看结果。")
     else:
         print("❌ 处理失败！")
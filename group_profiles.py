@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分群组用户画像
+以 (群组, 用户) 为键一次分组计算全部维度，只为实际发过言的 (群组, 用户) 对存储一行，
+按群组排序后用 indptr 切片，服务端按群组惰性返回
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from sessionization import DEFAULT_IDLE_GAP, sessionize
+
+DEFAULT_GROUP_PROFILES_PATH = "data/group_profiles.npz"
+UNKNOWN_GROUP = '未知群组'
+
+VOLUME_LEVELS = ['主要发言人', '稳定发言人', '少量发言人', '极少发言人']
+TIME_TYPES = ['早上型', '熬夜型', '规律型', '不规律型', '未知']
+SOCIAL_TYPES = ['主动社交型', '社交附和型', '被动社交型', '社交观察型']
+SENTIMENT_TYPES = ['积极型', '消极型', '中性']
+
+
+def _group_bincount(codes, num_groups, weights=None):
+    return np.bincount(codes, weights=weights, minlength=num_groups)
+
+
+class GroupProfileTable:
+    def __init__(self, group_names, user_ids, group_indptr, pair_user, columns, hour_counts, content_types):
+        """稀疏画像表：第 group_indptr[g]:group_indptr[g+1] 行属于第g个群组"""
+        self.group_names = list(group_names)
+        self.user_ids = np.asarray(user_ids)
+        self.group_indptr = np.asarray(group_indptr)
+        self.pair_user = np.asarray(pair_user)
+        self.columns = columns
+        self.hour_counts = hour_counts
+        self.content_types = list(content_types)
+        self.group_index = {name: i for i, name in enumerate(self.group_names)}
+
+    @property
+    def num_rows(self):
+        return len(self.pair_user)
+
+    @classmethod
+    def build(cls, messages_df, keyword_flags, session_gap=DEFAULT_IDLE_GAP):
+        """一次分组计算所有 (群组, 用户) 对的画像维度，规则与快速处理器一致
+
+        keyword_flags: 与 messages_df 逐行对齐的关键词命中标记（keyword_flags.KeywordFlags）
+        """
+        user_codes, user_ids = pd.factorize(messages_df['user_id'], sort=True)
+        group_codes, group_names = pd.factorize(messages_df['group_name'].fillna(UNKNOWN_GROUP).astype(str), sort=True)
+        num_users = max(len(user_ids), 1)
+
+        # (群组, 用户) 对编码，排序后同一群组的行连续
+        pair_codes, pair_keys = pd.factorize(group_codes.astype(np.int64) * num_users + user_codes, sort=True)
+        num_pairs = len(pair_keys)
+        pair_group = pair_keys // num_users
+        pair_user = pair_keys % num_users
+        group_indptr = np.concatenate([[0], np.cumsum(_group_bincount(pair_group, len(group_names)))])
+
+        contents = messages_df['message_content'].fillna('').astype(str)
+        message_count = _group_bincount(pair_codes, num_pairs)
+        safe_count = np.maximum(message_count, 1)
+
+        # 发言量：平均长度、活跃天数、占该用户总发言的比例
+        avg_length = _group_bincount(pair_codes, num_pairs, contents.str.len().to_numpy(dtype=float)) / safe_count
+        date_codes, dates = pd.factorize(messages_df['date'].fillna(''))
+        day_pairs = np.unique(pair_codes.astype(np.int64) * max(len(dates), 1) + date_codes)
+        active_days = _group_bincount(day_pairs // max(len(dates), 1), num_pairs)
+        user_totals = np.bincount(user_codes, minlength=len(user_ids))
+        share_of_user = message_count / np.maximum(user_totals[pair_user], 1)
+
+        # 群内发言量等级：按群内消息数降序取 15%/60%/85% 分位阈值
+        order = np.lexsort((-message_count, pair_group))
+        group_sizes = np.diff(group_indptr)
+        rank = np.empty(num_pairs, dtype=np.int64)
+        rank[order] = np.arange(num_pairs) - np.repeat(group_indptr[:-1], group_sizes) + 1
+        sorted_counts = message_count[order]
+        thresholds = []
+        for share, fallback in ((0.15, 100), (0.60, 20), (0.85, 5)):
+            index = group_indptr[:-1] + np.maximum((group_sizes * share).astype(np.int64) - 1, 0)
+            values = sorted_counts[np.minimum(index, max(num_pairs - 1, 0))] if num_pairs else np.zeros(0)
+            thresholds.append(np.where(group_sizes > 10, values, fallback)[pair_group])
+        volume_level = np.select(
+            [message_count >= thresholds[0], message_count >= thresholds[1], message_count >= thresholds[2]],
+            [0, 1, 2], default=3
+        )
+
+        # 内容类型：各类型命中消息数取最大，无命中为闲聊型
+        content_types = list(keyword_flags.content_types)
+        type_hits = np.column_stack([
+            _group_bincount(pair_codes, num_pairs, hits.astype(float))
+            for hits in keyword_flags.content_types.values()
+        ]) if content_types else np.zeros((num_pairs, 0))
+        default_type = content_types.index('闲聊型') if '闲聊型' in content_types else 0
+        content_type = np.where(type_hits.sum(axis=1) > 0, type_hits.argmax(axis=1), default_type)
+
+        # 时间习惯：群内逐小时分布
+        hours = messages_df['hour'].to_numpy(dtype=float)
+        valid_hours = ~np.isnan(hours) & (hours >= 0) & (hours < 24)
+        hour_counts = np.bincount(
+            pair_codes[valid_hours] * 24 + hours[valid_hours].astype(np.int64), minlength=num_pairs * 24
+        ).reshape(num_pairs, 24)
+        hour_total = np.maximum(hour_counts.sum(axis=1), 1)
+        morning = hour_counts[:, 6:10].sum(axis=1) / hour_total
+        evening = hour_counts[:, 18:23].sum(axis=1) / hour_total
+        night = hour_counts[:, [23, 0, 1, 2, 3, 4, 5]].sum(axis=1) / hour_total
+        regular = hour_counts[:, 8:23].sum(axis=1) / hour_total
+        time_type = np.select([morning > 0.4, night > 0.3, regular > 0.8], [0, 1, 2], default=3)
+        time_type = np.where(hour_counts.sum(axis=1) > 0, time_type, TIME_TYPES.index('未知'))
+
+        # 社交行为：提问率、回复率，以及以 (群组, 用户) 对为参与者切分会话得到的发起率
+        question_rate = _group_bincount(pair_codes, num_pairs, keyword_flags.question.astype(float)) / safe_count
+        reply_rate = _group_bincount(pair_codes, num_pairs, messages_df['reply_to'].notna().to_numpy(dtype=float)) / safe_count
+        session_stats, _ = sessionize(pd.DataFrame({
+            'chat_id': messages_df['chat_id'].to_numpy(),
+            'timestamp': messages_df['timestamp'].to_numpy(),
+            'user_id': pair_codes
+        }), session_gap)
+        session_stats = session_stats.reindex(np.arange(num_pairs), fill_value=0)
+        initiate_rate = session_stats['initiate_rate'].to_numpy(dtype=float)
+        social_type = np.select(
+            [(initiate_rate > 0.15) | (question_rate > 0.15), reply_rate > 0.5, reply_rate > 0.3],
+            [0, 1, 2], default=3
+        )
+
+        # 情感倾向
+        positive = _group_bincount(pair_codes, num_pairs, keyword_flags.positive.astype(float))
+        negative = _group_bincount(pair_codes, num_pairs, keyword_flags.negative.astype(float))
+        emotional = positive + negative
+        positive_ratio = np.divide(positive, emotional, out=np.full(num_pairs, 0.5), where=emotional > 0)
+        sentiment = np.select([(emotional > 0) & (positive_ratio > 0.6), (emotional > 0) & (positive_ratio < 0.4)], [0, 1], default=2)
+
+        columns = {
+            'message_count': message_count.astype(np.uint32),
+            'rank': rank.astype(np.uint32),
+            'share_of_user': share_of_user.astype(np.float32),
+            'avg_length': avg_length.astype(np.float32),
+            'active_days': active_days.astype(np.uint16),
+            'volume_level': volume_level.astype(np.uint8),
+            'content_type': content_type.astype(np.uint8),
+            'time_type': time_type.astype(np.uint8),
+            'morning_ratio': morning.astype(np.float32),
+            'evening_ratio': evening.astype(np.float32),
+            'night_ratio': night.astype(np.float32),
+            'social_type': social_type.astype(np.uint8),
+            'question_rate': question_rate.astype(np.float32),
+            'reply_rate': reply_rate.astype(np.float32),
+            'initiate_rate': initiate_rate.astype(np.float32),
+            'sessions_opened': session_stats['sessions_opened'].to_numpy().astype(np.uint32),
+            'sessions_joined': session_stats['sessions_joined'].to_numpy().astype(np.uint32),
+            'sentiment': sentiment.astype(np.uint8),
+            'positive_ratio': positive_ratio.astype(np.float32)
+        }
+        hour_dtype = np.uint16 if hour_counts.max(initial=0) < 2 ** 16 else np.uint32
+        return cls(
+            [str(name) for name in group_names], np.asarray(user_ids), group_indptr, pair_user,
+            columns, hour_counts.astype(hour_dtype), content_types
+        )
+
+    def save(self, path=DEFAULT_GROUP_PROFILES_PATH):
+        """保存为压缩npz，群组名和类型标签以JSON字符串存入"""
+        profile_dir = os.path.dirname(path)
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        meta = {'group_names': self.group_names, 'content_types': self.content_types}
+        np.savez_compressed(
+            path, meta=json.dumps(meta, ensure_ascii=False), user_ids=self.user_ids.astype(str),
+            group_indptr=self.group_indptr, pair_user=self.pair_user, hour_counts=self.hour_counts,
+            **{f"col_{name}": values for name, values in self.columns.items()}
+        )
+        print(f"分群组画像已保存到 {path}：{len(self.group_names)} 个群组，{self.num_rows} 个 (群组, 用户) 对")
+
+    @classmethod
+    def load(cls, path=DEFAULT_GROUP_PROFILES_PATH):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            columns = {key[4:]: data[key] for key in data.files if key.startswith('col_')}
+            return cls(
+                meta['group_names'], data['user_ids'], data['group_indptr'], data['pair_user'],
+                columns, data['hour_counts'], meta['content_types']
+            )
+
+    def group_summary(self):
+        """每个群组的画像行数和消息总数"""
+        counts = self.columns['message_count'].astype(np.int64)
+        totals = np.add.reduceat(counts, self.group_indptr[:-1]) if self.num_rows else np.zeros(0)
+        sizes = np.diff(self.group_indptr)
+        return [
+            {'group': name, 'users': int(size), 'messages': int(total) if size else 0}
+            for name, size, total in zip(self.group_names, sizes, totals)
+        ]
+
+    def _row_profile(self, row, group_name):
+        col = {name: values[row] for name, values in self.columns.items()}
+        return {
+            'user_id': str(self.user_ids[self.pair_user[row]]),
+            'group': group_name,
+            'message_count': int(col['message_count']),
+            'rank': int(col['rank']),
+            'share_of_user': round(float(col['share_of_user']), 3),
+            'dimensions': {
+                'message_volume': {
+                    'level': VOLUME_LEVELS[col['volume_level']],
+                    'count': int(col['message_count']),
+                    'avg_length': round(float(col['avg_length']), 1),
+                    'active_days': int(col['active_days'])
+                },
+                'content_type': {'type': self.content_types[col['content_type']] if self.content_types else '闲聊型'},
+                'time_pattern': {
+                    'type': TIME_TYPES[col['time_type']],
+                    'stats': {
+                        'morning_ratio': round(float(col['morning_ratio']), 3),
+                        'evening_ratio': round(float(col['evening_ratio']), 3),
+                        'night_ratio': round(float(col['night_ratio']), 3)
+                    },
+                    'hour_distribution': self.hour_counts[row].tolist()
+                },
+                'social_behavior': {
+                    'type': SOCIAL_TYPES[col['social_type']],
+                    'metrics': {
+                        'question_rate': round(float(col['question_rate']), 3),
+                        'reply_rate': round(float(col['reply_rate']), 3),
+                        'initiate_rate': round(float(col['initiate_rate']), 3),
+                        'sessions_opened': int(col['sessions_opened']),
+                        'sessions_joined': int(col['sessions_joined'])
+                    }
+                },
+                'sentiment': {
+                    'type': SENTIMENT_TYPES[col['sentiment']],
+                    'score': round(float(col['positive_ratio']), 3)
+                }
+            }
+        }
+
+    def profiles_for_group(self, group_name):
+        """某个群组内所有成员的画像（按群内排名），群组不存在时返回None"""
+        group = self.group_index.get(group_name)
+        if group is None:
+            return None
+        start, end = self.group_indptr[group], self.group_indptr[group + 1]
+        rows = np.arange(start, end)[np.argsort(self.columns['rank'][start:end], kind='stable')]
+        return [self._row_profile(row, group_name) for row in rows]
+
+    def profile_for(self, group_name, user_id):
+        """单个用户在某个群组内的画像"""
+        group = self.group_index.get(group_name)
+        if group is None:
+            return None
+        start, end = self.group_indptr[group], self.group_indptr[group + 1]
+        matches = np.nonzero(self.user_ids[self.pair_user[start:end]].astype(str) == str(user_id))[0]
+        return self._row_profile(start + matches[0], group_name) if len(matches) else None
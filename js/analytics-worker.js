@@ -0,0 +1,86 @@
+// 分析数据加载Worker：在后台线程下载、解析、解码分析JSON，不阻塞页面；
+// 解析结果按URL存入IndexedDB（记录ETag和快照版本），再次打开时带 If-None-Match 向服务器确认，
+// 304 未变化则直接使用本地副本，省去下载和解析
+
+importScripts('payload-codec.js');
+
+const DB_NAME = 'xiaoxiaofang-analytics';
+const DB_VERSION = 1;
+const STORE_NAME = 'snapshots';
+
+function openDatabase() {
+    return new Promise((resolve, reject) => {
+        if (typeof indexedDB === 'undefined') {
+            resolve(null);
+            return;
+        }
+        const request = indexedDB.open(DB_NAME, DB_VERSION);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(STORE_NAME, { keyPath: 'url' });
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function runTransaction(db, mode, operation) {
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(STORE_NAME, mode);
+        const request = operation(transaction.objectStore(STORE_NAME));
+        transaction.oncomplete = () => resolve(request.result);
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+// 缓存失败（隐私模式、配额不足等）只影响下次加载，不影响本次
+async function readSnapshot(db, url) {
+    try {
+        return db ? await runTransaction(db, 'readonly', store => store.get(url)) : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+async function writeSnapshot(db, record) {
+    try {
+        // 每个URL只保留最新快照，put 覆盖旧记录
+        await runTransaction(db, 'readwrite', store => store.put(record));
+    } catch (error) {
+        console.warn('分析数据缓存写入失败:', error);
+    }
+}
+
+self.onmessage = async event => {
+    const url = event.data.url;
+    try {
+        const db = await openDatabase().catch(() => null);
+        const cached = await readSnapshot(db, url);
+
+        // 自行管理缓存：绕过HTTP缓存，只用ETag做条件请求
+        const headers = cached && cached.etag ? { 'If-None-Match': cached.etag } : {};
+        const response = await fetch(url, { cache: 'no-store', headers: headers });
+
+        if (response.status === 304 && cached) {
+            self.postMessage({ data: cached.data, source: 'cache', version: cached.version });
+            self.postMessage({ done: true });
+            return;
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        const data = decodeCompactPayload(await response.json());
+        const version = data.metadata && data.metadata.snapshot_version || null;
+        // 先把数据交给页面，再写缓存；写完发送 done，页面收到后才结束Worker
+        self.postMessage({ data: data, source: 'network', version: version });
+
+        const etag = response.headers.get('ETag');
+        if (db && etag) {
+            await writeSnapshot(db, { url: url, etag: etag, version: version, saved_at: Date.now(), data: data });
+        }
+        self.postMessage({ done: true });
+    } catch (error) {
+        self.postMessage({ error: error.message || String(error) });
+    }
+};
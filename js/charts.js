@@ -178,19 +178,25 @@ function initializeContentEcosystemChart() {
 function initializeActivityHeatmapChart() {
     const ctx = document.getElementById('activityHeatmapChart').getContext('2d');
 
-    // 创建24小时活跃度数据
+    // 创建24小时活跃度数据：有列式数据包时直接累加小时列，否则遍历用户对象
+    const hourTotals = columnarBundle ? bundleHourTotals(columnarBundle, null) : null;
     const hourlyData = [];
     for (let hour = 0; hour < 24; hour++) {
         let totalActivity = 0;
         let userCount = 0;
 
-        analyticsData.users.forEach(user => {
-            if (user.dimensions && user.dimensions.time_pattern && user.dimensions.time_pattern.hour_distribution) {
-                const hourActivity = user.dimensions.time_pattern.hour_distribution[hour] || 0;
-                totalActivity += hourActivity;
-                if (hourActivity > 0) userCount++;
-            }
-        });
+        if (hourTotals) {
+            totalActivity = hourTotals.totals[hour];
+            userCount = hourTotals.activeUsers[hour];
+        } else {
+            analyticsData.users.forEach(user => {
+                if (user.dimensions && user.dimensions.time_pattern && user.dimensions.time_pattern.hour_distribution) {
+                    const hourActivity = user.dimensions.time_pattern.hour_distribution[hour] || 0;
+                    totalActivity += hourActivity;
+                    if (hourActivity > 0) userCount++;
+                }
+            });
+        }
 
         hourlyData.push({
             x: hour,
@@ -199,7 +205,11 @@ function initializeActivityHeatmapChart() {
         });
     }
 
-    new Chart(ctx, {
+    if (window.activityHeatmapChart) {
+        window.activityHeatmapChart.destroy();
+    }
+
+    window.activityHeatmapChart = new Chart(ctx, {
         type: 'scatter',
         data: {
             datasets: [{
@@ -231,6 +241,9 @@ function initializeActivityHeatmapChart() {
                             return `${context[0].parsed.x}:00`;
                         },
                         label: function(context) {
+                            if (context.chart.cubeCounts) {
+                                return `消息数: ${context.chart.cubeCounts[context.dataIndex]}`;
+                            }
                             const hourData = hourlyData[context.dataIndex];
                             return `平均活跃度: ${hourData.v.toFixed(1)}`;
                         }
@@ -269,6 +282,131 @@ function initializeActivityHeatmapChart() {
             }
         }
     });
+
+    // 选中群组时，用服务端数据立方体替换为该群组的逐小时消息数
+    const currentGroup = window.dimensionController ? window.dimensionController.currentGroup : '';
+    if (currentGroup) {
+        updateActivityHeatmapFromCube(currentGroup);
+    }
+}
+
+// 二进制列式数据包（columnar_bundle.py 生成）：JSON文件头 + 8字节对齐的小端定长数组
+const COLUMN_TYPES = {
+    uint8: Uint8Array,
+    uint16: Uint16Array,
+    uint32: Uint32Array,
+    float32: Float32Array,
+    float64: Float64Array
+};
+
+// 加载列式数据包，列为同一ArrayBuffer上的TypedArray视图（不复制）；
+// 文件不存在、格式不符或大端平台时返回null，调用方回退到遍历用户对象
+function loadColumnarBundle(url = 'data/analytics_columns.bin') {
+    const littleEndian = new Uint8Array(new Uint16Array([1]).buffer)[0] === 1;
+    if (!littleEndian || typeof fetch !== 'function') return Promise.resolve(null);
+
+    return fetch(url, { cache: 'no-cache' })
+        .then(response => response.ok ? response.arrayBuffer() : null)
+        .then(buffer => {
+            if (!buffer || buffer.byteLength < 8) return null;
+            const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+            if (magic !== 'UPCB') return null;
+
+            const headerLength = new DataView(buffer).getUint32(4, true);
+            const header = JSON.parse(new TextDecoder('utf-8').decode(new Uint8Array(buffer, 8, headerLength)));
+            if (header.format !== 'columnar-v1') return null;
+
+            const dataStart = 8 + headerLength;
+            const columns = {};
+            header.columns.forEach(column => {
+                columns[column.name] = new COLUMN_TYPES[column.dtype](buffer, dataStart + column.offset, column.length);
+            });
+            return { numUsers: header.num_users, dictionaries: header.dictionaries, columns: columns };
+        })
+        .catch(error => {
+            console.warn('列式数据包加载失败，图表将遍历用户数据:', error);
+            return null;
+        });
+}
+
+// 数据包的行顺序须与当前用户列表一致（按user_id逐行校验），否则不使用
+function bundleMatchesUsers(bundle, users) {
+    if (!bundle || bundle.numUsers !== users.length) return false;
+    const ids = bundle.columns.user_id;
+    for (let i = 0; i < users.length; i++) {
+        if (ids[i] !== Number(users[i].user_id)) return false;
+    }
+    return true;
+}
+
+// 属于某群组（all_groups 中包含）的行号；group 为空时返回null表示全部行
+function bundleRowsInGroup(bundle, group) {
+    if (!group) return null;
+    const code = bundle.dictionaries.groups.indexOf(group);
+    const offsets = bundle.columns.group_offsets;
+    const codes = bundle.columns.group_codes;
+    const rows = [];
+    if (code < 0) return new Uint32Array(0);
+
+    for (let row = 0; row < bundle.numUsers; row++) {
+        for (let i = offsets[row]; i < offsets[row + 1]; i++) {
+            if (codes[i] === code) {
+                rows.push(row);
+                break;
+            }
+        }
+    }
+    return Uint32Array.from(rows);
+}
+
+// 按小时累加消息数，并统计该小时有发言的用户数；rows 为null时累加全部行
+function bundleHourTotals(bundle, rows) {
+    const hours = bundle.columns.hours;
+    const totals = new Float64Array(24);
+    const activeUsers = new Uint32Array(24);
+    const count = rows ? rows.length : bundle.numUsers;
+
+    for (let i = 0; i < count; i++) {
+        const base = (rows ? rows[i] : i) * 24;
+        for (let hour = 0; hour < 24; hour++) {
+            const value = hours[base + hour];
+            totals[hour] += value;
+            if (value > 0) activeUsers[hour]++;
+        }
+    }
+    return { totals: totals, activeUsers: activeUsers };
+}
+
+// 查询服务端数据立方体切片（/api/cube），静态部署或接口不可用时返回null
+function fetchCubeSlice(params) {
+    return $.ajax({
+        url: 'api/cube',
+        data: params,
+        dataType: 'json',
+        cache: false,
+        timeout: 10000
+    }).then(result => result, () => null);
+}
+
+// 用数据立方体的群组切片更新活跃度热力图
+function updateActivityHeatmapFromCube(group) {
+    fetchCubeSlice({ by: 'hour', group: group }).then(result => {
+        const chart = window.activityHeatmapChart;
+        if (!result || !chart) return;
+
+        const counts = result.counts;
+        const maxValue = Math.max(...counts, 1);
+        const dataset = chart.data.datasets[0];
+        dataset.label = `${group} 消息数`;
+        dataset.data = counts.map((value, hour) => ({
+            x: hour,
+            y: 1,
+            r: 3 + 12 * value / maxValue
+        }));
+        dataset.backgroundColor = counts.map(value => `rgba(231, 76, 60, ${0.3 + value / maxValue * 0.7})`);
+        chart.cubeCounts = counts;
+        chart.update();
+    });
 }
 
 // 趋势分析图表
@@ -3,6 +3,8 @@
 console.log('🚀 dashboard.js 文件开始加载...');
 
 let analyticsData = null;
+let columnarBundle = null; // 二进制列式数据包，图表按列读取；未生成时为null
+let userTableIndexes = {}; // 表格名 -> UserListIndex，数据加载或增量合并后清空
 let dimensionController = null;
 
 // 立即创建一个全局测试函数
@@ -151,7 +153,10 @@ window.showUserDetail = function(userId) {
 
     try {
         const detailHtml = generateUserDetailHtml(user, userId);
-        $('#modalUserDetail').html(detailHtml);
+        $('#modalUserDetail').html(detailHtml).data('userId', userId);
+        appendGroupProfileDetail(userId);
+        appendProfileDetail(user);
+        appendSimilarUsersDetail(userId);
 
         // 检查模态框元素是否存在
         const modalElement = document.getElementById('userModal');
@@ -326,11 +331,29 @@ function initializeSidebar() {
 }
 
 // 加载分析数据
+const ANALYTICS_URL = 'data/analytics_with_content_types.json';
+
 function loadAnalyticsData() {
     console.log('开始加载分析数据...');
 
+    // 列式数据包与JSON并行下载，校验行顺序一致后再初始化仪表板
+    const bundleRequest = loadColumnarBundle();
+
+    // 优先在Worker中下载/解析并走IndexedDB缓存；浏览器不支持或Worker失败时在主线程加载
+    loadAnalyticsInWorker(ANALYTICS_URL)
+        .then(result => {
+            console.log(`数据加载成功（${result.source === 'cache' ? '本地缓存，服务器确认未变化' : '网络'}）`);
+            onAnalyticsLoaded(result.data, bundleRequest);
+        })
+        .catch(error => {
+            console.warn('Worker加载失败，改为主线程加载:', error);
+            loadAnalyticsDataDirect(bundleRequest);
+        });
+}
+
+function loadAnalyticsDataDirect(bundleRequest) {
     $.ajax({
-        url: 'data/analytics_with_content_types.json',
+        url: ANALYTICS_URL,
         dataType: 'json',
         cache: false,
         timeout: 30000,
@@ -340,8 +363,7 @@ function loadAnalyticsData() {
     })
     .done(function(data) {
         console.log('数据加载成功:', data);
-        analyticsData = data;
-        initializeDashboard();
+        onAnalyticsLoaded(decodeCompactPayload(data), bundleRequest);
     })
     .fail(function(jqXHR, textStatus, errorThrown) {
         console.error('数据加载失败:', {
@@ -354,6 +376,126 @@ function loadAnalyticsData() {
     });
 }
 
+// 在 js/analytics-worker.js 中加载：返回 {data, source: 'cache' | 'network'}
+function loadAnalyticsInWorker(url) {
+    if (typeof Worker !== 'function' || location.protocol === 'file:') {
+        return Promise.reject(new Error('当前环境不支持Web Worker'));
+    }
+
+    return new Promise((resolve, reject) => {
+        const worker = new Worker('js/analytics-worker.js');
+        // Worker先发数据、写完IndexedDB缓存后再发 done，收到 done 或出错时才结束Worker
+        worker.onmessage = event => {
+            if (event.data.error) {
+                worker.terminate();
+                reject(new Error(event.data.error));
+            } else if (event.data.done) {
+                worker.terminate();
+            } else {
+                resolve(event.data);
+            }
+        };
+        worker.onerror = event => {
+            worker.terminate();
+            reject(new Error(event.message || 'Worker脚本加载失败'));
+        };
+        worker.postMessage({ url: new URL(url, location.href).href });
+    });
+}
+
+function onAnalyticsLoaded(data, bundleRequest) {
+    analyticsData = data;
+    userTableIndexes = {};
+    bundleRequest.then(bundle => {
+        columnarBundle = bundleMatchesUsers(bundle, analyticsData.users) ? bundle : null;
+        console.log(columnarBundle ? '列式数据包已加载' : '未使用列式数据包');
+        initializeDashboard();
+        startDeltaPolling();
+    });
+}
+
+// 快照增量更新：定期带上当前版本请求 /api/delta，只下载变化的用户并原地合并；
+// 数据文件没有版本号（旧版数据或静态部署）时不轮询
+const DELTA_POLL_INTERVAL = 5 * 60 * 1000;
+let deltaPollTimer = null;
+let expiredDeltaVersion = null;  // 收到410的版本：重新加载后版本仍相同说明数据文件未更新，不再轮询
+
+function startDeltaPolling() {
+    if (deltaPollTimer || !analyticsData.metadata || !analyticsData.metadata.snapshot_version) return;
+    if (analyticsData.metadata.snapshot_version === expiredDeltaVersion) {
+        console.warn(`数据文件版本 ${expiredDeltaVersion} 与增量记录不一致，停止增量更新`);
+        return;
+    }
+    deltaPollTimer = setInterval(fetchAnalyticsDelta, DELTA_POLL_INTERVAL);
+}
+
+function fetchAnalyticsDelta() {
+    const since = analyticsData.metadata.snapshot_version;
+    $.ajax({
+        url: 'api/delta',
+        data: { since: since },
+        dataType: 'json',
+        cache: false,
+        timeout: 30000
+    })
+    .done(function(delta) {
+        if (delta.version !== since) {
+            applyAnalyticsDelta(delta);
+        }
+    })
+    .fail(function(jqXHR) {
+        // 410：本地版本的增量已被丢弃，停止轮询并重新加载完整数据；新数据的版本可用时再恢复轮询
+        if (jqXHR.status === 410) {
+            console.log('增量已过期，重新加载完整数据');
+            clearInterval(deltaPollTimer);
+            deltaPollTimer = null;
+            expiredDeltaVersion = since;
+            loadAnalyticsData();
+        }
+    });
+}
+
+// 按 user_id 原地替换/追加变化的用户，删除的用户原地压缩掉，再刷新视图
+function applyAnalyticsDelta(delta) {
+    const users = analyticsData.users;
+    const rowById = new Map();
+    users.forEach((user, row) => rowById.set(String(user.user_id), row));
+
+    delta.upserted.forEach(user => {
+        const row = rowById.get(String(user.user_id));
+        if (row === undefined) {
+            rowById.set(String(user.user_id), users.length);
+            users.push(user);
+        } else {
+            users[row] = user;
+        }
+    });
+
+    if (delta.removed.length) {
+        const removed = new Set(delta.removed.map(String));
+        let write = 0;
+        for (let read = 0; read < users.length; read++) {
+            if (!removed.has(String(users[read].user_id))) {
+                users[write++] = users[read];
+            }
+        }
+        users.length = write;
+    }
+
+    if (delta.stats) {
+        analyticsData.stats = delta.stats;
+    }
+    analyticsData.metadata.snapshot_version = delta.version;
+    columnarBundle = null; // 行与数据包不再一一对应，图表回退到遍历用户对象
+    userTableIndexes = {};
+
+    console.log(`已合并快照增量 ${delta.since} -> ${delta.version}：更新 ${delta.upserted.length}，删除 ${delta.removed.length} 个用户`);
+    updateStats();
+    if (dimensionController) {
+        dimensionController.setData(analyticsData);
+    }
+}
+
 // 初始化仪表板
 function initializeDashboard() {
     if (!analyticsData) {
@@ -481,6 +623,15 @@ function formatUserTags(tags) {
     ).join('');
 }
 
+// 格式化数据驱动的群像标签（聚类结果），与规则标签并列显示
+function formatPersonaBadge(persona) {
+    if (!persona) return '';
+
+    const summary = ((analyticsData.stats && analyticsData.stats.personas) || [])[persona.cluster];
+    const title = summary ? `同群像用户 ${summary.size} 人，特征: ${summary.top_features.join(', ')}` : '';
+    return `<span class="badge bg-dark me-1" title="${title}">🧩${persona.label}</span>`;
+}
+
 // 格式化移动端用户标签（简化版）
 function formatUserTagsMobile(tags) {
     if (!tags || tags.length === 0) {
@@ -621,7 +772,7 @@ function generateUserDetailHtml(user, userId) {
             <div class="user-info-label">发言量分类</div>
             <div class="user-info-content">
                 <span class="badge bg-${getCategoryColor(msgVol.level)}">${msgVol.level || '未知'}</span>
-                <small class="text-muted d-block mt-1">排名: #${msgVol.rank || '?'}</small>
+                <small class="text-muted d-block mt-1">排名: #${msgVol.rank || '?'}${msgVol.percentile ? ` | 百分位: ${msgVol.percentile}` : ''}</small>
             </div>
         </div>
         <div class="user-info-item">
@@ -634,6 +785,7 @@ function generateUserDetailHtml(user, userId) {
             <div class="user-info-label">时间习惯</div>
             <div class="user-info-content">
                 <span class="badge bg-success">${timePattern.type || '未知'}</span>
+                ${formatWeeklyTimeline(timePattern.weekly)}
             </div>
         </div>
         <div class="user-info-item">
@@ -660,10 +812,13 @@ function generateUserDetailHtml(user, userId) {
                 </small>
             </div>
         </div>
+        ${formatDuplicateCheck(user.duplicate_check)}
         <div class="user-info-item">
             <div class="user-info-label">用户标签</div>
-            <div class="user-info-content">${formatUserTags(profileSummary.tags || [])}</div>
+            <div class="user-info-content">${formatUserTags(profileSummary.tags || [])}${formatPersonaBadge(user.persona)}</div>
         </div>
+        ${formatMetricRanks(user.ranks)}
+        ${formatUserKeywords(user.keywords)}
         <div class="user-info-item">
             <div class="user-info-label">用户画像</div>
             <div class="user-info-content">${profileSummary.description || '暂无详细描述'}</div>
@@ -681,6 +836,220 @@ function generateUserDetailHtml(user, userId) {
     `;
 }
 
+// 各指标在全部用户中的排名和百分位
+const METRIC_RANK_LABELS = {
+    message_count: '消息数',
+    avg_length: '平均长度',
+    daily_average: '日均消息',
+    question_rate: '提问率',
+    reply_rate: '回复率',
+    agreement_rate: '附和率',
+    interaction_score: '互动分',
+    influence_score: '影响力'
+};
+
+function formatMetricRanks(ranks) {
+    if (!ranks || Object.keys(ranks).length === 0) return '';
+
+    const rows = Object.entries(METRIC_RANK_LABELS)
+        .filter(([metric]) => ranks[metric])
+        .map(([metric, label]) => `
+            <div class="d-flex align-items-center mb-1">
+                <small class="me-2" style="width: 4.5rem">${label}</small>
+                <div class="progress flex-grow-1" style="height: 6px">
+                    <div class="progress-bar" style="width: ${ranks[metric].percentile}%"></div>
+                </div>
+                <small class="text-muted ms-2">#${ranks[metric].rank}</small>
+            </div>
+        `).join('');
+    return `
+        <div class="user-info-item">
+            <div class="user-info-label">指标百分位</div>
+            <div class="user-info-content">${rows}</div>
+        </div>
+    `;
+}
+
+// TF-IDF关键词：字号随分数缩放，悬停显示分数
+function formatUserKeywords(keywords) {
+    if (!keywords || keywords.length === 0) return '';
+
+    const maxScore = keywords[0][1] || 1;
+    const items = keywords.map(([term, score]) =>
+        `<span class="badge bg-light text-dark border me-1" style="font-size: ${(0.75 + 0.35 * score / maxScore).toFixed(2)}rem" title="TF-IDF: ${score}">${term}</span>`
+    ).join('');
+    return `
+        <div class="user-info-item">
+            <div class="user-info-label">关键词</div>
+            <div class="user-info-content">${items}</div>
+        </div>
+    `;
+}
+
+// 近重复内容：重复消息占比与刷屏/复制转发标记，没有重复时不显示
+function formatDuplicateCheck(check) {
+    if (!check || !check.duplicate_messages) return '';
+
+    const flags = (check.flags || []).map(flag =>
+        `<span class="badge bg-danger me-1">${flag}</span>`
+    ).join('');
+    return `
+        <div class="user-info-item">
+            <div class="user-info-label">重复内容</div>
+            <div class="user-info-content">
+                ${flags}
+                <small class="text-muted d-block mt-1">
+                    近重复消息: ${check.duplicate_messages}条 (${(check.duplicate_ratio * 100).toFixed(1)}%) |
+                    自我重复: ${(check.self_repeat_ratio * 100).toFixed(1)}%
+                </small>
+            </div>
+        </div>
+    `;
+}
+
+// 周时间线：按周显示消息数和时间习惯的变化
+function formatWeeklyTimeline(weekly) {
+    if (!weekly || !weekly.time_type || weekly.time_type.length === 0) return '';
+
+    const starts = (analyticsData.stats.timeline || {}).window_starts || [];
+    const weeks = weekly.time_type.map((type, index) => {
+        const label = starts[index] ? starts[index].slice(5) : `第${index + 1}周`;
+        return `${label}: ${type}(${weekly.messages[index]}条)`;
+    });
+    return `<small class="text-muted d-block mt-1">周变化: ${weeks.join(' → ')}</small>`;
+}
+
+// 选中群组时，在用户详情中追加该用户的群内画像
+function appendGroupProfileDetail(userId) {
+    const controller = window.dimensionController;
+    if (!controller || !controller.currentGroup) return;
+
+    const groupName = controller.currentGroup;
+    controller.loadGroupProfiles(groupName).then(profiles => {
+        const profile = profiles && profiles[userId];
+        if (!profile || $('#modalUserDetail').data('userId') !== userId) return;
+
+        const dims = profile.dimensions;
+        $('#modalUserDetail').append(`
+            <div class="user-info-item">
+                <div class="user-info-label">群内画像 (${groupName})</div>
+                <div class="user-info-content">
+                    <span class="badge bg-${getCategoryColor(dims.message_volume.level)}">${dims.message_volume.level}</span>
+                    <span class="badge bg-info">${dims.content_type.type}</span>
+                    <span class="badge bg-success">${dims.time_pattern.type}</span>
+                    <span class="badge bg-warning">${dims.social_behavior.type}</span>
+                    <span class="badge bg-primary">${dims.sentiment.type}</span>
+                    <small class="text-muted d-block mt-1">
+                        群内消息: ${profile.message_count}条 |
+                        群内排名: #${profile.rank} |
+                        占其全部发言: ${(profile.share_of_user * 100).toFixed(0)}%
+                    </small>
+                </div>
+            </div>
+        `);
+    });
+}
+
+// 相似用户：优先查询服务端索引，静态部署时读取预计算的 data/similar_users.json
+let similarUsersCache = null;
+
+function loadSimilarUsers(userId, k = 10) {
+    return $.ajax({
+        url: `api/users/${userId}/similar`,
+        data: { k: k },
+        dataType: 'json',
+        timeout: 5000
+    }).then(result => result.similar.map(item => [item.user_id, item.similarity]), () => {
+        if (!similarUsersCache) {
+            similarUsersCache = $.ajax({ url: 'data/similar_users.json', dataType: 'json' })
+                .then(result => result.similar, () => ({}));
+        }
+        return similarUsersCache.then(similar => (similar[userId] || []).slice(0, k));
+    });
+}
+
+// 在用户详情中追加相似用户列表，点击可跳转查看
+function appendSimilarUsersDetail(userId) {
+    loadSimilarUsers(userId).then(similar => {
+        if (!similar.length || $('#modalUserDetail').data('userId') !== userId) return;
+
+        const links = similar.map(([similarId, score]) => {
+            const similarUser = analyticsData.users.find(u => u.user_id === similarId);
+            const name = similarUser ? similarUser.nickname : similarId;
+            return `<a href="#" class="badge bg-light text-dark me-1" onclick="showUserDetail('${similarId}'); return false;">${name} ${(score * 100).toFixed(0)}%</a>`;
+        });
+        $('#modalUserDetail').append(`
+            <div class="user-info-item">
+                <div class="user-info-label">相似用户</div>
+                <div class="user-info-content">${links.join('')}</div>
+            </div>
+        `);
+    });
+}
+
+// 详细画像：--light 处理的数据只含摘要，首次打开时向服务器请求详细字段并合并到用户对象
+function loadProfileDetails(user) {
+    if (!analyticsData.metadata?.light_profiles || user.detailsLoaded) {
+        return $.Deferred().resolve(user).promise();
+    }
+    return $.ajax({
+        url: `api/users/${user.user_id}/profile`,
+        dataType: 'json',
+        timeout: 10000
+    }).then(result => {
+        // details 形如 {'social_behavior.metrics': {...}}，按路径合并到 dimensions
+        user.dimensions = user.dimensions || {};
+        Object.entries(result.details).forEach(([path, fields]) => {
+            let section = user.dimensions;
+            path.split('.').forEach(key => {
+                section[key] = section[key] || {};
+                section = section[key];
+            });
+            Object.assign(section, fields);
+        });
+        user.detailsLoaded = true;
+        return user;
+    }, () => user);
+}
+
+function formatProfileDetails(user) {
+    const dims = user.dimensions || {};
+    const metrics = dims.social_behavior?.metrics || {};
+    const percent = value => `${((value || 0) * 100).toFixed(1)}%`;
+    const distribution = values => Object.entries(values)
+        .sort((a, b) => b[1] - a[1])
+        .map(([name, ratio]) => `${name} ${percent(ratio)}`)
+        .join(' | ');
+
+    const rows = [];
+    if (dims.time_pattern?.distribution) rows.push(['时段分布', distribution(dims.time_pattern.distribution)]);
+    if (dims.content_type?.distribution) rows.push(['发言类型分布', distribution(dims.content_type.distribution)]);
+    if (metrics.question_rate !== undefined) {
+        rows.push(['社交指标', `提问率 ${percent(metrics.question_rate)} | 回复率 ${percent(metrics.reply_rate)} | ` +
+            `附和率 ${percent(metrics.agreement_rate)} | 被提及 ${metrics.mentionFrequency || 0}‰`]);
+    }
+    if (dims.sentiment?.positive_ratio !== undefined) {
+        rows.push(['情感比例', `积极 ${percent(dims.sentiment.positive_ratio)} | 消极 ${percent(dims.sentiment.negative_ratio)}`]);
+    }
+    if (rows.length === 0) return '';
+
+    return `
+        <div class="user-info-item">
+            <div class="user-info-label">详细画像</div>
+            <div class="user-info-content">
+                ${rows.map(([label, text]) => `<small class="d-block">${label}: ${text}</small>`).join('')}
+            </div>
+        </div>
+    `;
+}
+
+function appendProfileDetail(user) {
+    loadProfileDetails(user).then(loaded => {
+        if ($('#modalUserDetail').data('userId') !== loaded.user_id) return;
+        $('#modalUserDetail').append(formatProfileDetails(loaded));
+    });
+}
+
 // 初始化所有tooltip
 function initializeTooltips() {
     // 销毁已有的tooltip实例以避免重复
@@ -1021,12 +1390,26 @@ function createContentTypeBarChart() {
     });
 }
 
+// 表格索引缓存：同一份数据只提取一次列值、每列只排序一次
+function getUserTableIndex(name, users, columns) {
+    if (!userTableIndexes[name]) {
+        userTableIndexes[name] = new UserListIndex(users, columns,
+            user => [user.nickname, user.main_group, ...columns.filter(Boolean).map(valueOf => valueOf(user))].join(' '));
+    }
+    return userTableIndexes[name];
+}
+
 // 初始化发言类型表格
 function initializeContentTypeTable() {
     const users = analyticsData.users;
-
-    // 桌面端表格数据
-    const tableData = users.map(user => {
+    const contentTypeOf = user => user.dimensions?.content_type?.type || '未知';
+    const index = getUserTableIndex('content_type', users, [
+        user => user.nickname, contentTypeOf, user => user.message_count || 0,
+        user => user.main_group || '未知群组', user => getContentTypeDescription(contentTypeOf(user)), null
+    ]);
+
+    // 只为当前页生成行
+    const renderRows = pageUsers => pageUsers.map(user => {
         const contentType = user.dimensions?.content_type || {};
 
         return [
@@ -1047,7 +1430,7 @@ function initializeContentTypeTable() {
         }
 
         $('#contentTypeTable').DataTable({
-            data: tableData,
+            ...virtualTableOptions(index, renderRows),
             language: {
                 url: 'https://cdn.datatables.net/plug-ins/1.13.4/i18n/zh.json'
             },
@@ -1072,10 +1455,11 @@ function generateMobileContentTypeList(users) {
     const container = $('#contentTypeListMobile');
     container.empty();
 
-    users.forEach(user => {
+    // 分批渲染，滚动到底部时追加
+    renderListIncrementally(container, users, user => {
         const contentType = user.dimensions?.content_type || {};
 
-        const itemHtml = `
+        return `
             <div class="card mb-2">
                 <div class="card-body py-2">
                     <div class="row align-items-center">
@@ -1097,7 +1481,6 @@ function generateMobileContentTypeList(users) {
                 </div>
             </div>
         `;
-        container.append(itemHtml);
     });
 }
 
@@ -1248,8 +1631,12 @@ function showCategoryUsersModal(type) {
 
 // 生成分类用户表格
 function generateCategoryUsersTable(users, type) {
-    // 桌面端表格数据
-    const tableData = users.map(user => {
+    const index = getUserTableIndex(`category|${type}`, users, [
+        user => user.nickname, user => user.message_count || 0, user => user.main_group || '未知群组', null, null
+    ]);
+
+    // 只为当前页生成行
+    const renderRows = pageUsers => pageUsers.map(user => {
         return [
             user.nickname,
             user.message_count || 0,
@@ -1266,7 +1653,7 @@ function generateCategoryUsersTable(users, type) {
 
     // 初始化新表格
     $('#categoryUsersTable').DataTable({
-        data: tableData,
+        ...virtualTableOptions(index, renderRows),
         language: {
             url: 'https://cdn.datatables.net/plug-ins/1.13.4/i18n/zh.json'
         },
@@ -1297,8 +1684,9 @@ function generateCategoryUsersMobileList(users, type) {
         return;
     }
 
-    users.forEach(user => {
-        const itemHtml = `
+    // 分批渲染，滚动到底部时追加
+    renderListIncrementally(container, users, user => {
+        return `
             <div class="card mb-2">
                 <div class="card-body py-2">
                     <div class="row align-items-center">
@@ -1320,10 +1708,20 @@ function generateCategoryUsersMobileList(users, type) {
                 </div>
             </div>
         `;
-        container.append(itemHtml);
     });
 }
 
+// 服务器端流式导出（/api/export）：浏览器把响应直接写入下载文件，页面内存中不拼接整个文件；
+// 先用HEAD确认接口可用，静态部署时回退到 fallback 在页面内生成文件
+function downloadExport(params, fallback) {
+    const url = `api/export?${$.param(params)}`;
+    $.ajax({ url: url, method: 'HEAD', timeout: 5000 }).then(() => {
+        const link = document.createElement('a');
+        link.href = url;
+        link.click();
+    }, fallback);
+}
+
 // 导出分类用户数据
 function exportCategoryUsers(users, type) {
     if (!users || users.length === 0) {
@@ -1331,6 +1729,10 @@ function exportCategoryUsers(users, type) {
         return;
     }
 
+    downloadExport({ dimension: 'content_type', type: type, format: 'csv' }, () => exportCategoryUsersInPage(users, type));
+}
+
+function exportCategoryUsersInPage(users, type) {
     // 准备导出数据
     const exportData = {
         分类信息: {
@@ -1383,9 +1785,16 @@ function initializeSocialBehaviorAnalysis() {
 // 初始化社交行为表格
 function initializeSocialBehaviorTable() {
     const users = analyticsData.users;
-
-    // 桌面端表格数据
-    const tableData = users.map(user => {
+    const socialOf = user => user.dimensions?.social_behavior || {};
+    const index = getUserTableIndex('social_behavior', users, [
+        user => user.nickname, user => socialOf(user).type || '未知',
+        user => Math.round(socialOf(user).metrics?.interactionScore || 0),
+        user => Math.round(socialOf(user).metrics?.influenceScore || 0),
+        user => user.main_group || '未知群组', user => getSocialBehaviorDescription(socialOf(user).type), null
+    ]);
+
+    // 只为当前页生成行
+    const renderRows = pageUsers => pageUsers.map(user => {
         const socialBehavior = user.dimensions?.social_behavior || {};
         const metrics = socialBehavior.metrics || {};
 
@@ -1408,7 +1817,7 @@ function initializeSocialBehaviorTable() {
         }
 
         $('#socialBehaviorTable').DataTable({
-            data: tableData,
+            ...virtualTableOptions(index, renderRows),
             language: {
                 url: 'https://cdn.datatables.net/plug-ins/1.13.4/i18n/zh.json'
             },
@@ -1433,11 +1842,12 @@ function generateMobileSocialBehaviorList(users) {
     const container = $('#socialBehaviorListMobile');
     container.empty();
 
-    users.forEach(user => {
+    // 分批渲染，滚动到底部时追加
+    renderListIncrementally(container, users, user => {
         const socialBehavior = user.dimensions?.social_behavior || {};
         const metrics = socialBehavior.metrics || {};
 
-        const itemHtml = `
+        return `
             <div class="card mb-2">
                 <div class="card-body py-2">
                     <div class="row align-items-center">
@@ -1459,7 +1869,6 @@ function generateMobileSocialBehaviorList(users) {
                 </div>
             </div>
         `;
-        container.append(itemHtml);
     });
 }
 
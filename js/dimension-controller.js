@@ -6,6 +6,8 @@ class DimensionController {
         this.filteredUsers = [];
         this.analyticsData = null;
         this.charts = {};
+        this.groupProfiles = {}; // 群组名 -> {user_id: 群内画像}，按需从服务端加载
+        this.listCache = {}; // "维度|群组" -> 加工后的用户列表及表格索引，切换标签页时复用
 
         this.initializeEventListeners();
     }
@@ -28,9 +30,10 @@ class DimensionController {
     // 设置数据
     setData(analyticsData) {
         this.analyticsData = analyticsData;
+        this.listCache = {};
         // 预处理加群时间数据
         this.preprocessMemberJoinTimeData();
-        this.filteredUsers = analyticsData.users;
+        this.filterUsersByGroup();
         this.initializeGroupSelector();
         this.refreshCurrentView();
     }
@@ -269,6 +272,29 @@ class DimensionController {
         this.currentGroup = groupName;
         this.filterUsersByGroup();
         this.refreshCurrentView();
+
+        if (groupName) {
+            this.loadGroupProfiles(groupName);
+        }
+    }
+
+    // 惰性加载群组内画像（统一服务器 /api/groups/profiles），静态部署时返回null
+    loadGroupProfiles(groupName) {
+        if (!(groupName in this.groupProfiles)) {
+            this.groupProfiles[groupName] = $.ajax({
+                url: 'api/groups/profiles',
+                data: { group: groupName },
+                dataType: 'json',
+                timeout: 10000
+            }).then(result => {
+                const profiles = {};
+                result.users.forEach(profile => {
+                    profiles[profile.user_id] = profile;
+                });
+                return profiles;
+            }, () => null);
+        }
+        return this.groupProfiles[groupName];
     }
 
     // 按群组过滤用户
@@ -374,7 +400,7 @@ class DimensionController {
                 `;
             });
 
-            insightsContainer.html(insightsHtml);
+            insightsContainer.html(insightsHtml + this.generateTrendInsight());
         } else {
             insightsContainer.html(`
                 <div class="insight-item">
@@ -388,8 +414,42 @@ class DimensionController {
         }
     }
 
+    // 近7天突发话题：选中群组时显示该群组，否则合并所有群组按z分数取前几个
+    generateTrendInsight() {
+        const trends = (this.analyticsData.stats && this.analyticsData.stats.trends) || {};
+        const groups = this.currentGroup ? [trends[this.currentGroup]] : Object.values(trends);
+        const terms = groups
+            .filter(Boolean)
+            .flatMap(result => result.terms)
+            .sort((a, b) => b.z - a.z)
+            .slice(0, 5);
+        if (terms.length === 0) return '';
+
+        const termsHtml = terms.map(t =>
+            `<span class="badge bg-warning text-dark me-1" title="${t.date}: ${t.count}条（基线 ${t.baseline}，z=${t.z}）">${t.term}</span>`
+        ).join('');
+        return `
+            <div class="insight-item">
+                <div class="insight-icon">
+                    <i class="fas fa-fire"></i>
+                </div>
+                <div class="insight-title">近期热点</div>
+                <div class="insight-value">${termsHtml}</div>
+            </div>
+        `;
+    }
+
     // 计算当前维度统计
+    // 当前维度统计（按 维度|群组 缓存；统计卡片、图表、洞察会多次读取同一份结果）
     calculateCurrentStats() {
+        const list = this.getCachedList();
+        if (!list.stats) {
+            list.stats = this.computeCurrentStats();
+        }
+        return list.stats;
+    }
+
+    computeCurrentStats() {
         const users = this.filteredUsers;
 
         switch (this.currentDimension) {
@@ -1174,6 +1234,7 @@ class DimensionController {
         let topNightOwlUsers = [];
         let regularUsers = [];
         let irregularUsers = [];
+        const bundle = typeof columnarBundle !== 'undefined' ? columnarBundle : null;
 
         users.forEach(user => {
             const timeData = user.dimensions?.time_pattern;
@@ -1186,10 +1247,12 @@ class DimensionController {
             // 统计分布
             distribution[type] = (distribution[type] || 0) + 1;
 
-            // 累计小时分布
-            Object.entries(hourData).forEach(([hour, count]) => {
-                hourDistribution[hour] = (hourDistribution[hour] || 0) + count;
-            });
+            // 累计小时分布（有列式数据包时在循环外按列累加）
+            if (!bundle) {
+                Object.entries(hourData).forEach(([hour, count]) => {
+                    hourDistribution[hour] = (hourDistribution[hour] || 0) + count;
+                });
+            }
 
             // 分类用户
             const userInfo = {
@@ -1210,6 +1273,13 @@ class DimensionController {
             }
         });
 
+        if (bundle) {
+            const { totals } = bundleHourTotals(bundle, bundleRowsInGroup(bundle, this.currentGroup));
+            totals.forEach((count, hour) => {
+                if (count > 0) hourDistribution[hour] = count;
+            });
+        }
+
         // 排序用户列表
         topMorningUsers.sort((a, b) => b.stats.morning_ratio - a.stats.morning_ratio);
         topNightOwlUsers.sort((a, b) => b.stats.early_morning_ratio - a.stats.early_morning_ratio);
@@ -2039,8 +2109,25 @@ class DimensionController {
         }
     }
 
-    // 根据当前维度处理用户数据
+    // 根据当前维度处理用户数据（按 维度|群组 缓存，数据更新时在 setData 中清空）
     processUsersForCurrentDimension() {
+        const list = this.getCachedList();
+        if (!list.processedUsers) {
+            list.processedUsers = this.buildProcessedUsers();
+        }
+        return list.processedUsers;
+    }
+
+    // 当前 维度|群组 的缓存：processedUsers、stats、表格索引
+    getCachedList() {
+        const key = `${this.currentDimension}|${this.currentGroup}`;
+        if (!this.listCache[key]) {
+            this.listCache[key] = {};
+        }
+        return this.listCache[key];
+    }
+
+    buildProcessedUsers() {
         const processedUsers = this.filteredUsers.map(user => {
             const dimensions = user.dimensions || {};
             const messageVolume = dimensions.message_volume || {};
@@ -2360,6 +2447,38 @@ class DimensionController {
         }
     }
 
+    // 桌面端表格各列的排序取值（与 generateDesktopTableData 的列一一对应，null为不可排序）
+    getDesktopSortColumns() {
+        const nickname = user => user.nickname;
+        const group = user => user.main_group || '未知群组';
+        const groupCount = user => user.all_groups ? user.all_groups.length : 1;
+        const count = user => user.currentDimensionData.count;
+        const level = user => user.currentDimensionData.level;
+        const tags = user => (user.profile_summary?.tags || []).join(' ');
+
+        switch (this.currentDimension) {
+            case 'time_pattern':
+                return [nickname, group, groupCount, count, level, null, null];
+            case 'content_type':
+                return [nickname, group, groupCount, count, level, tags, null];
+            case 'member_join_time':
+                return [nickname, group, groupCount, count, level, user => user.currentDimensionData.joinDate, tags, null];
+            case 'social_behavior':
+                const metric = name => user => user.dimensions?.social_behavior?.metrics?.[name] || 0;
+                return [nickname, user => user.dimensions?.social_behavior?.type || '社交观察型',
+                    metric('interactionScore'), metric('influenceScore'), group,
+                    user => this.getSocialBehaviorDescription(user.dimensions?.social_behavior?.type || user.currentDimensionData.level),
+                    null];
+            default:
+                return [nickname, group, groupCount, count, level, user => user.currentDimensionData.rank, tags, null];
+        }
+    }
+
+    // 移动端表格：用户信息、数量、类型、操作
+    getMobileSortColumns() {
+        return [user => user.nickname, user => user.currentDimensionData.count, user => user.currentDimensionData.level, null];
+    }
+
     // 生成桌面端表格数据
     generateDesktopTableData(processedUsers) {
         return processedUsers.map(user => {
@@ -2507,14 +2626,18 @@ class DimensionController {
 
         console.log(`${this.currentDimension} 维度将初始化主用户列表`);
 
-        // 桌面端表格数据
-        const desktopTableData = this.generateDesktopTableData(processedUsers);
-
-        // 移动端表格数据
-        const mobileTableData = this.generateMobileTableData(processedUsers);
+        // 表格按需渲染：排序/搜索在预先提取的列值上完成，只为当前页生成行（索引随 维度|群组 缓存）
+        const list = this.getCachedList();
+        if (!list.desktopIndex) {
+            const searchText = user => [user.nickname, user.main_group, user.currentDimensionData.level,
+                ...(user.profile_summary?.tags || [])].join(' ');
+            list.desktopIndex = new UserListIndex(processedUsers, this.getDesktopSortColumns(), searchText);
+            list.mobileIndex = new UserListIndex(processedUsers, this.getMobileSortColumns(), searchText);
+        }
 
-        // 验证数据一致性
-        console.log(`生成 ${this.currentDimension} 维度表格数据，共 ${desktopTableData.length} 行`);
+        // 用首行验证数据一致性（各行列数相同）
+        const desktopTableData = this.generateDesktopTableData(processedUsers.slice(0, 1));
+        console.log(`${this.currentDimension} 维度表格共 ${processedUsers.length} 行，按页渲染`);
         this.validateTableData(desktopTableData);
 
         // 获取当前维度的列数配置
@@ -2542,7 +2665,7 @@ class DimensionController {
             }
 
             const tableConfig = {
-                data: desktopTableData,
+                ...virtualTableOptions(list.desktopIndex, users => this.generateDesktopTableData(users)),
                 language: {
                     url: 'https://cdn.datatables.net/plug-ins/1.13.4/i18n/zh.json'
                 },
@@ -2586,7 +2709,7 @@ class DimensionController {
                 // 尝试降级处理：使用最基本的配置
                 try {
                     const basicConfig = {
-                        data: desktopTableData,
+                        data: this.generateDesktopTableData(processedUsers),
                         pageLength: 10,
                         searching: false,
                         ordering: false,
@@ -2603,7 +2726,7 @@ class DimensionController {
         // 初始化移动端表格
         if ($('#usersTableMobile').length > 0) {
             const mobileTableConfig = {
-                data: mobileTableData,
+                ...virtualTableOptions(list.mobileIndex, users => this.generateMobileTableData(users)),
                 language: {
                     url: 'https://cdn.datatables.net/plug-ins/1.13.4/i18n/zh.json'
                 },
@@ -2641,7 +2764,7 @@ class DimensionController {
                 // 尝试降级处理
                 try {
                     const basicMobileConfig = {
-                        data: mobileTableData,
+                        data: this.generateMobileTableData(processedUsers),
                         pageLength: 10,   // 与桌面端保持一致
                         searching: true,  // 启用搜索
                         ordering: false,
@@ -3355,8 +3478,20 @@ class DimensionController {
     }
 }
 
-// 导出数据功能
+// 导出数据功能：优先由服务器流式导出当前群组的用户画像（JSONL）
 function exportCurrentView() {
+    const controller = window.dimensionController;
+    if (!controller || !controller.analyticsData) {
+        alert('暂无数据可导出');
+        return;
+    }
+
+    const params = { dimension: controller.currentDimension, format: 'jsonl' };
+    if (controller.currentGroup) params.group = controller.currentGroup;
+    downloadExport(params, exportCurrentViewInPage);
+}
+
+function exportCurrentViewInPage() {
     if (window.dimensionController && window.dimensionController.analyticsData) {
         const data = {
             dimension: window.dimensionController.currentDimension,
@@ -0,0 +1,40 @@
+// 分析数据格式解码，主线程和数据加载Worker共用（Worker中通过 importScripts 引入）
+
+// 紧凑格式（compact_payload.py 生成）：字典编码的群组/标签/类型标签原地还原为字符串；
+// 24小时分布保持定长数组，按小时下标读取（hour_distribution[h]、Object.entries）与对象形式一致
+function decodeCompactPayload(data) {
+    if (!data || data.format !== 'compact-v1') return data;
+
+    const labelKeys = ['type', 'level', 'primary_type', 'secondary_type', 'overall_sentiment', 'description'];
+    const { groups, tags, labels } = data.dictionaries;
+    const users = data.users;
+
+    // 普通for循环原地替换，不为每个用户分配新对象或数组
+    for (let i = 0; i < users.length; i++) {
+        const user = users[i];
+        if (typeof user.main_group === 'number') user.main_group = groups[user.main_group];
+
+        const allGroups = user.all_groups || [];
+        for (let j = 0; j < allGroups.length; j++) allGroups[j] = groups[allGroups[j]];
+
+        for (const name in user.dimensions) {
+            const dimension = user.dimensions[name];
+            if (!dimension || typeof dimension !== 'object') continue;
+            for (let k = 0; k < labelKeys.length; k++) {
+                const key = labelKeys[k];
+                if (typeof dimension[key] === 'number') dimension[key] = labels[dimension[key]];
+            }
+        }
+
+        const summary = user.profile_summary;
+        if (summary) {
+            if (typeof summary.description === 'number') summary.description = labels[summary.description];
+            const userTags = summary.tags || [];
+            for (let j = 0; j < userTags.length; j++) userTags[j] = tags[userTags[j]];
+        }
+    }
+
+    delete data.format;
+    delete data.dictionaries;
+    return data;
+}
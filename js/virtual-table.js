@@ -0,0 +1,160 @@
+// 大用户列表的按需渲染
+// 列值预先提取为数组，排序/搜索只操作行号数组；DataTables 以 serverSide 模式运行，
+// 每次翻页/排序/搜索只为当前页的行生成HTML，DOM中只存在可见行
+
+class UserListIndex {
+    /**
+     * users: 行数据数组（用户或加工后的用户）
+     * columns: 每列的取值函数，返回数字或字符串用于排序；null 表示该列不可排序
+     * searchText: 行的可搜索文本
+     */
+    constructor(users, columns, searchText) {
+        this.users = users;
+        this.columns = columns;
+        this.searchTextOf = searchText;
+        this.searchTexts = null;   // 首次搜索时才生成
+        this.sortOrders = {};      // 列号 -> 升序行号（Uint32Array），每列只排序一次
+        this.lastSearch = { term: '', rows: null };
+    }
+
+    // 某列的升序行号；数字列用Float64Array比较，缺失值排在最前
+    sortedRows(column) {
+        if (!this.sortOrders[column]) {
+            const valueOf = this.columns[column];
+            const values = this.users.map(valueOf);
+            const numeric = values.every(value => typeof value === 'number' || value == null);
+            const keys = numeric
+                ? Float64Array.from(values, value => value == null || isNaN(value) ? -Infinity : value)
+                : values.map(value => String(value == null ? '' : value).toLowerCase());
+            const rows = new Uint32Array(this.users.length);
+            for (let i = 0; i < rows.length; i++) rows[i] = i;
+            // 相同值按原顺序（稳定排序）
+            rows.sort((a, b) => keys[a] < keys[b] ? -1 : keys[a] > keys[b] ? 1 : a - b);
+            this.sortOrders[column] = rows;
+        }
+        return this.sortOrders[column];
+    }
+
+    // 搜索：新关键词以上次关键词开头时只在上次结果中继续筛选（逐字输入时的常见情况）
+    filterRows(term) {
+        term = (term || '').trim().toLowerCase();
+        if (!term) return null;
+
+        if (!this.searchTexts) {
+            this.searchTexts = this.users.map(user => String(this.searchTextOf(user)).toLowerCase());
+        }
+        const previous = this.lastSearch;
+        const candidates = previous.rows && term.startsWith(previous.term) ? previous.rows : null;
+        const matched = [];
+        if (candidates) {
+            for (let i = 0; i < candidates.length; i++) {
+                if (this.searchTexts[candidates[i]].includes(term)) matched.push(candidates[i]);
+            }
+        } else {
+            for (let row = 0; row < this.searchTexts.length; row++) {
+                if (this.searchTexts[row].includes(term)) matched.push(row);
+            }
+        }
+        const rows = Uint32Array.from(matched);
+        this.lastSearch = { term: term, rows: rows };
+        return rows;
+    }
+
+    /**
+     * 查询一页：返回 {total, filtered, rows}，rows 为该页的行数据
+     * column 为null或不可排序时保持原顺序
+     */
+    query({ search = '', column = null, dir = 'asc', start = 0, length = 10 }) {
+        const filtered = this.filterRows(search);
+        const count = filtered ? filtered.length : this.users.length;
+        const sortable = column !== null && this.columns[column];
+        const end = Math.min(start + (length < 0 ? count : length), count);
+        const page = [];
+
+        if (!sortable) {
+            for (let i = start; i < end; i++) page.push(filtered ? filtered[i] : i);
+        } else {
+            // 在已缓存的排序结果上按方向遍历，跳过未命中搜索的行，不对筛选结果重新排序
+            const order = this.sortedRows(column);
+            let keep = null;
+            if (filtered) {
+                keep = new Uint8Array(this.users.length);
+                for (let i = 0; i < filtered.length; i++) keep[filtered[i]] = 1;
+            }
+            let seen = 0;
+            for (let i = 0; i < order.length && page.length < end - start; i++) {
+                const row = order[dir === 'desc' ? order.length - 1 - i : i];
+                if (keep && !keep[row]) continue;
+                if (seen++ >= start) page.push(row);
+            }
+        }
+
+        return {
+            total: this.users.length,
+            filtered: count,
+            rows: page.map(row => this.users[row])
+        };
+    }
+}
+
+// DataTables serverSide 配置：由 index 完成排序/搜索/分页，renderRows 只为当前页生成单元格
+function virtualTableOptions(index, renderRows) {
+    return {
+        serverSide: true,
+        processing: false,
+        searchDelay: 200,
+        ajax: function(request, callback) {
+            const order = request.order && request.order.length ? request.order[0] : null;
+            const result = index.query({
+                search: request.search ? request.search.value : '',
+                column: order ? order.column : null,
+                dir: order ? order.dir : 'asc',
+                start: request.start,
+                length: request.length
+            });
+            callback({
+                draw: request.draw,
+                recordsTotal: result.total,
+                recordsFiltered: result.filtered,
+                data: renderRows(result.rows)
+            });
+        }
+    };
+}
+
+// 移动端卡片列表分批渲染：先渲染一批，滚动到列表底部时再追加下一批
+function renderListIncrementally(container, items, renderItem, batchSize = 50) {
+    const element = container.get ? container.get(0) : container;
+    if (!element) return;
+    if (element.listObserver) {
+        element.listObserver.disconnect();
+        element.listObserver = null;
+    }
+
+    let rendered = 0;
+    const sentinel = document.createElement('div');
+    const appendBatch = () => {
+        const end = Math.min(rendered + batchSize, items.length);
+        let html = '';
+        for (let i = rendered; i < end; i++) html += renderItem(items[i]);
+        sentinel.insertAdjacentHTML('beforebegin', html);
+        rendered = end;
+        if (rendered >= items.length && element.listObserver) {
+            element.listObserver.disconnect();
+            element.listObserver = null;
+            sentinel.remove();
+        }
+    };
+
+    element.appendChild(sentinel);
+    if (typeof IntersectionObserver !== 'function') {
+        while (rendered < items.length) appendBatch();
+        sentinel.remove();
+        return;
+    }
+    element.listObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) appendBatch();
+    }, { rootMargin: '200px' });
+    element.listObserver.observe(sentinel);
+    appendBatch();
+}
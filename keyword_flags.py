@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+消息关键词命中标记
+每个关键词表在全部消息上只扫描一次，得到与消息表逐行对齐的布尔标记；
+时间线、相似用户索引、分群组画像共用同一份标记，不再各自对全表做 str.contains
+"""
+
+import re
+
+import numpy as np
+
+
+def keyword_pattern(keywords):
+    """关键词列表转换为一个正则，用于整列 str.contains"""
+    return '|'.join(re.escape(keyword) for keyword in keywords)
+
+
+def contains_any(contents, keywords):
+    """每条内容是否包含任一关键词（布尔数组）；关键词表为空时全部为False"""
+    if not keywords:
+        return np.zeros(len(contents), dtype=bool)
+    return contents.str.contains(keyword_pattern(keywords)).to_numpy(dtype=bool)
+
+
+class KeywordFlags:
+    """与消息表逐行对齐的关键词命中标记"""
+
+    def __init__(self, content_types, question, positive, negative, agreement):
+        """content_types: {类型名: 布尔数组}，顺序即关键词表顺序；其余为各关键词表的布尔数组"""
+        self.content_types = content_types
+        self.question = question
+        self.positive = positive
+        self.negative = negative
+        self.agreement = agreement
+
+    def __len__(self):
+        return len(self.question)
+
+    @classmethod
+    def build(cls, messages_df, content_keywords, question_words, positive_words, negative_words, agreement_words=()):
+        contents = messages_df['message_content'].fillna('').astype(str)
+        return cls(
+            {name: contains_any(contents, keywords) for name, keywords in content_keywords.items()},
+            contains_any(contents, question_words),
+            contains_any(contents, positive_words),
+            contains_any(contents, negative_words),
+            contains_any(contents, agreement_words)
+        )
+
+    def subset(self, mask):
+        """按布尔掩码或行号取部分消息的标记"""
+        return KeywordFlags(
+            {name: flags[mask] for name, flags in self.content_types.items()},
+            self.question[mask], self.positive[mask], self.negative[mask], self.agreement[mask]
+        )
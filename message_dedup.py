@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨数据源消息去重
+以 message_id 为键（notice 等非唯一ID回退到 chat_id + timestamp + user_id + 内容哈希），
+正常规模使用精确哈希集合，键数超过上限后切换为布隆过滤器，内存占用有界
+"""
+
+import hashlib
+import math
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# 计算去重键所需的列
+KEY_COLUMNS = ['message_id', 'chat_id', 'timestamp', 'user_id', 'message_content']
+
+
+def build_message_keys(df):
+    """生成消息去重键：数字message_id直接使用，否则回退到 (chat_id, timestamp, user_id, 内容哈希)"""
+    message_ids = df['message_id'].fillna('').astype(str)
+    has_id = message_ids.str.fullmatch(r'\d+')
+    if has_id.all():
+        return message_ids
+
+    # 只对缺少有效ID的行计算内容哈希
+    fallback_rows = df.loc[~has_id]
+    content_hashes = fallback_rows['message_content'].fillna('').astype(str).map(
+        lambda text: hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+    )
+    fallback = ('~' + fallback_rows['chat_id'].fillna('').astype(str) + ':' +
+                fallback_rows['timestamp'].astype(str) + ':' + fallback_rows['user_id'].astype(str) + ':' +
+                content_hashes)
+
+    keys = message_ids.copy()
+    keys.loc[~has_id] = fallback
+    return keys
+
+
+def hash_message_keys(df):
+    """将去重键映射为64位哈希，便于向量化处理"""
+    return pd.util.hash_pandas_object(build_message_keys(df), index=False).to_numpy(dtype=np.uint64)
+
+
+class BloomFilter:
+    """基于NumPy位数组的布隆过滤器，批量查询/插入64位哈希"""
+
+    def __init__(self, capacity, false_positive_rate=1e-4):
+        self.capacity = max(int(capacity), 1)
+        self.false_positive_rate = false_positive_rate
+        self.num_bits = int(math.ceil(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, hashes):
+        """双重哈希生成每个键的 k 个位位置，形状 (n, k)"""
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def contains(self, hashes):
+        """批量判断哈希是否可能已存在"""
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(hashes)
+        bit_set = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bit_set.all(axis=1)
+
+    def add(self, hashes):
+        """批量插入哈希"""
+        if len(hashes) == 0:
+            return
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        self.count += len(hashes)
+
+
+class MessageDeduplicator:
+    def __init__(self, max_exact_keys=2_000_000, false_positive_rate=1e-4, bloom_capacity=None):
+        """初始化去重器
+
+        max_exact_keys: 精确哈希集合允许的最大键数，超过后切换为布隆过滤器
+        false_positive_rate: 布隆过滤器目标误判率（误判会把极少量新消息当作重复）
+        bloom_capacity: 布隆过滤器设计容量，默认为 max_exact_keys 的4倍
+        """
+        self.max_exact_keys = max_exact_keys
+        self.false_positive_rate = false_positive_rate
+        self.bloom_capacity = bloom_capacity or max_exact_keys * 4
+        self.seen = set()
+        self.bloom = None
+        self.source_stats = defaultdict(lambda: {'total': 0, 'duplicates': 0})
+
+    @property
+    def mode(self):
+        return 'bloom' if self.bloom is not None else 'exact'
+
+    def _switch_to_bloom(self):
+        """精确集合超出上限时迁移到布隆过滤器"""
+        print(f"去重键数超过 {self.max_exact_keys}，切换为布隆过滤器 (误判率 {self.false_positive_rate})")
+        self.bloom = BloomFilter(max(self.bloom_capacity, len(self.seen) * 2), self.false_positive_rate)
+        self.bloom.add(np.fromiter(self.seen, dtype=np.uint64, count=len(self.seen)))
+        self.seen = set()
+
+    def filter(self, df, source='unknown'):
+        """过滤掉已出现过的消息，返回去重后的DataFrame"""
+        if len(df) == 0:
+            return df
+
+        hashes = hash_message_keys(df)
+        # 批内重复
+        duplicate_mask = pd.Series(hashes).duplicated().to_numpy(copy=True)
+
+        # 与之前批次重复
+        if self.bloom is not None:
+            duplicate_mask |= self.bloom.contains(hashes)
+        else:
+            duplicate_mask |= np.fromiter((h in self.seen for h in hashes.tolist()), dtype=bool, count=len(hashes))
+
+        new_hashes = hashes[~duplicate_mask]
+        if self.bloom is not None:
+            self.bloom.add(new_hashes)
+        else:
+            self.seen.update(new_hashes.tolist())
+            if len(self.seen) > self.max_exact_keys:
+                self._switch_to_bloom()
+
+        stats = self.source_stats[source]
+        stats['total'] += len(df)
+        stats['duplicates'] += int(duplicate_mask.sum())
+
+        return df[~duplicate_mask]
+
+    def report(self):
+        """各数据源的重复统计"""
+        return {
+            'mode': self.mode,
+            'total_duplicates': sum(stats['duplicates'] for stats in self.source_stats.values()),
+            'sources': {source: dict(stats) for source, stats in self.source_stats.items()}
+        }
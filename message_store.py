@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite消息存储 - CSV备份之外的可索引数据后端
+将 messages_*_enhanced.csv 与 users_enhanced.csv 导入带索引的SQLite数据库，
+支持按用户、群组、时间范围的下钻查询，无需每次全量加载CSV
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from message_dedup import build_message_keys
+from snapshot_ingest import DATA_ROOT, SnapshotManifest, discover_message_files, discover_user_files
+
+DEFAULT_DB_PATH = "data/messages.db"
+
+# 与处理器加载数据时的过滤口径一致：排除武小纺机器人(user_id: 3655943918)的消息
+HUMAN_MESSAGES = "user_id != 3655943918 AND user_nickname IS NOT '武小纺'"
+
+# 消息表字段及SQLite类型（与 messages_*_enhanced.csv 列一致）
+MESSAGE_COLUMNS = {
+    'message_id': 'TEXT',
+    'timestamp': 'REAL',
+    'readable_time': 'TEXT',
+    'date': 'TEXT',
+    'hour': 'INTEGER',
+    'weekday': 'TEXT',
+    'chat_id': 'TEXT',
+    'reply_to': 'TEXT',
+    'user_id': 'INTEGER',
+    'user_nickname': 'TEXT',
+    'user_cardname': 'TEXT',
+    'group_id': 'INTEGER',
+    'group_name': 'TEXT',
+    'message_content': 'TEXT',
+    'display_message': 'TEXT',
+    'is_ai_message': 'INTEGER',
+    'message_type': 'TEXT',
+    'memorized_times': 'INTEGER',
+    'source_db': 'TEXT'
+}
+
+# 用户表字段及SQLite类型（与 users_enhanced.csv 列一致）
+USER_COLUMNS = {
+    'user_id': 'INTEGER',
+    'nickname': 'TEXT',
+    'cardname': 'TEXT',
+    'person_name': 'TEXT',
+    'platform': 'TEXT',
+    'group_id': 'INTEGER',
+    'group_name': 'TEXT',
+    'impression': 'TEXT',
+    'familiarity_value': 'REAL',
+    'liking_value': 'REAL',
+    'source_db': 'TEXT'
+}
+
+# 读取CSV时的列类型，避免ID被解析成浮点数
+CSV_DTYPES = {
+    'message_id': str,
+    'reply_to': str,
+    'chat_id': str,
+    'group_id': 'Int64',
+    'user_id': 'Int64'
+}
+
+
+def _to_records(df, columns):
+    """将DataFrame转换为SQLite可写入的记录列表（NaN/NA转为None）"""
+    frame = df.reindex(columns=columns).astype(object)
+    frame = frame.where(pd.notna(frame), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+class MessageStore:
+    def __init__(self, db_path=DEFAULT_DB_PATH, wal=True):
+        """初始化消息存储"""
+        self.db_path = db_path
+        self.wal = wal
+        self.local = threading.local()
+        self.schema_ready = False
+
+    @property
+    def conn(self):
+        """当前线程的数据库连接，未连接时为None"""
+        return getattr(self.local, 'conn', None)
+
+    def connect(self):
+        """打开当前线程的数据库连接，首次连接时建表
+
+        每个线程使用自己的连接：服务器多线程处理请求时各线程并发读取，互不共用游标
+        """
+        if self.conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            if self.wal:
+                # WAL模式下读写互不阻塞，支持多个读者并发查询
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            if not self.schema_ready:
+                self.create_schema()
+                self.schema_ready = True
+        return self.conn
+
+    def close(self):
+        """关闭当前线程的数据库连接（其他线程的连接随线程结束释放）"""
+        if self.conn is not None:
+            self.conn.close()
+            self.local.conn = None
+
+    def create_schema(self):
+        """创建消息表、用户表及查询索引"""
+        message_fields = ",\n".join(f"{name} {sql_type}" for name, sql_type in MESSAGE_COLUMNS.items())
+        user_fields = ",\n".join(f"{name} {sql_type}" for name, sql_type in USER_COLUMNS.items())
+
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS messages (
+                message_key TEXT PRIMARY KEY,
+                {message_fields}
+            );
+            CREATE TABLE IF NOT EXISTS users (
+                {user_fields},
+                source_file TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_user_time ON messages (user_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_messages_group_date ON messages (group_id, date);
+            CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id);
+            CREATE INDEX IF NOT EXISTS idx_users_user ON users (user_id);
+        """)
+        self.conn.commit()
+
+    def _bump_generation(self, conn):
+        """数据代数加一；与导入写在同一事务中提交"""
+        conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+    def generation(self):
+        """数据代数：每次导入文件加一，读者据此判断数据是否变化（主键查询，开销与库大小无关）"""
+        conn = self.connect()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def import_messages_csv(self, csv_path, chunksize=5000):
+        """导入消息CSV，按message_id幂等upsert（notice等非唯一ID使用回退键）"""
+        conn = self.connect()
+        columns = list(MESSAGE_COLUMNS)
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns)
+        sql = (f"INSERT INTO messages (message_key, {', '.join(columns)}) VALUES ({placeholders}) "
+               f"ON CONFLICT(message_key) DO UPDATE SET {updates}")
+
+        imported = 0
+        for chunk in pd.read_csv(csv_path, encoding='utf-8', dtype=CSV_DTYPES, chunksize=chunksize):
+            chunk = chunk.copy()
+            chunk.insert(0, 'message_key', build_message_keys(chunk))
+            conn.executemany(sql, _to_records(chunk, ['message_key'] + columns))
+            imported += len(chunk)
+        # upsert 可能只改写已有消息，消息数不变，因此按导入次数而不是消息数标记变化
+        self._bump_generation(conn)
+        conn.commit()
+        return imported
+
+    def import_users_csv(self, csv_path):
+        """导入用户CSV；同一文件重复导入时先删除旧记录，保证幂等"""
+        conn = self.connect()
+        users_df = pd.read_csv(csv_path, encoding='utf-8', dtype=CSV_DTYPES)
+        users_df['source_file'] = os.path.abspath(csv_path)
+
+        columns = list(USER_COLUMNS) + ['source_file']
+        placeholders = ", ".join("?" for _ in columns)
+        with conn:
+            conn.execute("DELETE FROM users WHERE source_file = ?", (os.path.abspath(csv_path),))
+            conn.executemany(f"INSERT INTO users ({', '.join(columns)}) VALUES ({placeholders})",
+                             _to_records(users_df, columns))
+            self._bump_generation(conn)
+        return len(users_df)
+
+    def import_backup_dir(self, base_path=DATA_ROOT, force=False):
+        """导入所有 data_backup_* 快照中的消息和用户CSV，跳过清单中未变化的文件"""
+        summary = {'messages': 0, 'users': 0, 'files': [], 'skipped': []}
+        manifest = SnapshotManifest(f"{self.db_path}.manifest.json")
+
+        imports = ([(path, self.import_messages_csv, 'messages') for path in discover_message_files(base_path)] +
+                   [(path, self.import_users_csv, 'users') for path in discover_user_files(base_path)])
+
+        for csv_path, import_func, kind in imports:
+            if not force and manifest.is_unchanged(csv_path):
+                summary['skipped'].append(csv_path)
+                print(f"跳过未变化文件 {csv_path}")
+                continue
+
+            count = import_func(csv_path)
+            summary[kind] += count
+            summary['files'].append(csv_path)
+            manifest.record(csv_path)
+            print(f"导入{'消息' if kind == 'messages' else '用户'} {csv_path}: {count} 条")
+
+        manifest.save()
+        return summary
+
+    def load_messages(self, columns=None):
+        """以DataFrame形式读取全部消息"""
+        conn = self.connect()
+        selected = ", ".join(columns) if columns else ", ".join(MESSAGE_COLUMNS)
+        return pd.read_sql_query(f"SELECT {selected} FROM messages ORDER BY timestamp", conn)
+
+    def load_users(self, columns=None):
+        """以DataFrame形式读取全部用户记录"""
+        conn = self.connect()
+        selected = ", ".join(columns) if columns else ", ".join(USER_COLUMNS)
+        return pd.read_sql_query(f"SELECT {selected} FROM users", conn)
+
+    def query_user_messages(self, user_id, group_id=None, date_from=None, date_to=None, limit=200):
+        """按用户下钻查询消息，走 (user_id, timestamp) 索引"""
+        conn = self.connect()
+        conditions = ["user_id = ?"]
+        params = [int(user_id)]
+
+        if group_id is not None:
+            conditions.append("group_id = ?")
+            params.append(int(group_id))
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("date <= ?")
+            params.append(date_to)
+
+        sql = (f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE {' AND '.join(conditions)} "
+               f"ORDER BY timestamp DESC LIMIT ?")
+        params.append(int(limit))
+        return [dict(row) for row in conn.execute(sql, params)]
+
+    def query_group_messages(self, group_id, date_from=None, date_to=None, limit=200):
+        """按群组和日期范围查询消息，走 (group_id, date) 索引"""
+        conn = self.connect()
+        conditions = ["group_id = ?"]
+        params = [int(group_id)]
+
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("date <= ?")
+            params.append(date_to)
+
+        sql = (f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE {' AND '.join(conditions)} "
+               f"ORDER BY timestamp DESC LIMIT ?")
+        params.append(int(limit))
+        return [dict(row) for row in conn.execute(sql, params)]
+
+    def load_user_messages(self, user_id):
+        """以DataFrame形式读取单个用户的全部消息，走 (user_id, timestamp) 索引"""
+        conn = self.connect()
+        return pd.read_sql_query(
+            f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE user_id = ? ORDER BY timestamp",
+            conn, params=(int(user_id),)
+        )
+
+    def count_mentions(self, user_id, nickname):
+        """其他用户（不含机器人）消息中包含该昵称的条数"""
+        conn = self.connect()
+        return conn.execute(
+            f"SELECT COUNT(*) FROM messages WHERE user_id != ? AND {HUMAN_MESSAGES} AND instr(message_content, ?) > 0",
+            (int(user_id), nickname)
+        ).fetchone()[0]
+
+    def count_messages(self, humans_only=False):
+        """消息总数；humans_only 时不含机器人消息，与处理器统计的消息总数口径一致"""
+        conn = self.connect()
+        where = f" WHERE {HUMAN_MESSAGES}" if humans_only else ""
+        return conn.execute(f"SELECT COUNT(*) FROM messages{where}").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite消息存储管理')
+    subparsers = parser.add_subparsers(dest='command')
+
+    import_parser = subparsers.add_parser('import', help='将CSV备份导入SQLite数据库')
+    import_parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f'数据库路径 (默认: {DEFAULT_DB_PATH})')
+    import_parser.add_argument('--source', default=DATA_ROOT, help='CSV备份根目录或单个快照目录')
+    import_parser.add_argument('--force', action='store_true', help='忽略文件清单，重新导入全部文件')
+
+    args = parser.parse_args()
+
+    if args.command != 'import':
+        parser.print_help()
+        return
+
+    print("=== 导入CSV备份到SQLite ===")
+    store = MessageStore(args.db)
+    try:
+        summary = store.import_backup_dir(args.source, force=args.force)
+        print(f"\n导入完成：消息 {summary['messages']} 条，用户 {summary['users']} 条，跳过 {len(summary['skipped'])} 个未变化文件")
+        print(f"数据库消息总数: {store.count_messages()}")
+        print(f"数据库路径: {args.db}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画像指标排名
+把所有用户的数值指标整理成 用户×指标 矩阵，每个指标列只做一次argsort，
+同时得到排名（并列取最高名次）和百分位；发言量分级阈值用 np.partition 取顺序统计量，不做整体排序
+"""
+
+import numpy as np
+
+# 指标名 -> 画像中的候选路径（快速/增强处理器的字段位置不同，取第一个存在的）
+RANK_METRICS = {
+    'message_count': [('message_count',), ('dimensions', 'message_volume', 'total_messages')],
+    'avg_length': [('avg_message_length',), ('dimensions', 'message_volume', 'avg_length')],
+    'daily_average': [('dimensions', 'message_volume', 'daily_average')],
+    'question_rate': [('dimensions', 'social_behavior', 'metrics', 'question_rate')],
+    'reply_rate': [('dimensions', 'social_behavior', 'metrics', 'reply_rate')],
+    'agreement_rate': [('dimensions', 'social_behavior', 'metrics', 'agreement_rate')],
+    'interaction_score': [('dimensions', 'social_behavior', 'metrics', 'interactionScore')],
+    'influence_score': [('dimensions', 'social_behavior', 'metrics', 'influenceScore')]
+}
+
+
+def _lookup(profile, paths):
+    for path in paths:
+        value = profile
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return value
+    return np.nan
+
+
+def metric_matrix(users_data, metrics=RANK_METRICS):
+    """用户×指标 的float矩阵，缺失值为NaN；所有用户都缺失的指标不返回"""
+    names = list(metrics)
+    matrix = np.array([[_lookup(user, metrics[name]) for name in names] for user in users_data], dtype=float)
+    matrix = matrix.reshape(len(users_data), len(names))
+    present = ~np.isnan(matrix).all(axis=0)
+    return matrix[:, present], [name for name, keep in zip(names, present) if keep]
+
+
+def rank_columns(matrix):
+    """每列一次argsort（降序）：返回排名（1为最高，并列取相同名次）和百分位（不高于该值的用户占比）
+
+    NaN 不参与排名，对应位置排名为0、百分位为NaN
+    """
+    num_users = matrix.shape[0]
+    valid = ~np.isnan(matrix)
+    keys = np.where(valid, -matrix, np.inf)
+    order = np.argsort(keys, axis=0, kind='stable')
+    sorted_keys = np.take_along_axis(keys, order, axis=0)
+
+    ranks = np.zeros(matrix.shape, dtype=np.int64)
+    percentiles = np.full(matrix.shape, np.nan)
+    counts = valid.sum(axis=0)
+    for column in range(matrix.shape[1]):
+        # 同值的第一个位置即并列名次；百分位 = 1 - 严格更高的用户数 / 有效用户数
+        higher = np.searchsorted(sorted_keys[:, column], sorted_keys[:, column], side='left')
+        ranks[order[:, column], column] = higher + 1
+        percentiles[order[:, column], column] = (1 - higher / max(counts[column], 1)) * 100
+    ranks[~valid] = 0
+    percentiles[~valid] = np.nan
+    return ranks, percentiles
+
+
+def descending_order_statistics(values, positions):
+    """降序排列后第 positions 位的值（np.partition，O(n)），等价于 sorted(values, reverse=True)[position]"""
+    values = np.asarray(values, dtype=float)
+    kth = len(values) - 1 - np.asarray(positions)
+    return np.partition(values, kth)[kth]
+
+
+def assign_ranks(users_data, metrics=RANK_METRICS):
+    """为每个用户写入各指标的排名和百分位，并同步到发言量维度的 rank/percentile；返回发言量排名数组"""
+    if not users_data:
+        return np.zeros(0, dtype=np.int64)
+    matrix, names = metric_matrix(users_data, metrics)
+    ranks, percentiles = rank_columns(matrix)
+
+    for row, user in enumerate(users_data):
+        user['ranks'] = {
+            name: {'rank': int(ranks[row, column]), 'percentile': round(float(percentiles[row, column]), 1)}
+            for column, name in enumerate(names) if ranks[row, column] > 0
+        }
+        volume = user['ranks'].get('message_count', {'rank': 0, 'percentile': 0})
+        user['dimensions']['message_volume']['rank'] = volume['rank']
+        user['dimensions']['message_volume']['percentile'] = volume['percentile']
+
+    return ranks[:, names.index('message_count')] if 'message_count' in names else np.zeros(len(users_data), dtype=np.int64)
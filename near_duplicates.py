@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近重复消息与刷屏检测
+消息文本切分为字符n-gram，分批向量化计算MinHash签名，按LSH分段分桶找出候选对，
+用签名估计的Jaccard相似度校验后求连通分量，得到近重复消息簇；全程无两两比较
+"""
+
+import numpy as np
+import pandas as pd
+
+NGRAM = 3
+NUM_PERM = 64
+NUM_BANDS = 16
+SIMILARITY_THRESHOLD = 0.8
+MIN_LENGTH = 10  # 短于该长度的消息（"哈哈"、"好的"）不参与检测
+MIN_FLAG_MESSAGES = 5
+FLAG_RATIO = 0.2
+_GRAM_PRIME = np.uint64(1099511628211)
+
+
+def shingle_hashes(texts, n=NGRAM):
+    """所有消息的字符n-gram哈希：一次编码为UTF-32码点数组后整体滚动组合，返回 (所属消息下标, 哈希)"""
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    num_grams = np.maximum(lengths - n + 1, 0)
+
+    owner = np.repeat(np.arange(len(texts)), num_grams)
+    offsets = np.arange(num_grams.sum()) - np.repeat(np.cumsum(num_grams) - num_grams, num_grams)
+    positions = starts[owner] + offsets
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for k in range(n):
+        hashes = hashes * _GRAM_PRIME + codes[positions + k]
+    return owner, hashes
+
+
+def connected_components(num_nodes, src, dst):
+    """最小标签传播 + 指针跳跃求连通分量，返回每个节点所在分量的最小节点号"""
+    labels = np.arange(num_nodes)
+    while True:
+        smallest = np.minimum(labels[src], labels[dst])
+        updated = labels.copy()
+        np.minimum.at(updated, src, smallest)
+        np.minimum.at(updated, dst, smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+class NearDuplicateDetector:
+    def __init__(self, ngram=NGRAM, num_perm=NUM_PERM, num_bands=NUM_BANDS, threshold=SIMILARITY_THRESHOLD,
+                 min_length=MIN_LENGTH, seed=42, grams_per_batch=50000):
+        """num_perm 个哈希函数分成 num_bands 段；threshold 为校验候选对时的最低估计相似度"""
+        if num_perm % num_bands:
+            raise ValueError('num_perm 必须能被 num_bands 整除')
+        self.ngram = ngram
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.threshold = threshold
+        self.min_length = min_length
+        self.grams_per_batch = grams_per_batch
+        rng = np.random.default_rng(seed)
+        # 乘法移位哈希：(a*x + b) 取高32位，a 取奇数
+        self.hash_a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.hash_b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+        self.cluster = None
+        self.is_duplicate = None
+        self.self_repeat = None
+        self.user_stats = None
+
+    def signatures(self, texts):
+        """分批计算MinHash签名 (消息, num_perm)；每批按n-gram数量切分，控制内存"""
+        owner, hashes = shingle_hashes(texts, self.ngram)
+        signatures = np.zeros((len(texts), self.num_perm), dtype=np.uint32)
+        gram_starts = np.searchsorted(owner, np.arange(len(texts) + 1))
+
+        message = 0
+        while message < len(texts):
+            end = int(np.searchsorted(gram_starts, gram_starts[message] + self.grams_per_batch, side='right')) - 1
+            end = min(max(end, message + 1), len(texts))
+            lo, hi = gram_starts[message], gram_starts[end]
+            with np.errstate(over='ignore'):
+                permuted = (hashes[lo:hi][None, :] * self.hash_a[:, None] + self.hash_b[:, None]) >> np.uint64(32)
+            signatures[message:end] = np.minimum.reduceat(permuted, gram_starts[message:end] - lo, axis=1).T
+            message = end
+        return signatures
+
+    def candidate_pairs(self, signatures):
+        """LSH分段：任一段完全相同的消息成为候选，同桶内按排序相邻连边"""
+        rows = self.num_perm // self.num_bands
+        src, dst = [], []
+        multipliers = _GRAM_PRIME ** np.arange(rows, dtype=np.uint64)
+        for band in range(self.num_bands):
+            with np.errstate(over='ignore'):
+                keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+            order = np.argsort(keys, kind='stable')
+            same = keys[order][1:] == keys[order][:-1]
+            src.append(order[:-1][same])
+            dst.append(order[1:][same])
+        src, dst = np.concatenate(src), np.concatenate(dst)
+
+        # 用签名估计的Jaccard相似度过滤假阳性
+        similar = (signatures[src] == signatures[dst]).mean(axis=1) >= self.threshold
+        return src[similar], dst[similar]
+
+    def detect(self, messages_df):
+        """检测近重复消息；结果数组与 messages_df 的行一一对应"""
+        texts = messages_df['message_content'].fillna('').astype(str).str.strip().str.lower()
+        eligible = np.flatnonzero((texts.str.len() >= max(self.min_length, self.ngram)).to_numpy())
+        num_messages = len(messages_df)
+
+        self.cluster = np.full(num_messages, -1, dtype=np.int64)
+        self.is_duplicate = np.zeros(num_messages, dtype=bool)
+        self.self_repeat = np.zeros(num_messages, dtype=bool)
+
+        if len(eligible) > 1:
+            signatures = self.signatures(texts.to_numpy()[eligible].tolist())
+            src, dst = self.candidate_pairs(signatures)
+            labels = connected_components(len(eligible), src, dst)
+            sizes = np.bincount(labels, minlength=len(eligible))
+            in_cluster = sizes[labels] > 1
+            self.cluster[eligible[in_cluster]] = labels[in_cluster]
+
+        # 簇内按时间排序：第一条视为原始消息，其余为重复；与同一用户更早的消息同簇则为自我重复
+        clustered = np.flatnonzero(self.cluster >= 0)
+        if len(clustered):
+            timestamps = messages_df['timestamp'].to_numpy(dtype=float)[clustered]
+            users = pd.factorize(messages_df['user_id'])[0][clustered]
+            clusters = self.cluster[clustered]
+
+            order = np.lexsort((timestamps, clusters))
+            first_in_cluster = np.ones(len(order), dtype=bool)
+            first_in_cluster[1:] = clusters[order][1:] != clusters[order][:-1]
+            self.is_duplicate[clustered[order]] = ~first_in_cluster
+
+            order = np.lexsort((timestamps, users, clusters))
+            first_of_user = np.ones(len(order), dtype=bool)
+            first_of_user[1:] = (clusters[order][1:] != clusters[order][:-1]) | (users[order][1:] != users[order][:-1])
+            self.self_repeat[clustered[order]] = ~first_of_user
+
+        self.user_stats = self._aggregate_users(messages_df)
+        return self
+
+    def _aggregate_users(self, messages_df):
+        user_codes, user_ids = pd.factorize(messages_df['user_id'])
+        total = np.bincount(user_codes, minlength=len(user_ids))
+        duplicates = np.bincount(user_codes, weights=self.is_duplicate, minlength=len(user_ids))
+        self_repeats = np.bincount(user_codes, weights=self.self_repeat, minlength=len(user_ids))
+        safe_total = np.maximum(total, 1)
+        return pd.DataFrame({
+            'total_messages': total,
+            'duplicate_messages': duplicates.astype(int),
+            'self_repeat_messages': self_repeats.astype(int),
+            'duplicate_ratio': duplicates / safe_total,
+            'self_repeat_ratio': self_repeats / safe_total
+        }, index=pd.Index(user_ids, name='user_id'))
+
+    def profile_for(self, user_id):
+        """单个用户的重复度指标和标记"""
+        if self.user_stats is None or user_id not in self.user_stats.index:
+            return {'duplicate_messages': 0, 'duplicate_ratio': 0.0, 'self_repeat_ratio': 0.0, 'flags': []}
+        row = self.user_stats.loc[user_id]
+        copied = row['duplicate_messages'] - row['self_repeat_messages']
+        flags = []
+        if row['self_repeat_messages'] >= MIN_FLAG_MESSAGES and row['self_repeat_ratio'] >= FLAG_RATIO:
+            flags.append('重复刷屏')
+        if copied >= MIN_FLAG_MESSAGES and copied / max(row['total_messages'], 1) >= FLAG_RATIO:
+            flags.append('复制转发')
+        return {
+            'duplicate_messages': int(row['duplicate_messages']),
+            'duplicate_ratio': round(float(row['duplicate_ratio']), 3),
+            'self_repeat_ratio': round(float(row['self_repeat_ratio']), 3),
+            'flags': flags
+        }
+
+    def summary(self, messages_df, top_clusters=5):
+        """全局统计：簇数量、重复消息数，以及最大的几个重复簇的示例文本"""
+        clustered = self.cluster[self.cluster >= 0]
+        cluster_ids, sizes = np.unique(clustered, return_counts=True)
+        largest = cluster_ids[np.argsort(-sizes, kind='stable')[:top_clusters]]
+        contents = messages_df['message_content'].fillna('').astype(str).to_numpy()
+        return {
+            'clusters': int(len(cluster_ids)),
+            'clustered_messages': int(len(clustered)),
+            'duplicate_messages': int(self.is_duplicate.sum()),
+            'flagged_users': int(sum(1 for user_id in self.user_stats.index if self.profile_for(user_id)['flags'])),
+            'largest_clusters': [
+                {
+                    'size': int((self.cluster == cluster).sum()),
+                    'users': int(pd.unique(messages_df['user_id'].to_numpy()[self.cluster == cluster]).size),
+                    'sample': contents[np.flatnonzero(self.cluster == cluster)[0]][:60]
+                }
+                for cluster in largest
+            ]
+        }
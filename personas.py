@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据驱动的用户群像（Persona）
+在相似用户索引的特征矩阵上运行 Mini-Batch K-Means：按用户批次流式更新质心，
+随机种子固定的 k-means++ 初始化保证结果可复现，模型保存后下次运行可从已有质心热启动
+"""
+
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+PERSONA_MODEL_PATHS = {
+    'enhanced': "data/persona_model_enhanced.npz",
+    'fast': "data/persona_model_fast.npz"
+}
+
+FEATURE_DESCRIPTIONS = {
+    'question_rate': '爱提问',
+    'reply_rate': '常回复',
+    'agreement_rate': '常附和',
+    'positive_rate': '积极',
+    'negative_rate': '消极',
+    'log_messages': '高发言量'
+}
+
+
+def squared_distances(vectors, centroids):
+    """样本到各质心的平方欧氏距离 (样本, 质心)"""
+    distances = (vectors ** 2).sum(axis=1)[:, None] - 2 * vectors @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+    return np.maximum(distances, 0)
+
+
+class MiniBatchKMeans:
+    def __init__(self, n_clusters=8, batch_size=256, max_iter=200, tol=1e-4, seed=42, feature_names=None):
+        """n_clusters: 群像数量；batch_size: 每批用户数；max_iter: 最多处理的批次数"""
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+        self.seed = seed
+        self.feature_names = list(feature_names or [])
+        self.centroids = None
+        self.counts = None
+        self.warm_started = False
+
+    def init_centroids(self, vectors, rng, sample_size=10000):
+        """k-means++ 初始化：在随机抽样上按距离平方概率依次选取质心"""
+        sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+        centroids = [sample[rng.integers(len(sample))]]
+        closest = squared_distances(sample, np.array(centroids))[:, 0]
+        for _ in range(1, self.n_clusters):
+            total = closest.sum()
+            index = rng.choice(len(sample), p=closest / total) if total > 0 else rng.integers(len(sample))
+            centroids.append(sample[index])
+            closest = np.minimum(closest, squared_distances(sample, sample[index][None, :])[:, 0])
+        self.centroids = np.array(centroids, dtype=np.float32)
+        self.counts = np.zeros(self.n_clusters)
+
+    def partial_fit(self, batch):
+        """用一个批次更新质心：每个质心移动到其历史样本与本批样本的累计均值"""
+        labels = squared_distances(batch, self.centroids).argmin(axis=1)
+        batch_counts = np.bincount(labels, minlength=self.n_clusters)
+        batch_sums = np.zeros_like(self.centroids, dtype=np.float64)
+        np.add.at(batch_sums, labels, batch)
+
+        new_counts = self.counts + batch_counts
+        updated = batch_counts > 0
+        previous = self.centroids.copy()
+        self.centroids[updated] = (
+            (self.centroids[updated] * self.counts[updated, None] + batch_sums[updated]) / new_counts[updated, None]
+        ).astype(np.float32)
+        self.counts = new_counts
+        return float(np.abs(self.centroids - previous).sum())
+
+    def fit(self, vectors):
+        """流式训练：每轮按随机顺序取一批用户；vectors 可以是内存映射数组，只有当前批次会被读入内存"""
+        rng = np.random.default_rng(self.seed)
+        num_samples = len(vectors)
+        if num_samples == 0:
+            return self
+        self.n_clusters = min(self.n_clusters, num_samples)
+        if self.centroids is None or len(self.centroids) != self.n_clusters:
+            self.init_centroids(vectors, rng)
+
+        shift_average = None
+        for _ in range(self.max_iter):
+            batch_index = np.sort(rng.choice(num_samples, min(self.batch_size, num_samples), replace=False))
+            shift = self.partial_fit(np.asarray(vectors[batch_index], dtype=np.float32))
+            shift_average = shift if shift_average is None else 0.9 * shift_average + 0.1 * shift
+            if shift_average < self.tol:
+                break
+        return self
+
+    def predict(self, vectors, batch_size=4096):
+        """分批计算每个样本的簇编号和到质心的距离"""
+        labels = np.empty(len(vectors), dtype=np.int64)
+        distances = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+            squared = squared_distances(batch, self.centroids)
+            labels[start:start + batch_size] = squared.argmin(axis=1)
+            distances[start:start + batch_size] = np.sqrt(squared.min(axis=1))
+        return labels, distances
+
+    def save(self, path):
+        model_dir = os.path.dirname(path)
+        if model_dir:
+            os.makedirs(model_dir, exist_ok=True)
+        meta = {'seed': self.seed, 'batch_size': self.batch_size, 'feature_names': self.feature_names}
+        np.savez(path, centroids=self.centroids, counts=self.counts, meta=json.dumps(meta, ensure_ascii=False))
+        print(f"群像模型已保存到 {path}：{self.n_clusters} 个簇")
+
+    @classmethod
+    def load(cls, path, warm_start_decay=0.5):
+        """加载已有模型用于热启动；累计计数按比例衰减，让新数据仍能移动质心"""
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            model = cls(len(data['centroids']), meta['batch_size'], seed=meta['seed'], feature_names=meta['feature_names'])
+            model.centroids = data['centroids'].astype(np.float32)
+            model.counts = data['counts'] * warm_start_decay
+        model.warm_started = True
+        return model
+
+
+def describe_feature(name):
+    """特征名转换为群像名称中使用的短语"""
+    if name.startswith('hour_'):
+        return f"{name[5:]}点活跃"
+    if name.startswith('type:'):
+        return name[5:]
+    return FEATURE_DESCRIPTIONS.get(name, name)
+
+
+def load_or_create_model(n_clusters, feature_names, path, seed=42):
+    """特征和簇数与已保存模型一致时热启动，否则重新初始化
+
+    两个处理器的特征来源不同，各自使用 PERSONA_MODEL_PATHS 中的模型文件，互不覆盖
+    """
+    if os.path.exists(path):
+        model = MiniBatchKMeans.load(path)
+        if model.n_clusters == n_clusters and model.feature_names == list(feature_names):
+            print(f"从 {path} 热启动群像模型")
+            return model
+        print("已保存的群像模型与当前特征或簇数不一致，重新初始化")
+    return MiniBatchKMeans(n_clusters, seed=seed, feature_names=feature_names)
+
+
+def summarize_clusters(model, vectors, labels, distances, member_types=None, top_features=3):
+    """每个簇的规模、平均距离、最突出的特征（用于命名），以及成员中最常见的规则类型"""
+    overall_mean = vectors.mean(axis=0) if len(vectors) else np.zeros(model.centroids.shape[1])
+    summaries = []
+    for cluster in range(model.n_clusters):
+        members = labels == cluster
+        size = int(members.sum())
+        lift = model.centroids[cluster] - overall_mean
+        features = [model.feature_names[i] for i in np.argsort(-lift)[:top_features]] if model.feature_names else []
+
+        dominant = []
+        for types in (member_types or {}).values():
+            common = Counter(np.asarray(types)[members]).most_common(1)
+            if common:
+                dominant.append(str(common[0][0]))
+
+        summaries.append({
+            'cluster': cluster,
+            'label': '·'.join([f"群像{cluster + 1}"] + [describe_feature(name) for name in features[:2]]),
+            'size': size,
+            'avg_distance': round(float(distances[members].mean()), 4) if size else None,
+            'top_features': features,
+            'dominant_types': dominant
+        })
+    return summaries
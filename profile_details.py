@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按需计算的详细画像
+--light 模式下批处理只输出摘要字段（各维度类型、发言量、互动/影响力得分），
+24小时分布、类型分布、各项比率等详细字段在用户详情首次打开时从SQLite消息库计算，
+结果放入容量有限的LRU缓存（记录命中/未命中），数据版本变化时整体失效
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_PROFILE_CACHE_SIZE = 512
+
+# 详细字段：{维度路径: 字段}，--light 时批处理不计算，请求用户详情时再计算
+DETAIL_FIELDS = {
+    'time_pattern': ('distribution', 'hourly_stats'),
+    'content_type': ('distribution',),
+    'social_behavior.metrics': ('reply_rate', 'question_rate', 'agreement_rate', 'mention_rate',
+                                'questionFrequency', 'mentionFrequency', 'replyRatio', 'beMentionedRatio'),
+    'sentiment': ('positive_ratio', 'negative_ratio'),
+    'interaction_style': ('question_ratio', 'answer_ratio')
+}
+
+
+def _section(dimensions, path):
+    section = dimensions
+    for key in path.split('.'):
+        section = section.get(key) if isinstance(section, dict) else None
+    return section if isinstance(section, dict) else None
+
+
+def extract_details(dimensions):
+    """从完整的维度结果中取出详细字段：{维度路径: {字段: 值}}"""
+    details = {}
+    for path, fields in DETAIL_FIELDS.items():
+        section = _section(dimensions, path)
+        if section is not None:
+            details[path] = {field: section[field] for field in fields if field in section}
+    return details
+
+
+def count_mentions(messages_df):
+    """每个用户在他人消息中被提及（昵称出现在内容中）的次数；消息内容只转换一次，各昵称逐个做子串匹配
+
+    与逐条扫描的口径一致：昵称取该用户第一条消息的 user_nickname，内容按 str() 转换
+    """
+    contents = [str(content) for content in messages_df['message_content'].tolist()]
+    user_ids = messages_df['user_id'].to_numpy()
+    first_messages = messages_df.drop_duplicates('user_id')
+
+    mentions = {}
+    for user_id, nickname in zip(first_messages['user_id'].tolist(), first_messages['user_nickname'].tolist()):
+        if not isinstance(nickname, str):
+            mentions[user_id] = 0
+            continue
+        matched = np.fromiter((nickname in content for content in contents), dtype=bool, count=len(contents))
+        mentions[user_id] = int((matched & (user_ids != user_id)).sum())
+    return mentions
+
+
+def compute_profile_details(processor, store, user_id):
+    """从消息库读取单个用户的消息，计算详细字段；用户没有消息时返回None
+
+    processor 提供关键词表和各维度的计算方法，被提及次数由SQLite直接统计，不加载其他用户的消息；
+    与批处理口径一致，提及数和消息总数都不含机器人消息，跨数据源的重复消息在导入时已按去重键合并
+    """
+    user_messages = store.load_user_messages(user_id)
+    if user_messages.empty:
+        return None
+
+    nickname = user_messages.iloc[0]['user_nickname']
+    mentions = (store.count_mentions(user_id, nickname) if isinstance(nickname, str) else 0,
+                store.count_messages(humans_only=True))
+    dimensions = {
+        'time_pattern': processor.calculate_time_pattern_dimension(user_messages),
+        'content_type': processor.calculate_content_type_dimension(user_messages),
+        'social_behavior': processor.calculate_social_behavior_dimension(user_messages, None, mentions),
+        'sentiment': processor.calculate_sentiment_dimension(user_messages),
+        'interaction_style': processor.calculate_interaction_style_dimension(user_messages)
+    }
+    return processor.clean_nan_values(extract_details(dimensions))
+
+
+class ProfileDetailCache:
+    """详细画像的LRU缓存，按 user_id 存储；数据版本变化时清空"""
+
+    def __init__(self, max_size=DEFAULT_PROFILE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+    def get(self, user_id, version, compute):
+        """返回 (详细字段, 是否命中缓存)；未命中时调用 compute() 计算并放入缓存
+
+        计算在锁外进行，不阻塞其他用户的请求；同一用户并发未命中时各自计算，结果相同
+        """
+        with self.lock:
+            self._check_version(version)
+            if user_id in self.entries:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return self.entries[user_id], True
+            self.misses += 1
+
+        details = compute()
+        if details is None:
+            return None, False
+
+        with self.lock:
+            if version == self.version:
+                self.entries[user_id] = details
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return details, False
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 4) if requests else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
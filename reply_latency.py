@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回复延迟分布
+用有序数组 + searchsorted 将每条回复连接到原消息，计算回复延迟，
+并按用户聚合到固定对数分桶的直方图中；直方图可直接相加，便于跨快照和增量合并
+"""
+
+import numpy as np
+import pandas as pd
+
+# 固定对数分桶：1秒 ~ 7天，共40个边界；第0桶为 [0, 1秒)，最后一桶为超过7天
+BUCKET_EDGES = np.logspace(0, np.log10(7 * 24 * 3600), 40)
+NUM_BUCKETS = len(BUCKET_EDGES) + 1
+
+
+def bucket_index(delays):
+    """延迟（秒）映射到分桶序号"""
+    return np.searchsorted(BUCKET_EDGES, delays, side='right')
+
+
+def histogram_quantiles(counts, quantiles=(0.5, 0.9, 0.99)):
+    """根据分桶计数估算分位数，桶内按对数插值"""
+    total = counts.sum()
+    if total == 0:
+        return {f"p{int(q * 100)}": None for q in quantiles}
+
+    cumulative = np.cumsum(counts)
+    lower_edges = np.concatenate([[0.0], BUCKET_EDGES])
+    upper_edges = np.concatenate([BUCKET_EDGES, [BUCKET_EDGES[-1]]])
+
+    result = {}
+    for q in quantiles:
+        target = q * total
+        bucket = int(np.searchsorted(cumulative, target))
+        previous = cumulative[bucket - 1] if bucket > 0 else 0
+        fraction = (target - previous) / counts[bucket] if counts[bucket] else 0
+        lower, upper = lower_edges[bucket], upper_edges[bucket]
+        if lower > 0 and upper > lower:
+            value = lower * (upper / lower) ** fraction
+        else:
+            value = lower + (upper - lower) * fraction
+        result[f"p{int(q * 100)}"] = round(float(value), 1)
+    return result
+
+
+class ReplyLatencyStats:
+    def __init__(self, user_ids=None, counts=None):
+        """每个用户一行的分桶计数矩阵"""
+        self.user_ids = np.asarray(user_ids if user_ids is not None else [])
+        self.counts = counts if counts is not None else np.zeros((0, NUM_BUCKETS), dtype=np.int64)
+        self.user_index = pd.Index(self.user_ids)
+
+    @classmethod
+    def from_messages(cls, messages_df):
+        """有序数组连接：reply_to 在按 message_id 排序的数组中 searchsorted 找到原消息"""
+        message_ids = pd.to_numeric(messages_df['message_id'], errors='coerce').to_numpy()
+        reply_ids = pd.to_numeric(messages_df['reply_to'], errors='coerce').to_numpy()
+        timestamps = messages_df['timestamp'].to_numpy(dtype=float)
+        user_ids = messages_df['user_id'].to_numpy()
+
+        valid = ~np.isnan(message_ids)
+        order = np.argsort(message_ids[valid], kind='stable')
+        sorted_ids = message_ids[valid][order]
+        sorted_times = timestamps[valid][order]
+
+        is_reply = ~np.isnan(reply_ids)
+        positions = np.searchsorted(sorted_ids, reply_ids[is_reply])
+        positions = np.minimum(positions, max(len(sorted_ids) - 1, 0))
+        matched = (sorted_ids[positions] == reply_ids[is_reply]) if len(sorted_ids) else np.zeros(0, dtype=bool)
+
+        delays = timestamps[is_reply][matched] - sorted_times[positions[matched]]
+        repliers = user_ids[is_reply][matched]
+        keep = delays >= 0
+        return cls.from_delays(repliers[keep], delays[keep])
+
+    @classmethod
+    def from_delays(cls, repliers, delays):
+        """由 (回复者, 延迟) 数组聚合分桶计数"""
+        codes, unique_users = pd.factorize(pd.Series(repliers))
+        buckets = bucket_index(delays)
+        counts = np.bincount(codes * NUM_BUCKETS + buckets, minlength=len(unique_users) * NUM_BUCKETS)
+        return cls(np.asarray(unique_users), counts.reshape(len(unique_users), NUM_BUCKETS).astype(np.int64))
+
+    def merge(self, other):
+        """合并另一份统计（跨快照/增量运行），按用户对齐后直接相加"""
+        all_users = self.user_index.union(other.user_index)
+        counts = np.zeros((len(all_users), NUM_BUCKETS), dtype=np.int64)
+        counts[all_users.get_indexer(self.user_ids)] += self.counts
+        counts[all_users.get_indexer(other.user_ids)] += other.counts
+        return ReplyLatencyStats(all_users.to_numpy(), counts)
+
+    def profile_for(self, user_id):
+        """单个用户的回复延迟分位数"""
+        position = self.user_index.get_indexer([user_id])[0] if len(self.user_ids) else -1
+        if position < 0:
+            return {'count': 0, 'p50': None, 'p90': None}
+        counts = self.counts[position]
+        quantiles = histogram_quantiles(counts, (0.5, 0.9))
+        return {'count': int(counts.sum()), **quantiles}
+
+    def global_distribution(self):
+        """全局回复延迟分布（分桶计数可直接与其他快照相加）"""
+        counts = self.counts.sum(axis=0) if len(self.counts) else np.zeros(NUM_BUCKETS, dtype=np.int64)
+        return {
+            'bucket_edges': [round(float(edge), 2) for edge in BUCKET_EDGES],
+            'counts': counts.tolist(),
+            'total_replies': int(counts.sum()),
+            **histogram_quantiles(counts)
+        }
+
+    def to_dict(self):
+        """序列化为稀疏形式：只保存非零计数"""
+        rows, buckets = np.nonzero(self.counts)
+        return {
+            'user_ids': [str(user_id) for user_id in self.user_ids],
+            'rows': rows.tolist(),
+            'buckets': buckets.tolist(),
+            'values': self.counts[rows, buckets].tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 to_dict 的结果恢复"""
+        counts = np.zeros((len(data['user_ids']), NUM_BUCKETS), dtype=np.int64)
+        counts[data['rows'], data['buckets']] = data['values']
+        return cls(np.asarray([int(user_id) for user_id in data['user_ids']]), counts)
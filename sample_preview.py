@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分层抽样预览
+流式读取消息，对每个用户用蓄水池抽样保留至多 K 条消息，只在样本上计算各维度，不处理全部消息即可得到预览；
+对消息数超过 K 的用户做有限总体自助重抽样，给出各项比率/分布的偏差校正置信区间，
+并统计各类型标签在重抽样中的占比，标出可能因抽样而翻转类型的用户；
+依赖完整对话的维度（社交行为）在样本上无法估计，标为不可用
+"""
+
+import json
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from columnar_bundle import dimension_label
+from message_dedup import MessageDeduplicator, build_message_keys
+
+DEFAULT_SAMPLE_SIZE = 200
+DEFAULT_SAMPLE_REPORT_PATH = "data/sample_preview.json"
+DEFAULT_BOOTSTRAP = 200
+CONFIDENCE_LEVEL = 0.95
+LABEL_STABILITY_THRESHOLD = 0.9  # 重抽样中与点估计标签一致的比例低于该值视为可能翻转
+
+# 由消息总数决定、而总数是精确统计的维度，不参与区间估计和翻转判断
+COUNT_DIMENSIONS = ('message_volume', 'member_status')
+# 依赖回复关系图、会话切分和全量被提及统计的维度，样本上只能得到单条消息口径的回退值，不输出估计
+UNAVAILABLE_DIMENSIONS = {
+    'social_behavior': '依赖回复关系图、会话切分和被提及统计，需在完整消息上计算'
+}
+RATE_SUFFIXES = ('_rate', '_ratio')
+
+
+class StratifiedMessageSampler:
+    """按用户分层的蓄水池抽样：每条消息以带种子的键哈希作为优先级，每个用户保留优先级最小的 K 条
+
+    等价于对每个用户的消息做无放回等概率抽样；优先级只取决于消息本身，
+    与文件顺序、分块大小无关，同一种子重复运行得到相同样本
+    """
+
+    def __init__(self, per_user=DEFAULT_SAMPLE_SIZE, seed=0):
+        self.per_user = per_user
+        self.hash_key = f"{int(seed):016d}"[-16:]
+        self.reservoir = None
+        self.population = {}
+        self.deduplicator = MessageDeduplicator()
+
+    def add(self, chunk, source='unknown'):
+        """加入一个消息分块：先跨分块去重，再累计各用户消息总数并更新蓄水池"""
+        chunk = self.deduplicator.filter(chunk, source)
+        if chunk.empty:
+            return
+        for user_id, count in chunk['user_id'].value_counts().items():
+            self.population[user_id] = self.population.get(user_id, 0) + int(count)
+
+        chunk = chunk.assign(_priority=pd.util.hash_pandas_object(
+            build_message_keys(chunk), index=False, hash_key=self.hash_key).to_numpy())
+        merged = chunk if self.reservoir is None else pd.concat([self.reservoir, chunk], ignore_index=True)
+        keep = merged.groupby('user_id')['_priority'].rank(method='first') <= self.per_user
+        self.reservoir = merged[keep.to_numpy()].reset_index(drop=True)
+
+    def sample(self, columns=None):
+        """按时间排序的样本消息"""
+        if self.reservoir is None:
+            return pd.DataFrame(columns=columns)
+        sample = self.reservoir.drop(columns='_priority').sort_values('timestamp', kind='stable')
+        if columns:
+            sample = sample[[column for column in columns if column in sample.columns]]
+        return sample.reset_index(drop=True)
+
+
+def sample_messages(data_source, per_user=DEFAULT_SAMPLE_SIZE, seed=0, columns=None):
+    """从数据源流式抽样，返回 (样本消息, {user_id: 消息总数})"""
+    sampler = StratifiedMessageSampler(per_user, seed)
+    for source, chunk in data_source.iter_messages():
+        sampler.add(chunk, source)
+    print(f"抽样完成：{len(sampler.population)} 个用户，"
+          f"消息 {sum(sampler.population.values())} 条中抽取 {0 if sampler.reservoir is None else len(sampler.reservoir)} 条，"
+          f"去重 {sampler.deduplicator.report()['total_duplicates']} 条")
+    return sampler.sample(columns), sampler.population
+
+
+def profile_labels(profile):
+    """画像中各维度的类型标签（不含由消息总数决定的维度和样本上不可用的维度）"""
+    labels = {}
+    for name, dimension in profile.get('dimensions', {}).items():
+        if name in COUNT_DIMENSIONS or name in UNAVAILABLE_DIMENSIONS:
+            continue
+        label = dimension_label(dimension)
+        if label is not None:
+            labels[name] = label
+    return labels
+
+
+def profile_rates(profile):
+    """画像中的比率与分布：{维度.路径: 数值}
+
+    取以 _rate/_ratio 结尾的字段、distribution 下的各项以及 score
+    """
+    rates = {}
+
+    def walk(section, path, in_distribution):
+        for key, value in section.items():
+            key = str(key)
+            name = f"{path}.{key}"
+            if isinstance(value, dict):
+                walk(value, name, key == 'distribution')
+            elif (isinstance(value, (int, float)) and not isinstance(value, bool) and
+                  (in_distribution or key.endswith(RATE_SUFFIXES) or key == 'score')):
+                rates[name] = float(value)
+
+    for name, dimension in profile.get('dimensions', {}).items():
+        if isinstance(dimension, dict) and name not in COUNT_DIMENSIONS and name not in UNAVAILABLE_DIMENSIONS:
+            walk(dimension, name, False)
+    return rates
+
+
+def finite_population_resample(sample_size, population_size, rng):
+    """有限总体自助法：把样本复制成大小为 N 的伪总体，再无放回抽取 n 条，返回样本内行号"""
+    pseudo_population = np.resize(rng.permutation(sample_size), population_size)
+    return rng.choice(pseudo_population, sample_size, replace=False)
+
+
+def bias_corrected_interval(values, estimate):
+    """偏差校正百分位区间（BC）
+
+    z0 由重抽样值低于点估计的比例求得（相等的计一半，比例限制在 [1/2B, 1-1/2B]），
+    两端百分位取 Φ(2·z0 ± z)，重抽样分布相对点估计的偏移不再直接平移区间
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return [round(estimate, 4)] * 2
+    below = (np.sum(values < estimate) + 0.5 * np.sum(values == estimate)) / len(values)
+    below = min(max(below, 1 / (2 * len(values))), 1 - 1 / (2 * len(values)))
+    normal = NormalDist()
+    z0 = normal.inv_cdf(below)
+    z = normal.inv_cdf((1 + CONFIDENCE_LEVEL) / 2)
+    low, high = np.percentile(values, [normal.cdf(2 * z0 - z) * 100, normal.cdf(2 * z0 + z) * 100])
+    return [round(float(low), 4), round(float(high), 4)]
+
+
+def build_preview(user_messages, population, profile_fn, per_user, nicknames=None,
+                  bootstrap=DEFAULT_BOOTSTRAP, seed=0, replicate_fn=None):
+    """在样本上计算画像并估计抽样误差
+
+    user_messages: {user_id: 该用户的样本消息DataFrame}
+    population: {user_id: 该用户的消息总数}
+    profile_fn: (user_id, messages) -> 画像，即处理器自己的单用户计算函数
+    per_user: 每个用户的抽样条数 K
+    replicate_fn: 重抽样时的计算函数，只需返回参与估计的维度；默认同 profile_fn
+    消息全部入样的用户结果是精确的，不做重抽样
+    """
+    rng = np.random.default_rng(seed)
+    nicknames = nicknames or {}
+    replicate_fn = replicate_fn or profile_fn
+    users = []
+
+    for user_id, messages in user_messages.items():
+        sampled = len(messages)
+        total = max(int(population.get(user_id, sampled)), sampled)
+        profile = profile_fn(user_id, messages)
+        labels = profile_labels(profile)
+        rates = profile_rates(profile)
+
+        replicates = []
+        if total > sampled and bootstrap:
+            replicates = [replicate_fn(user_id, messages.iloc[finite_population_resample(sampled, total, rng)])
+                          for _ in range(bootstrap)]
+
+        user = {
+            'user_id': int(user_id),
+            'nickname': nicknames.get(user_id, profile.get('nickname')),
+            'sampled_messages': sampled,
+            'total_messages': total,
+            'exact': not replicates,
+            'labels': {},
+            'rates': {}
+        }
+        if replicates:
+            labels_by_replicate = [profile_labels(replicate) for replicate in replicates]
+            rates_by_replicate = [profile_rates(replicate) for replicate in replicates]
+            for name, label in labels.items():
+                # 各类型标签在重抽样中的占比；点估计标签的占比即一致率
+                shares = pd.Series([replicate.get(name) for replicate in labels_by_replicate]).value_counts(normalize=True)
+                stability = float(shares.get(label, 0.0))
+                user['labels'][name] = {'label': label, 'stability': round(stability, 4),
+                                        'at_risk': bool(stability < LABEL_STABILITY_THRESHOLD),
+                                        'shares': {str(key): round(float(share), 4) for key, share in shares.items()}}
+            for name, value in rates.items():
+                # 重抽样中没有出现的分布项记为0，其余缺失项不参与区间计算
+                missing = 0.0 if '.distribution.' in name else np.nan
+                values = [replicate.get(name, missing) for replicate in rates_by_replicate]
+                user['rates'][name] = {'estimate': round(value, 4), 'interval': bias_corrected_interval(values, value)}
+        else:
+            user['labels'] = {name: {'label': label, 'stability': 1.0, 'at_risk': False, 'shares': {label: 1.0}}
+                              for name, label in labels.items()}
+            user['rates'] = {name: {'estimate': round(value, 4), 'interval': [round(value, 4)] * 2}
+                             for name, value in rates.items()}
+        users.append(user)
+
+    return {
+        'metadata': {
+            'per_user_sample': per_user,
+            'bootstrap': bootstrap,
+            'confidence_level': CONFIDENCE_LEVEL,
+            'stability_threshold': LABEL_STABILITY_THRESHOLD,
+            'users': len(users),
+            'sampled_messages': sum(user['sampled_messages'] for user in users),
+            'total_messages': sum(user['total_messages'] for user in users),
+            'undersampled_users': sum(not user['exact'] for user in users)
+        },
+        'dimensions': summarize_labels(users),
+        'unavailable_dimensions': UNAVAILABLE_DIMENSIONS,
+        'at_risk_users': sum(any(label['at_risk'] for label in user['labels'].values()) for user in users),
+        'users': users
+    }
+
+
+def summarize_labels(users):
+    """各维度的类型人数分布、各类型在重抽样中的占比、可能翻转的用户数
+
+    类型标签是分段函数，重抽样的人数分布相对点估计有系统偏移，不据此给人数区间；
+    replicate_share 为各用户该类型重抽样占比之和除以用户数（精确用户按原标签计1）
+    """
+    summary = {}
+    names = sorted({name for user in users for name in user['labels']})
+    for name in names:
+        counts, shares = {}, {}
+        at_risk = 0
+        for user in users:
+            entry = user['labels'].get(name)
+            if entry is None:
+                continue
+            counts[entry['label']] = counts.get(entry['label'], 0) + 1
+            at_risk += entry['at_risk']
+            for label, share in entry['shares'].items():
+                shares[label] = shares.get(label, 0.0) + share
+
+        num_users = sum(counts.values())
+        all_labels = sorted(set(counts) | set(shares), key=lambda label: (-counts.get(label, 0), -shares.get(label, 0.0)))
+        summary[name] = {
+            'distribution': {
+                label: {'count': counts.get(label, 0),
+                        'share': round(counts.get(label, 0) / num_users, 4),
+                        'replicate_share': round(shares.get(label, 0.0) / num_users, 4)}
+                for label in all_labels
+            },
+            'at_risk': at_risk
+        }
+    return summary
+
+
+def print_preview(report):
+    """打印预览摘要：各维度人数分布（含重抽样占比）、不可用的维度和可能翻转类型的用户数"""
+    meta = report['metadata']
+    print(f"\n=== 抽样预览 ===")
+    print(f"用户 {meta['users']} 个，消息 {meta['total_messages']} 条中抽样 {meta['sampled_messages']} 条；"
+          f"{meta['undersampled_users']} 个用户被抽样（自助重抽样 {meta['bootstrap']} 次，"
+          f"比率为 {int(meta['confidence_level'] * 100)}% 偏差校正置信区间）")
+    print("类型人数（样本占比 / 重抽样占比）：")
+    for name, dimension in report['dimensions'].items():
+        distribution = '，'.join(f"{label} {item['count']}（{item['share']:.1%} / {item['replicate_share']:.1%}）"
+                                 for label, item in dimension['distribution'].items())
+        print(f"{name}: {distribution}；可能翻转 {dimension['at_risk']} 人")
+    for name, reason in report['unavailable_dimensions'].items():
+        print(f"{name}: 样本上不可用（{reason}）")
+    print(f"至少一个类型标签可能翻转的用户: {report['at_risk_users']} 个"
+          f"（重抽样一致率低于 {int(meta['stability_threshold'] * 100)}%）")
+
+
+def save_preview(report, path=DEFAULT_SAMPLE_REPORT_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"抽样预览已保存到 {path}")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话切分
+按 (chat_id, timestamp) 全量排序一次，用 np.diff 按空闲间隔切分会话，
+以整表数组运算统计每个用户发起/参与的会话数和回应延迟中位数
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_IDLE_GAP = 30 * 60  # 默认空闲30分钟视为新会话
+
+
+def group_medians(group_codes, values, num_groups):
+    """按组求中位数：一次lexsort后按组边界取中间位置，无逐组循环"""
+    medians = np.full(num_groups, np.nan)
+    if len(values) == 0:
+        return medians
+
+    order = np.lexsort((values, group_codes))
+    sorted_codes = group_codes[order]
+    sorted_values = values[order]
+
+    counts = np.bincount(sorted_codes, minlength=num_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    has_values = counts > 0
+    lower = starts + (counts - 1) // 2
+    upper = starts + counts // 2
+    medians[has_values] = (sorted_values[lower[has_values]] + sorted_values[upper[has_values]]) / 2
+    return medians
+
+
+def sessionize(messages_df, idle_gap=DEFAULT_IDLE_GAP):
+    """切分会话并统计每个用户的会话指标
+
+    返回 (user_stats, summary)：user_stats 以 user_id 为索引，包含
+    sessions_opened / sessions_joined / sessions_total / initiate_rate / median_response_delay
+    """
+    chat_codes, _ = pd.factorize(messages_df['chat_id'].fillna(''))
+    user_codes, user_ids = pd.factorize(messages_df['user_id'])
+    timestamps = messages_df['timestamp'].to_numpy(dtype=float)
+    num_users = len(user_ids)
+
+    # 一次排序：先chat后时间
+    order = np.lexsort((timestamps, chat_codes))
+    chats = chat_codes[order]
+    times = timestamps[order]
+    users = user_codes[order]
+
+    gaps = np.diff(times, prepend=np.nan)
+    new_chat = np.diff(chats, prepend=-1) != 0
+    session_start = new_chat | (gaps > idle_gap)
+    session_ids = np.cumsum(session_start) - 1
+    num_sessions = int(session_ids[-1]) + 1 if len(session_ids) else 0
+
+    # 发起：会话首条消息的作者
+    sessions_opened = np.bincount(users[session_start], minlength=num_users)
+
+    # 参与：用户在会话中出现过（去重 (会话, 用户) 对）
+    participation = np.unique(session_ids.astype(np.int64) * max(num_users, 1) + users)
+    sessions_total = np.bincount(participation % max(num_users, 1), minlength=num_users)
+    sessions_joined = sessions_total - sessions_opened
+
+    # 回应延迟：会话内上一条消息来自他人时，两条消息的时间差
+    previous_users = np.roll(users, 1)
+    is_response = ~session_start & (users != previous_users)
+    median_delay = group_medians(users[is_response], gaps[is_response], num_users)
+
+    initiate_rate = np.divide(sessions_opened, sessions_total, out=np.zeros(num_users), where=sessions_total > 0)
+
+    user_stats = pd.DataFrame({
+        'sessions_opened': sessions_opened,
+        'sessions_joined': sessions_joined,
+        'sessions_total': sessions_total,
+        'initiate_rate': initiate_rate,
+        'median_response_delay': median_delay
+    }, index=pd.Index(user_ids, name='user_id'))
+
+    summary = {
+        'idle_gap_seconds': idle_gap,
+        'total_sessions': num_sessions,
+        'avg_session_messages': round(len(times) / num_sessions, 2) if num_sessions else 0,
+        'median_response_delay': round(float(np.median(gaps[is_response])), 1) if is_response.any() else None
+    }
+    return user_stats, summary
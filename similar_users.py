@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似用户索引
+把每个用户转换为归一化特征向量（24小时分布、内容类型分布、提问/回复/附和/情感比例、对数消息数），
+存为连续的float32矩阵；用分块矩阵乘法求余弦相似度的top-k，
+用户数很多时改用随机投影分桶，只在同桶候选内精确重排
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIMILARITY_PATH = "data/similarity_index.npz"
+DEFAULT_SIMILAR_USERS_PATH = "data/similar_users.json"
+DEFAULT_TOP_K = 10
+EXACT_SEARCH_LIMIT = 20000  # 超过该用户数时改用随机投影分桶
+
+
+def normalize_rows(matrix):
+    """按行L2归一化，全零行保持为零"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def merge_top_k(rows, neighbors, scores, num_rows, k):
+    """合并候选三元组 (行, 邻居, 相似度)：去重后每行保留相似度最高的k个"""
+    order = np.lexsort((-scores, neighbors, rows))
+    rows, neighbors, scores = rows[order], neighbors[order], scores[order]
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]) | (neighbors[1:] != neighbors[:-1])
+    rows, neighbors, scores = rows[keep], neighbors[keep], scores[keep]
+
+    order = np.lexsort((-scores, rows))
+    rows, neighbors, scores = rows[order], neighbors[order], scores[order]
+    starts = np.searchsorted(rows, np.arange(num_rows))
+    rank = np.arange(len(rows)) - starts[rows]
+    keep = rank < k
+
+    top_neighbors = np.full((num_rows, k), -1, dtype=np.int64)
+    top_scores = np.full((num_rows, k), -np.inf, dtype=np.float32)
+    top_neighbors[rows[keep], rank[keep]] = neighbors[keep]
+    top_scores[rows[keep], rank[keep]] = scores[keep]
+    return top_neighbors, top_scores
+
+
+class SimilarityIndex:
+    def __init__(self, user_ids, vectors, feature_names):
+        """vectors: 行归一化的 (用户, 特征) float32 矩阵，点积即余弦相似度"""
+        self.user_ids = np.asarray(user_ids).astype(str)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.feature_names = list(feature_names)
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+
+    @property
+    def num_users(self):
+        return len(self.user_ids)
+
+    @classmethod
+    def build(cls, messages_df, keyword_flags):
+        """整表向量化生成特征矩阵：每个特征块先各自归一化，再整体按行归一化
+
+        keyword_flags: 与 messages_df 逐行对齐的关键词命中标记（keyword_flags.KeywordFlags）
+        """
+        user_codes, user_ids = pd.factorize(messages_df['user_id'].astype(str), sort=True)
+        num_users = len(user_ids)
+        counts = np.bincount(user_codes, minlength=num_users).astype(float)
+        safe_counts = np.maximum(counts, 1)
+
+        # 24小时分布
+        hours = messages_df['hour'].to_numpy(dtype=float)
+        valid = ~np.isnan(hours) & (hours >= 0) & (hours < 24)
+        hour_matrix = np.bincount(
+            user_codes[valid] * 24 + hours[valid].astype(np.int64), minlength=num_users * 24
+        ).reshape(num_users, 24).astype(float)
+
+        # 内容类型分布（关键词命中消息数）
+        type_matrix = np.column_stack([
+            np.bincount(user_codes, weights=hits.astype(float), minlength=num_users)
+            for hits in keyword_flags.content_types.values()
+        ]) if keyword_flags.content_types else np.zeros((num_users, 0))
+
+        # 比例特征与对数消息数：标准化后参与距离计算
+        rate_sources = {
+            'question_rate': keyword_flags.question.astype(float),
+            'reply_rate': messages_df['reply_to'].notna().to_numpy(dtype=float),
+            'agreement_rate': keyword_flags.agreement.astype(float),
+            'positive_rate': keyword_flags.positive.astype(float),
+            'negative_rate': keyword_flags.negative.astype(float)
+        }
+        scalar_matrix = np.column_stack(
+            [np.bincount(user_codes, weights=flags, minlength=num_users) / safe_counts for flags in rate_sources.values()]
+            + [np.log1p(counts)]
+        )
+        spread = scalar_matrix.std(axis=0)
+        scalar_matrix = np.divide(scalar_matrix - scalar_matrix.mean(axis=0), spread,
+                                  out=np.zeros_like(scalar_matrix), where=spread > 0)
+
+        vectors = normalize_rows(np.hstack([
+            normalize_rows(hour_matrix),
+            normalize_rows(type_matrix),
+            scalar_matrix / np.sqrt(scalar_matrix.shape[1])
+        ]))
+        feature_names = ([f"hour_{hour}" for hour in range(24)]
+                         + [f"type:{name}" for name in keyword_flags.content_types]
+                         + list(rate_sources) + ['log_messages'])
+        return cls(np.asarray(user_ids), vectors, feature_names)
+
+    def _exact_candidates(self, rows, candidates, k, block_size):
+        """分块矩阵乘法：rows 中每个用户在 candidates 中的top-k（排除自身）"""
+        k = min(k, len(candidates) - 1)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        candidate_vectors = self.vectors[candidates]
+        out_rows, out_neighbors, out_scores = [], [], []
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            similarity = self.vectors[block] @ candidate_vectors.T
+            similarity[block[:, None] == candidates[None, :]] = -np.inf
+            top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+            out_rows.append(np.repeat(block, k))
+            out_neighbors.append(candidates[top].ravel())
+            out_scores.append(np.take_along_axis(similarity, top, axis=1).ravel())
+        return np.concatenate(out_rows), np.concatenate(out_neighbors), np.concatenate(out_scores)
+
+    def _projection_candidates(self, k, block_size, num_tables=16, num_bits=None, seed=42):
+        """随机超平面分桶：每张表内只比较同桶用户，多张表的候选合并"""
+        rng = np.random.default_rng(seed)
+        num_bits = num_bits or max(1, int(np.log2(max(self.num_users, 2) / 256)))
+        powers = 1 << np.arange(num_bits)
+        triples = []
+        for _ in range(num_tables):
+            planes = rng.standard_normal((self.vectors.shape[1], num_bits)).astype(np.float32)
+            codes = ((self.vectors @ planes) > 0).astype(np.int64) @ powers
+            order = np.argsort(codes, kind='stable')
+            boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+            for bucket in np.split(order, boundaries):
+                if len(bucket) > 1:
+                    triples.append(self._exact_candidates(bucket, bucket, k, block_size))
+        if not triples:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return tuple(np.concatenate(parts) for parts in zip(*triples))
+
+    def top_k_all(self, k=DEFAULT_TOP_K, block_size=1024):
+        """所有用户的top-k相似用户，返回 (邻居下标, 相似度)，不足k个时以-1填充"""
+        if self.num_users <= EXACT_SEARCH_LIMIT:
+            all_rows = np.arange(self.num_users)
+            triples = self._exact_candidates(all_rows, all_rows, k, block_size)
+        else:
+            triples = self._projection_candidates(k, block_size)
+        return merge_top_k(*triples, self.num_users, k)
+
+    def query(self, user_id, k=DEFAULT_TOP_K):
+        """单个用户的top-k相似用户：一次矩阵向量乘法"""
+        row = self.user_index.get(str(user_id))
+        if row is None:
+            return None
+        similarity = self.vectors @ self.vectors[row]
+        similarity[row] = -np.inf
+        k = min(k, self.num_users - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind='stable')]
+        return [{'user_id': str(self.user_ids[i]), 'similarity': round(float(similarity[i]), 4)} for i in top]
+
+    def top_k_lists(self, k=DEFAULT_TOP_K):
+        """预计算的相似用户列表（静态部署使用）：{user_id: [[相似用户ID, 相似度], ...]}"""
+        neighbors, scores = self.top_k_all(k)
+        result = {}
+        for row, user_id in enumerate(self.user_ids):
+            valid = neighbors[row] >= 0
+            result[user_id] = [
+                [str(self.user_ids[neighbor]), round(float(score), 4)]
+                for neighbor, score in zip(neighbors[row][valid], scores[row][valid])
+            ]
+        return result
+
+    def save(self, path=DEFAULT_SIMILARITY_PATH):
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        np.savez_compressed(path, user_ids=self.user_ids, vectors=self.vectors,
+                            feature_names=json.dumps(self.feature_names, ensure_ascii=False))
+        print(f"相似用户索引已保存到 {path}：{self.num_users} 个用户，{self.vectors.shape[1]} 维特征")
+
+    @classmethod
+    def load(cls, path=DEFAULT_SIMILARITY_PATH):
+        with np.load(path) as data:
+            return cls(data['user_ids'], data['vectors'], json.loads(str(data['feature_names'])))
+
+    def save_top_k_lists(self, path=DEFAULT_SIMILAR_USERS_PATH, k=DEFAULT_TOP_K):
+        """写出预计算的top-k列表，供静态部署的前端直接读取"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'k': k, 'similar': self.top_k_lists(k)}, f, ensure_ascii=False, separators=(',', ':'))
+        print(f"相似用户列表已保存到 {path}")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析快照增量
+每次处理后按 user_id + 画像内容哈希与上一版快照比较，记录新增/变化/删除的用户和新的 stats，
+版本号递增；前端带上已有版本请求 /api/delta?since=<版本>，只下载变化部分并原地合并
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+DEFAULT_DELTA_PATH = "data/analytics_delta.json"
+MAX_DELTAS = 20  # 只保留最近的增量，更早版本的客户端需重新加载完整数据
+VOLATILE_STATS_KEYS = ('update_time',)  # 每次处理都会变的字段，不计入 stats 哈希
+
+
+def _string_keys(value):
+    """字典键统一转为字符串（群组名可能为NaN、小时可能为整数），使键排序时可以比较"""
+    if isinstance(value, dict):
+        return {key if isinstance(key, str) else str(key): _string_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_string_keys(item) for item in value]
+    return value
+
+
+def profile_hash(value):
+    """画像（或stats）的内容哈希：键排序后的JSON做 blake2b"""
+    text = json.dumps(_string_keys(value), ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class DeltaLog:
+    """当前版本号、各用户画像哈希，以及最近 MAX_DELTAS 个版本的增量"""
+
+    def __init__(self, version=0, user_hashes=None, stats_hash=None, deltas=None):
+        self.version = version
+        self.user_hashes = user_hashes or {}
+        self.stats_hash = stats_hash
+        self.deltas = deltas or []
+
+    @property
+    def oldest_version(self):
+        """可以增量更新的最早版本"""
+        return self.deltas[0]['base_version'] if self.deltas else self.version
+
+    def record(self, data):
+        """与上一版比较并记录增量，返回新版本号；内容完全未变时版本号不变
+
+        data 中的画像应已清理NaN（与保存到JSON的内容一致）
+        """
+        users = {str(user['user_id']): user for user in data['users']}
+        hashes = {user_id: profile_hash(user) for user_id, user in users.items()}
+        stats = data.get('stats', {})
+        stats_hash = profile_hash({key: value for key, value in stats.items() if key not in VOLATILE_STATS_KEYS})
+
+        added = [users[user_id] for user_id in hashes if user_id not in self.user_hashes]
+        changed = [users[user_id] for user_id, value in hashes.items()
+                   if user_id in self.user_hashes and self.user_hashes[user_id] != value]
+        removed = [user_id for user_id in self.user_hashes if user_id not in hashes]
+        stats_changed = stats_hash != self.stats_hash
+
+        if self.version and not (added or changed or removed or stats_changed):
+            print(f"快照未变化，版本仍为 {self.version}")
+            return self.version
+
+        if self.version:
+            self.deltas.append({
+                'version': self.version + 1,
+                'base_version': self.version,
+                'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'added': added,
+                'changed': changed,
+                'removed': removed,
+                'stats': stats if stats_changed else None
+            })
+            self.deltas = self.deltas[-MAX_DELTAS:]
+            print(f"快照增量：新增 {len(added)}，变化 {len(changed)}，删除 {len(removed)} 个用户"
+                  f"{'，stats 已更新' if stats_changed else ''}")
+        self.version += 1
+        self.user_hashes = hashes
+        self.stats_hash = stats_hash
+        return self.version
+
+    def since(self, version):
+        """从 version 到当前版本的合并增量；version 过旧（已丢弃）或比当前版本新时返回None"""
+        if version < self.oldest_version or version > self.version:
+            return None
+
+        # 按版本顺序合并：同一用户取最后一次的画像，删除记为None
+        patches, stats = {}, None
+        for delta in self.deltas:
+            if delta['base_version'] < version:
+                continue
+            for user in delta['added'] + delta['changed']:
+                patches[str(user['user_id'])] = user
+            for user_id in delta['removed']:
+                patches[user_id] = None
+            if delta['stats'] is not None:
+                stats = delta['stats']
+
+        return {
+            'since': version,
+            'version': self.version,
+            'upserted': [user for user in patches.values() if user is not None],
+            'removed': [user_id for user_id, user in patches.items() if user is None],
+            'stats': stats
+        }
+
+    def save(self, path=DEFAULT_DELTA_PATH):
+        delta_dir = os.path.dirname(path)
+        if delta_dir:
+            os.makedirs(delta_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.version,
+                'user_hashes': self.user_hashes,
+                'stats_hash': self.stats_hash,
+                'deltas': self.deltas
+            }, f, ensure_ascii=False, separators=(',', ':'))
+        print(f"快照增量已保存到 {path}：版本 {self.version}，保留 {len(self.deltas)} 个增量")
+
+    @classmethod
+    def load(cls, path=DEFAULT_DELTA_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return cls(state['version'], state['user_hashes'], state['stats_hash'], state['deltas'])
+
+
+def record_snapshot(data, path=DEFAULT_DELTA_PATH):
+    """记录本次处理结果的增量并保存，返回版本号（写入分析数据的 metadata.snapshot_version）"""
+    log = DeltaLog.load(path) if os.path.exists(path) else DeltaLog()
+    version = log.record(data)
+    log.save(path)
+    return version
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多快照数据摄取
+自动发现所有 data_backup_* 目录及其中的 messages_*_enhanced.csv，
+并发解析、按时间戳合并，基于文件清单（大小/修改时间/哈希）跳过未变化的文件
+"""
+
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DATA_ROOT = "用于数据分析的用户数据"
+DEFAULT_MANIFEST_PATH = "data/ingest_manifest.json"
+DEFAULT_CACHE_DIR = "data/ingest_cache"
+
+MESSAGE_FILE_PATTERN = "messages_*_enhanced.csv"
+USER_FILE_NAME = "users_enhanced.csv"
+USER_KEY_COLUMNS = ('user_id', 'group_id')  # 用户记录的唯一键：同一用户在不同群组各有一行
+
+
+def discover_snapshot_dirs(path=DATA_ROOT):
+    """发现快照目录：path 本身是快照目录时只返回它，否则返回其下所有 data_backup_* 目录"""
+    if glob.glob(os.path.join(path, MESSAGE_FILE_PATTERN)) or os.path.exists(os.path.join(path, USER_FILE_NAME)):
+        return [path]
+    return sorted(d for d in glob.glob(os.path.join(path, "data_backup_*")) if os.path.isdir(d))
+
+
+def discover_message_files(path=DATA_ROOT):
+    """发现所有快照中的消息CSV"""
+    files = []
+    for snapshot_dir in discover_snapshot_dirs(path):
+        files.extend(sorted(glob.glob(os.path.join(snapshot_dir, MESSAGE_FILE_PATTERN))))
+    return files
+
+
+def discover_user_files(path=DATA_ROOT):
+    """发现所有快照中的用户CSV"""
+    return [
+        os.path.join(snapshot_dir, USER_FILE_NAME)
+        for snapshot_dir in discover_snapshot_dirs(path)
+        if os.path.exists(os.path.join(snapshot_dir, USER_FILE_NAME))
+    ]
+
+
+def file_sha1(path, block_size=1 << 20):
+    """计算文件SHA1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SnapshotManifest:
+    """记录已处理文件的大小、修改时间和哈希，用于跳过未变化的文件"""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def fingerprint(self, file_path):
+        """返回文件指纹；大小和修改时间未变时沿用清单中的哈希，避免重复读取"""
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        entry = self.entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': file_sha1(file_path)}
+
+    def is_unchanged(self, file_path):
+        """文件内容与清单记录一致时返回True"""
+        entry = self.entries.get(os.path.abspath(file_path))
+        return entry is not None and entry['sha1'] == self.fingerprint(file_path)['sha1']
+
+    def record(self, file_path, **extra):
+        """记录文件当前指纹"""
+        self.entries[os.path.abspath(file_path)] = {**self.fingerprint(file_path), **extra}
+
+    def save(self):
+        manifest_dir = os.path.dirname(self.path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+
+
+def read_message_csv(path):
+    """解析单个消息CSV（全部列），附加快照标签"""
+    frame = pd.read_csv(path, encoding='utf-8', dtype={'message_id': str})
+    frame['snapshot'] = os.path.basename(os.path.dirname(path))
+    if 'source_db' not in frame.columns:
+        frame['source_db'] = os.path.basename(path)
+    return frame
+
+
+class SnapshotIngestor:
+    def __init__(self, root=DATA_ROOT, manifest_path=DEFAULT_MANIFEST_PATH, cache_dir=DEFAULT_CACHE_DIR,
+                 max_workers=None, use_processes=False):
+        """初始化多快照摄取器
+
+        use_processes: 为True时使用进程池解析（文件很大时可绕过GIL），默认线程池
+        """
+        self.root = root
+        self.manifest = SnapshotManifest(manifest_path)
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.skipped_files = []
+        self.parsed_files = []
+
+    def _cache_path(self, sha1):
+        return os.path.join(self.cache_dir, f"{sha1}.pkl")
+
+    def _load_cached(self, path):
+        """未变化且有缓存的文件直接读取解析结果"""
+        if not self.manifest.is_unchanged(path):
+            return None
+        cache_path = self._cache_path(self.manifest.entries[os.path.abspath(path)]['sha1'])
+        if not os.path.exists(cache_path):
+            return None
+        return pd.read_pickle(cache_path)
+
+    def load_message_frames(self, paths=None):
+        """并发解析所有消息CSV，返回 [(path, DataFrame)]，顺序与发现顺序一致"""
+        paths = paths if paths is not None else discover_message_files(self.root)
+        frames = {}
+        pending = []
+
+        for path in paths:
+            cached = self._load_cached(path)
+            if cached is not None:
+                frames[path] = cached
+                self.skipped_files.append(path)
+            else:
+                pending.append(path)
+
+        if pending:
+            executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            with executor_cls(max_workers=self.max_workers) as executor:
+                for path, frame in zip(pending, executor.map(read_message_csv, pending)):
+                    frames[path] = frame
+                    self.parsed_files.append(path)
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for path in pending:
+                self.manifest.record(path)
+                frames[path].to_pickle(self._cache_path(self.manifest.entries[os.path.abspath(path)]['sha1']))
+            self.manifest.save()
+
+        print(f"快照摄取：解析 {len(self.parsed_files)} 个文件，跳过未变化文件 {len(self.skipped_files)} 个")
+        return [(path, frames[path]) for path in paths]
+
+    def load_messages(self, columns=None, deduplicator=None):
+        """摄取全部快照消息并按时间戳合并，可选跨文件去重"""
+        merged = []
+        for path, frame in self.load_message_frames():
+            if deduplicator is not None:
+                frame = deduplicator.filter(frame, source=os.path.relpath(path, self.root))
+            if columns is not None:
+                # 保留来源标签，便于追溯
+                keep = list(dict.fromkeys(list(columns) + ['timestamp', 'source_db', 'snapshot']))
+                frame = frame[[c for c in keep if c in frame.columns]]
+            merged.append(frame)
+
+        if not merged:
+            raise FileNotFoundError(f"未在 {self.root} 下找到 {MESSAGE_FILE_PATTERN}")
+
+        messages = pd.concat(merged, ignore_index=True)
+        # 稳定排序：同一时间戳保持快照发现顺序
+        return messages.sort_values('timestamp', kind='mergesort').reset_index(drop=True)
+
+    def load_users(self, columns=None):
+        """合并所有快照的用户CSV；同一用户在同一群组的记录只保留最新快照中的版本
+
+        快照内部的记录（例如来自不同 source_db 的行）原样保留，只丢弃被更新快照取代的旧行
+        """
+        user_files = discover_user_files(self.root)
+        if not user_files:
+            raise FileNotFoundError(f"未在 {self.root} 下找到 {USER_FILE_NAME}")
+        usecols = None if columns is None else list(dict.fromkeys(list(columns) + list(USER_KEY_COLUMNS)))
+        frames = [pd.read_csv(path, encoding='utf-8', usecols=usecols) for path in user_files]
+        users = pd.concat(frames, ignore_index=True)
+
+        # 快照按目录名升序发现，序号最大的即最新快照
+        order = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+        latest = pd.Series(order).groupby([users[key].to_numpy() for key in USER_KEY_COLUMNS], dropna=False).transform('max')
+        users = users[order == latest.to_numpy()]
+        if columns is not None:
+            users = users[list(columns)]
+        return users.reset_index(drop=True)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户画像时间线
+按 用户×日期×特征 统计每日计数（按用户压缩存储，只存有消息的日期），窗口内的特征总量由前缀和相减得到，
+任意周/月滑动窗口不需要回到原始消息重新计算；时间习惯按生成时间线的处理器的规则分类
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from group_profiles import SENTIMENT_TYPES, TIME_TYPES
+
+DEFAULT_TIMELINE_PATH = "data/timelines.npz"
+TIMELINE_FORMAT = 'csr-v1'
+WINDOW_DAYS = {'week': 7, 'month': 30}
+WINDOW_BATCH_USERS = 4096  # 全体用户的窗口汇总按批计算，内存与用户数无关
+BASE_FEATURES = ['messages', 'timed', 'morning', 'forenoon', 'afternoon', 'evening', 'night', 'regular',
+                 'question', 'reply', 'positive', 'negative']
+
+
+def _fast_time_types(f):
+    """快速处理器的时间习惯规则（analyze_time_pattern）：比例以小时有效的消息为分母"""
+    total = np.maximum(f['timed'], 1)
+    morning, night, regular = f['morning'] / total, f['night'] / total, f['regular'] / total
+    time_type = np.select([morning > 0.4, night > 0.3, regular > 0.8], [0, 1, 2], default=3)
+    return np.where(f['timed'] > 0, time_type, 4)
+
+
+def _enhanced_time_types(f):
+    """增强处理器的时间习惯规则（calculate_time_pattern_dimension）：
+    白天三个时段合计超过80%为作息规律型，否则至少3个时段超过20%才算不规律作息型"""
+    total = np.maximum(f['messages'], 1)
+    periods = [f[name] / total for name in ('morning', 'forenoon', 'afternoon', 'evening', 'night')]
+    morning, forenoon, afternoon, evening, night = periods
+    active_periods = sum((ratio > 0.2).astype(int) for ratio in periods)
+    time_type = np.select([morning > 0.4, night > 0.3, forenoon + afternoon + evening > 0.8, active_periods >= 3],
+                          [0, 1, 2, 3], default=2)
+    return np.where(f['messages'] > 0, time_type, 4)
+
+
+# 时间习惯规则集：{处理器: (标签列表, 分类函数)}，时间线按生成它的处理器的规则和标签分类，与画像的 time_pattern.type 一致
+TIME_RULES = {
+    'fast': (TIME_TYPES, _fast_time_types),
+    'enhanced': (['早上型', '熬夜型', '作息规律型', '不规律作息型', '未知'], _enhanced_time_types)
+}
+
+
+def window_bounds(num_days, window_days, step_days):
+    """滑动窗口的起止日序号；数据不足一个窗口时返回整个区间，最后一个窗口对齐到最新一天"""
+    if num_days <= window_days:
+        return np.array([0]), np.array([num_days])
+    starts = np.arange(0, num_days - window_days + 1, step_days)
+    if starts[-1] + window_days < num_days:
+        starts = np.append(starts, num_days - window_days)
+    return starts, starts + window_days
+
+
+class TimelineStore:
+    def __init__(self, user_ids, start_date, num_days, indptr, days, counts, content_types, time_rules='fast'):
+        """按用户压缩存储（CSR）的每日计数
+
+        第 indptr[u]:indptr[u+1] 行属于第u个用户，days 为这些行的日序号（升序），counts 为 (行, 特征) 计数；
+        只存有消息的 (用户, 日期)，体积与活跃天数成正比，而不是 用户数×天数
+        time_rules: 时间习惯规则集（TIME_RULES 的键），即生成时间线的处理器
+        """
+        self.user_ids = np.asarray(user_ids).astype(str)
+        self.start_date = pd.Timestamp(start_date)
+        self.num_days = int(num_days)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.days = days
+        self.counts = counts
+        self.content_types = list(content_types)
+        self.time_rules = time_rules
+        self.time_types, self.classify_time = TIME_RULES[time_rules]
+        self.features = BASE_FEATURES + [f"type:{name}" for name in self.content_types]
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+
+    @classmethod
+    def build(cls, messages_df, keyword_flags, time_rules='fast'):
+        """一次遍历消息表，生成每日计数；keyword_flags 为与 messages_df 逐行对齐的关键词命中标记"""
+        dates = pd.to_datetime(messages_df['date'], errors='coerce')
+        valid = dates.notna().to_numpy()
+        messages = messages_df[valid]
+        dates = dates[valid]
+        keyword_flags = keyword_flags.subset(valid)
+
+        start_date = dates.min().normalize() if len(dates) else pd.Timestamp.today().normalize()
+        day_codes = (dates.dt.normalize() - start_date).dt.days.to_numpy()
+        num_days = int(day_codes.max()) + 1 if len(day_codes) else 0
+        user_codes, user_ids = pd.factorize(messages['user_id'].astype(str), sort=True)
+
+        hours = messages['hour'].to_numpy(dtype=float)
+        flags = [
+            np.ones(len(messages), dtype=bool),
+            ~np.isnan(hours),
+            (hours >= 6) & (hours < 10),
+            (hours >= 10) & (hours < 12),
+            (hours >= 12) & (hours < 18),
+            (hours >= 18) & (hours < 23),
+            (hours >= 23) | (hours < 6),
+            (hours >= 8) & (hours < 23),
+            keyword_flags.question,
+            messages['reply_to'].notna().to_numpy(),
+            keyword_flags.positive,
+            keyword_flags.negative
+        ] + list(keyword_flags.content_types.values())
+
+        stride = max(num_days, 1)
+        cells, inverse = np.unique(user_codes.astype(np.int64) * stride + day_codes, return_inverse=True)
+        counts = np.stack([np.bincount(inverse, weights=flag, minlength=len(cells)) for flag in flags], axis=-1)
+        indptr = np.searchsorted(cells // stride, np.arange(len(user_ids) + 1))
+
+        dtype = np.uint16 if counts.max(initial=0) < 2 ** 16 else np.uint32
+        day_dtype = np.uint16 if num_days < 2 ** 16 else np.uint32
+        return cls(np.asarray(user_ids), start_date, num_days, indptr, (cells % stride).astype(day_dtype),
+                   counts.astype(dtype), list(keyword_flags.content_types), time_rules)
+
+    def window_sums(self, window='week', step_days=7, first=0, last=None):
+        """第 first:last 个用户在各滑动窗口内的特征总量，返回 (starts, sums[用户, 窗口, 特征])
+
+        只对这些用户的行求前缀和，窗口总量为两次二分查找位置上的前缀和之差
+        """
+        last = len(self.user_ids) if last is None else last
+        starts, ends = window_bounds(self.num_days, WINDOW_DAYS.get(window, window), step_days)
+        lo, hi = self.indptr[first], self.indptr[last]
+        counts = self.counts[lo:hi]
+        prefix = np.concatenate([np.zeros((1, counts.shape[1]), dtype=np.int64),
+                                 np.cumsum(counts, axis=0, dtype=np.int64)])
+        stride = max(self.num_days, 1)
+        rows = np.repeat(np.arange(last - first), np.diff(self.indptr[first:last + 1]))
+        keys = rows * stride + self.days[lo:hi].astype(np.int64)
+        offsets = np.arange(last - first)[:, None] * stride
+        start_positions = np.searchsorted(keys, offsets + starts, side='left')
+        end_positions = np.searchsorted(keys, offsets + ends, side='left')
+        return starts, prefix[end_positions] - prefix[start_positions]
+
+    def classify(self, sums):
+        """按生成时间线的处理器的规则，对窗口特征总量批量分类"""
+        f = {name: sums[..., i].astype(float) for i, name in enumerate(self.features)}
+        messages = f['messages']
+        total = np.maximum(messages, 1)
+
+        time_type = self.classify_time(f)
+        timed = np.maximum(f['timed'], 1)
+
+        emotional = f['positive'] + f['negative']
+        positive_ratio = np.divide(f['positive'], emotional, out=np.full(messages.shape, 0.5), where=emotional > 0)
+        sentiment = np.select([(emotional > 0) & (positive_ratio > 0.6), (emotional > 0) & (positive_ratio < 0.4)], [0, 1], default=2)
+
+        type_hits = sums[..., len(BASE_FEATURES):]
+        default_type = self.content_types.index('闲聊型') if '闲聊型' in self.content_types else 0
+        content_type = np.where(type_hits.sum(axis=-1) > 0, type_hits.argmax(axis=-1), default_type) \
+            if self.content_types else np.zeros(messages.shape, dtype=int)
+
+        return {
+            'messages': messages.astype(int),
+            'time_type': time_type,
+            'content_type': content_type,
+            'sentiment': sentiment,
+            'morning_ratio': f['morning'] / timed,
+            'night_ratio': f['night'] / timed,
+            'question_rate': f['question'] / total,
+            'reply_rate': f['reply'] / total
+        }
+
+    def window_dates(self, starts):
+        return [(self.start_date + pd.Timedelta(days=int(start))).strftime('%Y-%m-%d') for start in starts]
+
+    def timeline_for(self, user_id, window='week', step_days=7):
+        """单个用户的列式时间线；用户没有消息时返回None"""
+        row = self.user_index.get(str(user_id))
+        if row is None:
+            return None
+        starts, sums = self.window_sums(window, step_days, row, row + 1)
+        result = self.classify(sums[0])
+        return {
+            'user_id': str(user_id),
+            'window_days': WINDOW_DAYS.get(window, window),
+            'step_days': step_days,
+            'starts': self.window_dates(starts),
+            'messages': result['messages'].tolist(),
+            'time_type': [self.time_types[i] for i in result['time_type']],
+            'content_type': [self.content_types[i] if self.content_types else '闲聊型' for i in result['content_type']],
+            'sentiment': [SENTIMENT_TYPES[i] for i in result['sentiment']],
+            'morning_ratio': np.round(result['morning_ratio'], 3).tolist(),
+            'night_ratio': np.round(result['night_ratio'], 3).tolist(),
+            'question_rate': np.round(result['question_rate'], 3).tolist(),
+            'reply_rate': np.round(result['reply_rate'], 3).tolist()
+        }
+
+    def weekly_summaries(self):
+        """所有用户的周时间线摘要（消息数+时间习惯），用于写入画像JSON"""
+        summaries = {}
+        starts = window_bounds(self.num_days, WINDOW_DAYS['week'], 7)[0]
+        for first in range(0, len(self.user_ids), WINDOW_BATCH_USERS):
+            last = min(first + WINDOW_BATCH_USERS, len(self.user_ids))
+            starts, sums = self.window_sums('week', 7, first, last)
+            result = self.classify(sums)
+            for row in range(last - first):
+                summaries[self.user_ids[first + row]] = {
+                    'messages': result['messages'][row].tolist(),
+                    'time_type': [self.time_types[i] for i in result['time_type'][row]]
+                }
+        return self.window_dates(starts), summaries
+
+    def mismatched_time_types(self, profile_time_types):
+        """覆盖全部历史的窗口应与画像的时间习惯类型一致，返回不一致的 user_id 列表
+
+        profile_time_types: {user_id: 画像中的 time_pattern.type}
+        """
+        mismatched = []
+        for first in range(0, len(self.user_ids), WINDOW_BATCH_USERS):
+            last = min(first + WINDOW_BATCH_USERS, len(self.user_ids))
+            _, sums = self.window_sums(self.num_days, 1, first, last)
+            time_types = self.classify(sums[:, 0])['time_type']
+            for row in range(last - first):
+                user_id = self.user_ids[first + row]
+                expected = profile_time_types.get(user_id)
+                if expected is not None and self.time_types[time_types[row]] != expected:
+                    mismatched.append(user_id)
+        return mismatched
+
+    def save(self, path=DEFAULT_TIMELINE_PATH):
+        timeline_dir = os.path.dirname(path)
+        if timeline_dir:
+            os.makedirs(timeline_dir, exist_ok=True)
+        meta = {'format': TIMELINE_FORMAT, 'start_date': self.start_date.strftime('%Y-%m-%d'), 'num_days': self.num_days,
+                'content_types': self.content_types, 'time_rules': self.time_rules}
+        np.savez_compressed(path, meta=json.dumps(meta, ensure_ascii=False), user_ids=self.user_ids,
+                            indptr=self.indptr, days=self.days, counts=self.counts)
+        print(f"用户时间线已保存到 {path}：{len(self.user_ids)} 个用户，{self.num_days} 天，{len(self.days)} 个活跃用户日")
+
+    @classmethod
+    def load(cls, path=DEFAULT_TIMELINE_PATH):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('format') != TIMELINE_FORMAT:
+                raise ValueError(f'{path} 是旧格式的时间线，请重新运行数据处理脚本')
+            return cls(data['user_ids'], meta['start_date'], meta['num_days'], data['indptr'], data['days'],
+                       data['counts'], meta['content_types'], meta['time_rules'])
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jieba分词与TF-IDF关键词
+按消息内容哈希把分词结果缓存到磁盘，只对新出现的内容分词（多进程并行）；
+词频以稀疏的 (行, 词, 次数) 结构按用户/群组聚合，再计算每个用户和群组的TF-IDF关键词
+"""
+
+import hashlib
+import itertools
+import os
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOKEN_CACHE_PATH = "data/token_cache.pkl"
+DEFAULT_TOKEN_CACHE_MAX_ENTRIES = 500000  # 保存时超出该条数则淘汰最久未用到的内容
+DEFAULT_TOP_KEYWORDS = 10
+PARALLEL_MIN_TEXTS = 2000  # 待分词内容少于该数量时在本进程完成，省去子进程加载词典的开销
+CHUNK_SIZE = 1000
+
+# 表情包/图片占位、语气词等高频但无信息量的词
+STOPWORDS = {
+    '表情包', '图片', '戳了戳', '这个', '那个', '什么', '怎么', '就是', '还是', '不是', '没有', '可以',
+    '一个', '我们', '你们', '他们', '自己', '这么', '那么', '然后', '因为', '所以', '但是', '已经',
+    '哈哈', '哈哈哈', '哈哈哈哈', '真的', '感觉', '知道', '现在', '时候', '应该', '觉得', '一下', '这样',
+    '这是', '小小', '小小纺'
+}
+_TOKEN_PATTERN = re.compile(r'^[一-鿿A-Za-z][一-鿿A-Za-z0-9]+$')
+PLACEHOLDER_PATTERN = re.compile(r'\[[^\]]*\]|（[^）]*）')  # [表情包：...]、[picid:...]、（功能说明）等占位内容
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def segment_texts(texts):
+    """子进程入口：去掉方括号占位内容后对一批文本分词，只保留长度>=2的中英文词"""
+    import jieba
+    jieba.setLogLevel(60)
+    return [
+        tuple(
+            token for token in jieba.lcut(PLACEHOLDER_PATTERN.sub(' ', text))
+            if _TOKEN_PATTERN.match(token) and token not in STOPWORDS
+        )
+        for text in texts
+    ]
+
+
+class TokenCache:
+    """内容哈希 -> 分词结果 的磁盘缓存
+
+    首次分词时才从磁盘加载；字典按最近使用排序，保存时只保留最近用到的 max_entries 条
+    """
+
+    def __init__(self, path=DEFAULT_TOKEN_CACHE_PATH, max_workers=None, max_entries=DEFAULT_TOKEN_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self._tokens = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = {}
+            if self.path and os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    self._tokens = pickle.load(f)
+        return self._tokens
+
+    def tokenize(self, texts):
+        """返回与 texts 对应的分词结果；相同内容只分词一次，已缓存的内容不再分词"""
+        inverse, unique_texts = pd.factorize(pd.Series(texts, dtype=object).fillna('').astype(str))
+        hashes = [content_hash(text) for text in unique_texts]
+        tokens = self.tokens
+        missing = []
+        for i, key in enumerate(hashes):
+            if key in tokens:
+                tokens[key] = tokens.pop(key)  # 移到末尾，标记为最近使用
+            else:
+                missing.append(i)
+        self.hits += len(hashes) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            pending = [unique_texts[i] for i in missing]
+            chunks = [pending[start:start + CHUNK_SIZE] for start in range(0, len(pending), CHUNK_SIZE)]
+            if len(pending) >= PARALLEL_MIN_TEXTS and self.max_workers != 1:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    results = [tokens for chunk in executor.map(segment_texts, chunks) for tokens in chunk]
+            else:
+                results = segment_texts(pending)
+            for i, result in zip(missing, results):
+                tokens[hashes[i]] = result
+            self.dirty = True
+
+        unique_tokens = [tokens[key] for key in hashes]
+        return [unique_tokens[code] for code in inverse]
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        tokens = self.tokens
+        if len(tokens) > self.max_entries:
+            # 字典头部是最久未用到的内容
+            stale = len(tokens) - self.max_entries
+            for key in list(itertools.islice(tokens, stale)):
+                del tokens[key]
+            self.evictions += stale
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            pickle.dump(self.tokens, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+        print(f"分词缓存已保存到 {self.path}：{len(tokens)} 条内容，淘汰 {self.evictions} 条")
+
+
+class TermCounts:
+    """稀疏词频：按行排序的 (行, 词, 次数) 三元组，行可以是用户或群组"""
+
+    def __init__(self, row_labels, vocabulary, rows, terms, counts):
+        self.row_labels = np.asarray(row_labels).astype(str)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        self.rows = rows
+        self.terms = terms
+        self.counts = counts
+        self.indptr = np.searchsorted(rows, np.arange(len(self.row_labels) + 1))
+        self.row_index = {label: i for i, label in enumerate(self.row_labels)}
+
+    @classmethod
+    def build(cls, row_keys, token_lists, vocabulary=None):
+        """row_keys 与 token_lists 一一对应；一次展开所有词后按 (行, 词) 组合键计数"""
+        row_codes, row_labels = pd.factorize(pd.Series(row_keys).astype(str), sort=True)
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+        flat_tokens = [token for tokens in token_lists for token in tokens]
+        if vocabulary is None:
+            term_codes, vocabulary = pd.factorize(pd.Series(flat_tokens, dtype=object), sort=True)
+        else:
+            term_codes = pd.Index(vocabulary).get_indexer(flat_tokens)
+
+        token_rows = np.repeat(row_codes, lengths)
+        keys = token_rows.astype(np.int64) * max(len(vocabulary), 1) + term_codes
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        return cls(row_labels, vocabulary, unique_keys // max(len(vocabulary), 1),
+                   unique_keys % max(len(vocabulary), 1), counts)
+
+    def document_frequency(self):
+        """每个词出现在多少行中"""
+        return np.bincount(self.terms, minlength=len(self.vocabulary))
+
+    def tfidf_top_terms(self, k=DEFAULT_TOP_KEYWORDS, min_count=2):
+        """每行TF-IDF最高的k个词：{行标签: [[词, 分数], ...]}；只出现一次的词不参与"""
+        num_rows = len(self.row_labels)
+        idf = np.log((1 + num_rows) / (1 + self.document_frequency())) + 1
+        row_totals = np.bincount(self.rows, weights=self.counts, minlength=num_rows)
+        scores = self.counts / np.maximum(row_totals[self.rows], 1) * idf[self.terms]
+        eligible = self.counts >= min_count
+
+        order = np.lexsort((-scores, self.rows))
+        order = order[eligible[order]]
+        rows = self.rows[order]
+        rank = np.arange(len(order)) - np.searchsorted(rows, rows)
+        keep = order[rank < k]
+
+        result = {str(label): [] for label in self.row_labels}
+        for row, term, score in zip(self.rows[keep], self.terms[keep], scores[keep]):
+            result[str(self.row_labels[row])].append([self.vocabulary[term], round(float(score), 4)])
+        return result
+
+
+def build_keyword_profiles(messages_df, cache, k=DEFAULT_TOP_KEYWORDS):
+    """分词（走缓存）后生成用户级和群组级TF-IDF关键词，返回 (用户关键词, 群组关键词)"""
+    token_lists = cache.tokenize(messages_df['message_content'].tolist())
+    user_terms = TermCounts.build(messages_df['user_id'], token_lists)
+    group_terms = TermCounts.build(messages_df['group_name'].fillna('未知群组'), token_lists, user_terms.vocabulary)
+    print(f"分词完成：缓存命中 {cache.hits} 条内容，新分词 {cache.misses} 条内容，词表 {len(user_terms.vocabulary)} 个词")
+    return user_terms.tfidf_top_terms(k), group_terms.tfidf_top_terms(k)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+群组话题趋势与突发检测
+每个 (群组, 日期) 维护一个Count-Min Sketch，计入字符n-gram哈希（不依赖分词）和内容类别命中数，
+词表无限增长时内存仍然固定；草图可直接相加，按日期记录已计入消息的去重键哈希，
+新备份（含补录的旧消息）到达时只计入未计入过的消息。
+快速/增强处理器的关键词表不同，各自使用独立的草图文件；关键词表、数据源或是否剔除近重复消息变化时重建。
+突发分数为当日计数相对指数衰减基线的z分数
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from keyword_flags import contains_any
+from message_dedup import hash_message_keys
+from near_duplicates import shingle_hashes
+from tokenization import PLACEHOLDER_PATTERN, STOPWORDS
+
+# 各处理器的草图文件；统一服务器按此顺序选择存在的文件
+TREND_PATHS = {
+    'enhanced': "data/trend_sketch_enhanced.npz",
+    'fast': "data/trend_sketch_fast.npz"
+}
+DEFAULT_TOP_TRENDS = 10
+NGRAM_SIZES = (2, 3)
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+HEAVY_HITTERS = 50  # 每个 (群组, 日期) 保留的高频n-gram文本，作为趋势候选
+EWMA_ALPHA = 0.3
+MIN_HISTORY_DAYS = 3  # 基线至少积累的天数，之前的日期不计算突发分数
+MIN_TREND_COUNT = 3
+UNKNOWN_GROUP = '未知群组'
+
+_RUN_PATTERN = re.compile(r'[一-鿿]{2,}|[a-z][a-z0-9]+')
+_LATIN_PATTERN = re.compile(r'^[a-z]')
+
+
+def category_hash(name):
+    """内容类别的条目哈希，与n-gram哈希共用同一个草图"""
+    return np.uint64(int.from_bytes(hashlib.blake2b(f"类别:{name}".encode('utf-8'), digest_size=8).digest(), 'little'))
+
+
+def term_hashes(terms):
+    """单个条目文本的哈希，与批量提取n-gram时的哈希一致"""
+    return np.array([shingle_hashes([term], len(term))[1][0] for term in terms], dtype=np.uint64)
+
+
+def extract_ngrams(texts, sizes=NGRAM_SIZES):
+    """汉字片段切分为字符n-gram，英文单词整体作为一个条目；同一消息中重复的条目只计一次
+
+    返回 (所属消息下标, 哈希, 文本)
+    """
+    runs, run_owner, words, word_owner = [], [], [], []
+    for i, text in enumerate(texts):
+        for run in _RUN_PATTERN.findall(PLACEHOLDER_PATTERN.sub(' ', text).lower()):
+            if _LATIN_PATTERN.match(run):
+                words.append(run)
+                word_owner.append(i)
+            else:
+                runs.append(run)
+                run_owner.append(i)
+    run_owner = np.asarray(run_owner, dtype=np.int64)
+
+    owners, hashes, texts_out = [np.asarray(word_owner, dtype=np.int64)], [term_hashes(words)], list(words)
+    for n in sizes:
+        owner, gram_hashes = shingle_hashes(runs, n)
+        if not len(owner):
+            continue
+        offsets = np.arange(len(owner)) - np.searchsorted(owner, owner)
+        owners.append(run_owner[owner])
+        hashes.append(gram_hashes)
+        texts_out.extend(runs[run][offset:offset + n] for run, offset in zip(owner, offsets))
+
+    owners, hashes = np.concatenate(owners), np.concatenate(hashes)
+    _, first = np.unique(np.column_stack([owners, hashes.view(np.int64)]), axis=0, return_index=True)
+    return owners[first], hashes[first], [texts_out[i] for i in first]
+
+
+def keyword_table_hash(content_keywords):
+    """内容类别关键词表（含顺序）的哈希，用于发现关键词表变化"""
+    text = json.dumps(list(content_keywords.items()), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def burst_scores(series, alpha=EWMA_ALPHA):
+    """series: (条目, 天) 每日计数；返回每天相对此前指数衰减基线的z分数和基线均值
+
+    方差下限取基线均值（泊松近似）再加1，避免低频条目因方差为0得到极端分数
+    """
+    mean = np.zeros(series.shape[0])
+    var = np.zeros(series.shape[0])
+    scores = np.zeros(series.shape)
+    baselines = np.zeros(series.shape)
+    for day in range(series.shape[1]):
+        diff = series[:, day] - mean
+        scores[:, day] = diff / np.sqrt(np.maximum(var, mean) + 1)
+        baselines[:, day] = mean
+        mean = mean + alpha * diff
+        var = (1 - alpha) * (var + alpha * diff ** 2)
+    scores[:, :MIN_HISTORY_DAYS] = 0
+    return scores, baselines
+
+
+class TrendSketch:
+    def __init__(self, categories=(), width=SKETCH_WIDTH, depth=SKETCH_DEPTH, seed=42, keyword_hash=None,
+                 source=None, exclude_duplicates=False):
+        """每个 (群组, 日期) 一个 depth×width 的Count-Min Sketch
+
+        keyword_hash: 构建时所用关键词表的哈希（keyword_table_hash）
+        source: 数据源描述（data_source.describe()）
+        exclude_duplicates: 计入的消息是否已剔除近重复消息
+        """
+        self.categories = list(categories)
+        self.keyword_hash = keyword_hash
+        self.source = source
+        self.exclude_duplicates = exclude_duplicates
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.hash_a = rng.integers(1, 2 ** 63, depth, dtype=np.uint64) | np.uint64(1)
+        self.hash_b = rng.integers(0, 2 ** 63, depth, dtype=np.uint64)
+
+        self.cell_keys = []
+        self.cell_index = {}
+        self.sketches = np.zeros((0, depth, width), dtype=np.uint32)
+        self.heavy_hitters = []
+        self.counted_keys = {}  # 日期 -> 已计入消息去重键哈希（有序 uint64 数组）
+
+    def _columns(self, hashes):
+        """每行哈希函数对应的列号 (depth, 条目)"""
+        with np.errstate(over='ignore'):
+            mixed = (self.hash_a[:, None] * hashes[None, :] + self.hash_b[:, None]) >> np.uint64(32)
+        return (mixed % np.uint64(self.width)).astype(np.int64)
+
+    def _ensure_cells(self, keys):
+        """为新出现的 (群组, 日期) 追加空草图，返回各键的格子编号"""
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self.cell_index]
+        if new_keys:
+            for key in new_keys:
+                self.cell_index[key] = len(self.cell_keys)
+                self.cell_keys.append(key)
+                self.heavy_hitters.append([])
+            grown = np.zeros((len(new_keys), self.depth, self.width), dtype=np.uint32)
+            self.sketches = np.concatenate([self.sketches, grown])
+        return np.array([self.cell_index[key] for key in keys], dtype=np.int64)
+
+    def _claim_new(self, dates, hashes):
+        """按日期比对已计入的去重键，返回未计入过的消息掩码并登记这些键
+
+        按日期而非时间戳水位线判断，晚到的备份补录较早日期的消息时也能计入，且不会重复计数
+        """
+        fresh = ~pd.Series(hashes).duplicated().to_numpy(copy=True)
+        day_codes, days = pd.factorize(dates)
+        for code, day in enumerate(days):
+            rows = np.flatnonzero(day_codes == code)
+            counted = self.counted_keys.get(day, np.zeros(0, dtype=np.uint64))
+            new_rows = rows[fresh[rows] & ~np.isin(hashes[rows], counted)]
+            fresh[rows] = False
+            fresh[new_rows] = True
+            if len(new_rows):
+                self.counted_keys[day] = np.union1d(counted, hashes[new_rows])
+        return fresh
+
+    def update(self, messages_df, content_keywords):
+        """计入此前未计入过的消息；返回本次计入的消息数"""
+        dates = pd.to_datetime(messages_df['date'], errors='coerce')
+        messages_df = messages_df[dates.notna().to_numpy()]
+        dates = dates[dates.notna()].dt.strftime('%Y-%m-%d').to_numpy()
+        if messages_df.empty:
+            return 0
+        fresh = self._claim_new(dates, hash_message_keys(messages_df))
+        messages_df, dates = messages_df[fresh], dates[fresh]
+        if messages_df.empty:
+            return 0
+        for name in content_keywords:
+            if name not in self.categories:
+                self.categories.append(name)
+
+        groups = messages_df['group_name'].fillna(UNKNOWN_GROUP).astype(str)
+        pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([groups, dates]))
+        message_cells = self._ensure_cells(list(pairs))[pair_codes]
+
+        contents = messages_df['message_content'].fillna('').astype(str)
+        owners, hashes, texts = extract_ngrams(contents.tolist())
+
+        # 内容类别：命中关键词的消息计1
+        item_cells, item_hashes = [message_cells[owners]], [hashes]
+        for name, keywords in content_keywords.items():
+            hits = contains_any(contents, keywords)
+            item_cells.append(message_cells[hits])
+            item_hashes.append(np.full(int(hits.sum()), category_hash(name), dtype=np.uint64))
+        item_cells, item_hashes = np.concatenate(item_cells), np.concatenate(item_hashes)
+
+        # 只累加本批涉及的单元，不随草图总规模分配临时数组
+        np.add.at(self.sketches, (item_cells[None, :], np.arange(self.depth)[:, None], self._columns(item_hashes)),
+                  np.uint32(1))
+
+        self._update_heavy_hitters(message_cells[owners], hashes, texts)
+        return len(messages_df)
+
+    def _update_heavy_hitters(self, cells, hashes, texts):
+        """每个格子保留计数最高的n-gram文本；与已有候选合并后用草图估计重新排序"""
+        keys = np.column_stack([cells, hashes.view(np.int64)])
+        unique_keys, first, counts = np.unique(keys, axis=0, return_index=True, return_counts=True)
+        order = np.lexsort((-counts, unique_keys[:, 0]))
+        ordered_cells = unique_keys[order, 0]
+        rank = np.arange(len(order)) - np.searchsorted(ordered_cells, ordered_cells)
+
+        candidates = {}
+        for i in order[rank < HEAVY_HITTERS]:
+            candidates.setdefault(int(unique_keys[i, 0]), []).append(texts[first[i]])
+
+        for cell, terms in candidates.items():
+            merged = list(dict.fromkeys(self.heavy_hitters[cell] + terms))
+            if len(merged) > HEAVY_HITTERS:
+                estimates = self.estimate([cell], term_hashes(merged))[0]
+                merged = [merged[i] for i in np.argsort(-estimates, kind='stable')[:HEAVY_HITTERS]]
+            self.heavy_hitters[cell] = merged
+
+    def estimate(self, cells, hashes):
+        """Count-Min估计 (格子, 条目)：各行计数取最小值；格子为-1时计数为0"""
+        cells = np.asarray(cells, dtype=np.int64)
+        columns = self._columns(np.asarray(hashes, dtype=np.uint64))
+        if not len(self.sketches):
+            return np.zeros((len(cells), columns.shape[1]), dtype=np.int64)
+        values = self.sketches[np.maximum(cells, 0)[:, None, None], np.arange(self.depth)[None, :, None], columns[None, :, :]]
+        return np.where(cells[:, None] >= 0, values.min(axis=1), 0).astype(np.int64)
+
+    def groups(self):
+        return sorted({group for group, _ in self.cell_keys})
+
+    def dates(self):
+        """从最早到最新的连续日期，没有消息的日期也参与基线衰减"""
+        if not self.cell_keys:
+            return []
+        days = sorted({date for _, date in self.cell_keys})
+        return pd.date_range(days[0], days[-1]).strftime('%Y-%m-%d').tolist()
+
+    def _score(self, group, hashes, dates):
+        cells = [self.cell_index.get((group, date), -1) for date in dates]
+        series = self.estimate(cells, hashes).T.astype(float)
+        scores, baselines = burst_scores(series)
+        return series, scores, baselines
+
+    def trending(self, group, date=None, window_days=7, k=DEFAULT_TOP_TRENDS):
+        """群组在截至 date 的 window_days 天内的突发话题：每个候选取窗口内z分数最高的一天"""
+        all_dates = self.dates()
+        group_dates = [d for g, d in self.cell_keys if g == group]
+        if not group_dates:
+            return None
+        date = date or max(group_dates)
+        if date not in all_dates:
+            raise ValueError(f"日期超出范围: {date}")
+        dates = all_dates[:all_dates.index(date) + 1]
+        window = dates[-window_days:]
+
+        candidates = list(dict.fromkeys(
+            term for day in window if (group, day) in self.cell_index
+            for term in self.heavy_hitters[self.cell_index[(group, day)]]
+        ))
+        terms = self._rank(candidates, term_hashes(candidates), group, dates, window_days, k, dedupe=True)
+        categories = self._rank(
+            self.categories, np.array([category_hash(name) for name in self.categories], dtype=np.uint64),
+            group, dates, window_days, len(self.categories), dedupe=False
+        )
+        return {'group': group, 'date': date, 'window_days': window_days, 'terms': terms, 'categories': categories}
+
+    def _rank(self, names, hashes, group, dates, window_days, k, dedupe):
+        if not len(names):
+            return []
+        series, scores, baselines = self._score(group, hashes, dates)
+        window_scores = scores[:, -window_days:]
+        peak = window_scores.argmax(axis=1) + max(len(dates) - window_days, 0)
+        rows = np.arange(len(names))
+        counts, peak_scores, peak_baselines = series[rows, peak], scores[rows, peak], baselines[rows, peak]
+
+        results = []
+        for i in np.argsort(-peak_scores, kind='stable'):
+            if len(results) >= k or (dedupe and peak_scores[i] <= 0):
+                break
+            if dedupe and (counts[i] < MIN_TREND_COUNT or names[i] in STOPWORDS
+                           or any(self._same_phrase(names[i], dates[peak[i]], counts[i], r) for r in results)):
+                continue
+            results.append({
+                'term': names[i],
+                'date': dates[peak[i]],
+                'count': int(counts[i]),
+                'baseline': round(float(peak_baselines[i]), 2),
+                'z': round(float(peak_scores[i]), 2) + 0.0
+            })
+        return results
+
+    @staticmethod
+    def _same_phrase(term, date, count, selected):
+        """互为子串，或同日同计数且有公共字（如"疯狂"与"狂星期"），视为同一短语的片段"""
+        if term in selected['term'] or selected['term'] in term:
+            return True
+        return selected['date'] == date and selected['count'] == count and bool(set(term) & set(selected['term']))
+
+    def trending_all(self, date=None, window_days=7, k=DEFAULT_TOP_TRENDS):
+        """所有群组的突发话题；date 为空时各群组取自己最新的日期"""
+        result = {}
+        for group in self.groups():
+            try:
+                result[group] = self.trending(group, date, window_days, k)
+            except ValueError:
+                continue
+        return result
+
+    def save(self, path):
+        trend_dir = os.path.dirname(path)
+        if trend_dir:
+            os.makedirs(trend_dir, exist_ok=True)
+        counted_days = sorted(self.counted_keys)
+        meta = {
+            'categories': self.categories, 'keyword_hash': self.keyword_hash,
+            'source': self.source, 'exclude_duplicates': self.exclude_duplicates,
+            'width': self.width, 'depth': self.depth, 'seed': self.seed,
+            'cell_keys': self.cell_keys, 'heavy_hitters': self.heavy_hitters, 'counted_days': counted_days
+        }
+        counted = [self.counted_keys[day] for day in counted_days]
+        np.savez_compressed(
+            path, sketches=self.sketches, meta=json.dumps(meta, ensure_ascii=False),
+            counted_keys=np.concatenate(counted) if counted else np.zeros(0, dtype=np.uint64),
+            counted_offsets=np.cumsum([0] + [len(keys) for keys in counted])
+        )
+        print(f"趋势草图已保存到 {path}：{len(self.cell_keys)} 个 (群组, 日期) 格子")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            sketch = cls(meta['categories'], meta['width'], meta['depth'], meta['seed'], meta.get('keyword_hash'),
+                         meta.get('source'), meta.get('exclude_duplicates', False))
+            sketch.sketches = data['sketches']
+            if 'counted_keys' in data.files:
+                keys, offsets = data['counted_keys'], data['counted_offsets']
+                sketch.counted_keys = {day: keys[offsets[i]:offsets[i + 1]] for i, day in enumerate(meta['counted_days'])}
+        sketch.cell_keys = [tuple(key) for key in meta['cell_keys']]
+        sketch.cell_index = {key: i for i, key in enumerate(sketch.cell_keys)}
+        sketch.heavy_hitters = meta['heavy_hitters']
+        return sketch
+
+
+def load_or_create_trends(content_keywords, path, source=None, exclude_duplicates=False):
+    """已有草图的关键词表、数据源和近重复剔除设置都未变时在其基础上增量计入新消息，否则新建
+
+    关键词表变化后，已计入的消息需要按新关键词重新计数；数据源或剔除设置变化后，
+    已计入的消息集合与本次不同，都只能整体重建
+    """
+    keyword_hash = keyword_table_hash(content_keywords)
+    if os.path.exists(path):
+        sketch = TrendSketch.load(path)
+        if sketch.keyword_hash != keyword_hash:
+            print(f"关键词表已变化，重建趋势草图 {path}")
+        elif sketch.source != source or sketch.exclude_duplicates != exclude_duplicates:
+            print(f"数据源或近重复剔除设置已变化，重建趋势草图 {path}")
+        else:
+            print(f"从 {path} 增量更新趋势草图")
+            return sketch
+    return TrendSketch(list(content_keywords), keyword_hash=keyword_hash, source=source,
+                       exclude_duplicates=exclude_duplicates)
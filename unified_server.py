@@ -11,12 +11,55 @@ import webbrowser
 import os
 import sys
 import json
+import re
+import threading
+import traceback
+from datetime import datetime
 from pathlib import Path
+from urllib.parse import quote, urlparse, parse_qs
+
+from message_store import DEFAULT_DB_PATH, MessageStore
+from count_cube import CUBE_DIMENSIONS, DEFAULT_CUBE_PATH, CountCube
+from group_profiles import DEFAULT_GROUP_PROFILES_PATH, GroupProfileTable
+from timeline import DEFAULT_TIMELINE_PATH, WINDOW_DAYS, TimelineStore
+from similar_users import DEFAULT_SIMILARITY_PATH, SimilarityIndex
+from trends import DEFAULT_TOP_TRENDS, TREND_PATHS, TrendSketch
+from snapshot_delta import DEFAULT_DELTA_PATH, DeltaLog
+from profile_details import DEFAULT_PROFILE_CACHE_SIZE, ProfileDetailCache, compute_profile_details
+from enhanced_data_processor import EnhancedUserProfileProcessor
+from user_export import DEFAULT_ANALYTICS_PATH, UserExportIndex, gzip_chunks
 
 class UnifiedRequestHandler(http.server.SimpleHTTPRequestHandler):
     """统一的请求处理器，处理所有静态文件和API请求"""
 
+    # HTTP/1.1：导出接口使用分块传输，其余响应都带 Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    # SQLite消息存储（可选），用于按用户下钻查询
+    message_store = None
+
+    # 预计算数据文件（数据立方体、分群组画像等）：首次请求时加载，文件更新后自动重新加载
+    cube_path = DEFAULT_CUBE_PATH
+    group_profiles_path = DEFAULT_GROUP_PROFILES_PATH
+    timeline_path = DEFAULT_TIMELINE_PATH
+    similarity_path = DEFAULT_SIMILARITY_PATH
+    trend_paths = TREND_PATHS
+    delta_path = DEFAULT_DELTA_PATH
+    analytics_path = DEFAULT_ANALYTICS_PATH
+    artifact_cache = {}
+    artifact_lock = threading.Lock()
+
+    # 按需计算的详细画像（--light 处理结果），LRU缓存，数据版本变化时失效
+    profile_cache = ProfileDetailCache(DEFAULT_PROFILE_CACHE_SIZE)
+    profile_processor = None
+
     def do_GET(self):
+        parsed = urlparse(self.path)
+
+        # API请求
+        if parsed.path.startswith('/api/'):
+            return self.handle_api(parsed.path, parse_qs(parsed.query))
+
         # 如果请求是根路径，返回index.html
         if self.path == '/':
             self.path = '/index.html'
@@ -24,7 +67,329 @@ class UnifiedRequestHandler(http.server.SimpleHTTPRequestHandler):
         # 处理静态文件请求
         return super().do_GET()
 
+    def do_HEAD(self):
+        # 导出接口支持HEAD：前端据此判断服务器能否流式导出，静态部署时回退到页面内生成文件
+        parsed = urlparse(self.path)
+        if parsed.path == '/api/export':
+            return self.handle_api(parsed.path, parse_qs(parsed.query))
+        return super().do_HEAD()
+
+    def send_head(self):
+        """静态文件附带ETag（修改时间+大小）；If-None-Match 命中时返回304，前端据此复用本地缓存的数据"""
+        self.etag = None
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self.etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()
+
+    def handle_api(self, path, query):
+        """分发API请求"""
+        try:
+            match = re.fullmatch(r'/api/users/(\d+)/messages', path)
+            if match:
+                return self.api_user_messages(match.group(1), query)
+
+            match = re.fullmatch(r'/api/users/(\d+)/timeline', path)
+            if match:
+                return self.api_user_timeline(match.group(1), query)
+
+            match = re.fullmatch(r'/api/users/(\d+)/similar', path)
+            if match:
+                return self.api_similar_users(match.group(1), query)
+
+            match = re.fullmatch(r'/api/users/(\d+)/profile', path)
+            if match:
+                return self.api_user_profile(match.group(1))
+
+            if path == '/api/profiles/cache':
+                return self.send_json(self.profile_cache.stats())
+
+            if path == '/api/cube':
+                return self.api_cube(query)
+
+            if path == '/api/groups':
+                return self.api_groups()
+
+            if path == '/api/groups/profiles':
+                return self.api_group_profiles(query)
+
+            if path == '/api/trends':
+                return self.api_trends(query)
+            if path == '/api/delta':
+                return self.api_delta(query)
+
+            if path == '/api/export':
+                return self.api_export(query)
+
+            return self.send_json({'error': f'未知接口: {path}'}, status=404)
+        except ValueError as e:
+            return self.send_json({'error': f'参数错误: {e}'}, status=400)
+        except Exception as e:
+            # 数据库、预计算文件加载等错误：记录日志并返回500，不直接断开连接
+            self.log_error('接口 %s 处理失败: %r', path, e)
+            traceback.print_exc()
+            return self.send_json({'error': f'服务器内部错误: {e}'}, status=500)
+
+    def api_user_messages(self, user_id, query):
+        """用户消息下钻：/api/users/<id>/messages?group=&from=&to=&limit="""
+        if self.message_store is None:
+            return self.send_json({'error': '未启用SQLite消息存储，请先运行 python message_store.py import'}, status=503)
+
+        group = query.get('group', [None])[0]
+        messages = self.message_store.query_user_messages(
+            user_id,
+            group_id=group,
+            date_from=query.get('from', [None])[0],
+            date_to=query.get('to', [None])[0],
+            limit=min(int(query.get('limit', [200])[0]), 5000)
+        )
+        return self.send_json({'user_id': user_id, 'count': len(messages), 'messages': messages})
+
+    @classmethod
+    def detail_processor(cls):
+        """计算详细画像用的处理器（关键词表和各维度计算方法），首次请求时创建"""
+        with cls.artifact_lock:
+            if cls.profile_processor is None:
+                cls.profile_processor = EnhancedUserProfileProcessor(token_cache_path=None)
+            return cls.profile_processor
+
+    def data_version(self):
+        """详细画像的数据版本：快照版本号 + 消息库数据代数，任一变化时缓存整体失效
+
+        WAL模式下写入先落在 -wal 文件，主库文件的修改时间不变；消息数又察觉不到改写已有消息的upsert，
+        因此用导入时递增的数据代数，每次请求只做一次主键查询
+        """
+        log = self.load_artifact(self.delta_path, DeltaLog.load)
+        return (log.version if log is not None else None, self.message_store.generation())
+
+    def api_user_profile(self, user_id):
+        """详细画像：/api/users/<id>/profile，首次请求时从消息库计算，之后从LRU缓存返回"""
+        if self.message_store is None:
+            return self.send_json({'error': '未启用SQLite消息存储，请先运行 python message_store.py import'}, status=503)
+
+        version = self.data_version()
+        details, cached = self.profile_cache.get(
+            user_id, version,
+            lambda: compute_profile_details(self.detail_processor(), self.message_store, user_id)
+        )
+        if details is None:
+            return self.send_json({'error': f'用户 {user_id} 没有消息记录'}, status=404)
+        return self.send_json({'user_id': user_id, 'version': version, 'cached': cached, 'details': details})
+
+    @classmethod
+    def load_artifact(cls, path, loader):
+        """按文件修改时间缓存预计算文件；文件不存在时返回None"""
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        with cls.artifact_lock:
+            cached = cls.artifact_cache.get(path)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, loader(path))
+                cls.artifact_cache[path] = cached
+            return cached[1]
+
+    def api_cube(self, query):
+        """多维计数切片：/api/cube?by=hour&group=&content_type=&volume_level=&from=&to=
+
+        by 为逗号分隔的保留维度（最多两个），筛选参数可重复或逗号分隔
+        """
+        cube = self.load_artifact(self.cube_path, CountCube.load)
+        if cube is None:
+            return self.send_json({'error': f'未找到数据立方体 {self.cube_path}，请先运行数据处理脚本'}, status=503)
+
+        by = [dim for dim in query.get('by', ['hour'])[0].split(',') if dim]
+        unknown = [dim for dim in by if dim not in CUBE_DIMENSIONS]
+        if unknown or len(by) > 2:
+            raise ValueError(f'by 只能是 {CUBE_DIMENSIONS} 中的最多两个维度')
+
+        filters = {}
+        for dim in CUBE_DIMENSIONS:
+            values = [value for raw in query.get(dim, []) for value in raw.split(',') if value]
+            if values:
+                filters[dim] = values
+
+        result = cube.query(filters, query.get('from', [None])[0], query.get('to', [None])[0], by)
+        return self.send_json(result)
+
+    def api_user_timeline(self, user_id, query):
+        """用户画像时间线：/api/users/<id>/timeline?window=week|month&step=7"""
+        timelines = self.load_artifact(self.timeline_path, TimelineStore.load)
+        if timelines is None:
+            return self.send_json({'error': f'未找到用户时间线 {self.timeline_path}，请先运行数据处理脚本'}, status=503)
+
+        window = query.get('window', ['week'])[0]
+        if window not in WINDOW_DAYS:
+            raise ValueError(f'window 只能是 {list(WINDOW_DAYS)}')
+        step = int(query.get('step', [7])[0])
+        if step < 1:
+            raise ValueError('step 必须为正整数')
+
+        timeline = timelines.timeline_for(user_id, window, step)
+        if timeline is None:
+            return self.send_json({'error': f'用户 {user_id} 没有消息记录'}, status=404)
+        return self.send_json(timeline)
+
+    def api_similar_users(self, user_id, query):
+        """相似用户：/api/users/<id>/similar?k=10"""
+        index = self.load_artifact(self.similarity_path, SimilarityIndex.load)
+        if index is None:
+            return self.send_json({'error': f'未找到相似用户索引 {self.similarity_path}，请先运行数据处理脚本'}, status=503)
+
+        k = int(query.get('k', [10])[0])
+        if not 1 <= k <= 100:
+            raise ValueError('k 必须在 1-100 之间')
+
+        similar = index.query(user_id, k)
+        if similar is None:
+            return self.send_json({'error': f'用户 {user_id} 没有消息记录'}, status=404)
+        return self.send_json({'user_id': user_id, 'k': k, 'similar': similar})
+
+    def api_trends(self, query):
+        """突发话题：/api/trends?group=&date=YYYY-MM-DD&days=7&k=10&processor=enhanced|fast，不指定群组时返回所有群组
+
+        未指定 processor 时使用存在的草图文件（增强处理器优先）
+        """
+        processor = query.get('processor', [None])[0]
+        if processor and processor not in self.trend_paths:
+            raise ValueError(f'processor 只能是 {list(self.trend_paths)}')
+        candidates = [self.trend_paths[processor]] if processor else list(self.trend_paths.values())
+        trend_path = next((path for path in candidates if os.path.exists(path)), candidates[0])
+        sketch = self.load_artifact(trend_path, TrendSketch.load)
+        if sketch is None:
+            return self.send_json({'error': f'未找到趋势草图 {trend_path}，请先运行数据处理脚本'}, status=503)
+
+        date = query.get('date', [None])[0]
+        days = int(query.get('days', [7])[0])
+        k = int(query.get('k', [DEFAULT_TOP_TRENDS])[0])
+        if not 1 <= days <= 60 or not 1 <= k <= 100:
+            raise ValueError('days 必须在 1-60 之间，k 必须在 1-100 之间')
+
+        group = query.get('group', [None])[0]
+        if not group:
+            return self.send_json({'date': date, 'window_days': days, 'groups': sketch.trending_all(date, days, k)})
+
+        trends = sketch.trending(group, date, days, k)
+        if trends is None:
+            return self.send_json({'error': f'未知群组: {group}'}, status=404)
+        return self.send_json(trends)
+
+    def api_delta(self, query):
+        """快照增量：/api/delta?since=<版本>，返回此后新增/变化的用户、删除的user_id和新的stats"""
+        log = self.load_artifact(self.delta_path, DeltaLog.load)
+        if log is None:
+            return self.send_json({'error': f'未找到快照增量 {self.delta_path}，请先运行数据处理脚本'}, status=503)
+
+        since = query.get('since', [None])[0]
+        if since is None:
+            raise ValueError('缺少 since 参数')
+        delta = log.since(int(since))
+        if delta is None:
+            # 版本过旧（增量已丢弃）或来自另一份快照：客户端应重新加载完整数据
+            return self.send_json({'error': f'无法从版本 {since} 增量更新，请重新加载完整数据',
+                                   'version': log.version}, status=410)
+        return self.send_json(delta)
+
+    def api_export(self, query):
+        """用户列表流式导出：/api/export?dimension=&type=&group=&format=csv|jsonl
+
+        按索引逐批生成并以分块传输发送；请求头声明支持gzip时边生成边压缩（gzip=0 关闭）
+        """
+        index = self.load_artifact(self.analytics_path, UserExportIndex.load)
+        if index is None:
+            return self.send_json({'error': f'未找到分析数据 {self.analytics_path}，请先运行数据处理脚本'}, status=503)
+
+        export_format = query.get('format', ['csv'])[0]
+        dimension = query.get('dimension', [None])[0]
+        label = query.get('type', [None])[0]
+        group = query.get('group', [None])[0]
+        rows = index.select(dimension, label, group)
+        chunks = index.iter_export(rows, export_format)
+        compress = (query.get('gzip', ['1'])[0] != '0' and
+                    'gzip' in self.headers.get('Accept-Encoding', ''))
+
+        date = datetime.now().strftime('%Y-%m-%d')
+        filename = (f"{label}_用户列表_{date}" if label else f"用户画像_{dimension or '全部'}_{date}") + f".{export_format}"
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8' if export_format == 'csv'
+                         else 'application/x-ndjson; charset=utf-8')
+        self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(filename)}")
+        self.send_header('X-Export-Rows', str(len(rows)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        try:
+            for chunk in gzip_chunks(chunks) if compress else chunks:
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消下载
+            self.close_connection = True
+        except Exception as e:
+            # 响应头已发出，无法再返回500：记录日志并断开连接，客户端收到不完整的分块响应
+            self.log_error('导出中断: %r', e)
+            traceback.print_exc()
+            self.close_connection = True
+
+    def load_group_profiles(self):
+        table = self.load_artifact(self.group_profiles_path, GroupProfileTable.load)
+        if table is None:
+            self.send_json({'error': f'未找到分群组画像 {self.group_profiles_path}，请使用 --group-profiles 运行数据处理脚本'}, status=503)
+        return table
+
+    def api_groups(self):
+        """群组列表：/api/groups"""
+        table = self.load_group_profiles()
+        if table is None:
+            return
+        return self.send_json({'groups': table.group_summary()})
+
+    def api_group_profiles(self, query):
+        """群组内画像：/api/groups/profiles?group=<群组名>[&user=<id>]"""
+        group = query.get('group', [None])[0]
+        if not group:
+            raise ValueError('缺少 group 参数')
+
+        table = self.load_group_profiles()
+        if table is None:
+            return
+
+        user_id = query.get('user', [None])[0]
+        if user_id:
+            profile = table.profile_for(group, user_id)
+            if profile is None:
+                return self.send_json({'error': f'用户 {user_id} 未在群组 {group} 中发言'}, status=404)
+            return self.send_json(profile)
+
+        profiles = table.profiles_for_group(group)
+        if profiles is None:
+            return self.send_json({'error': f'未知群组: {group}'}, status=404)
+        return self.send_json({'group': group, 'count': len(profiles), 'users': profiles})
+
+    def send_json(self, payload, status=200):
+        """返回JSON响应"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def end_headers(self):
+        if getattr(self, 'etag', None):
+            self.send_header('ETag', self.etag)
+            self.etag = None
         # 添加CORS头
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
@@ -69,7 +434,18 @@ def check_data_files():
 
     return True
 
-def start_unified_server(port=8080, max_attempts=5):
+def attach_message_store(db_path=DEFAULT_DB_PATH):
+    """如果SQLite消息库存在，则挂载到请求处理器上供下钻查询使用"""
+    if not os.path.exists(db_path):
+        print(f"[提示] 未找到消息数据库 {db_path}，用户消息下钻接口不可用")
+        return False
+
+    UnifiedRequestHandler.message_store = MessageStore(db_path)
+    UnifiedRequestHandler.message_store.connect()
+    print(f"[数据] 已挂载消息数据库: {db_path}")
+    return True
+
+def start_unified_server(port=8080, max_attempts=5, db_path=DEFAULT_DB_PATH):
     """启动统一服务器"""
     original_port = port
 
@@ -78,9 +454,13 @@ def start_unified_server(port=8080, max_attempts=5):
         print("启动失败：缺少必要文件")
         sys.exit(1)
 
+    attach_message_store(db_path)
+
     for attempt in range(max_attempts):
         try:
-            with socketserver.TCPServer(("", port), UnifiedRequestHandler) as httpd:
+            # 多线程处理请求，WAL模式下SQLite可同时服务多个读者
+            socketserver.ThreadingTCPServer.daemon_threads = True
+            with socketserver.ThreadingTCPServer(("", port), UnifiedRequestHandler) as httpd:
                 print("=" * 60)
                 print("[启动] 小小纺用户画像分析平台统一服务器已启动")
                 print("=" * 60)
@@ -95,6 +475,14 @@ def start_unified_server(port=8080, max_attempts=5):
                 print(f"  - 数据可视化图表: http://localhost:{port}/index.html")
                 print(f"  - 内容类型分析: 已集成在主页面中")
                 print(f"  - 时间习惯分析: 已集成在主页面中")
+                if UnifiedRequestHandler.message_store is not None:
+                    print(f"  - 用户消息下钻: http://localhost:{port}/api/users/<id>/messages")
+                    print(f"  - 详细画像（按需计算）: http://localhost:{port}/api/users/<id>/profile")
+                print(f"  - 多维计数切片: http://localhost:{port}/api/cube?by=hour")
+                print(f"  - 分群组画像: http://localhost:{port}/api/groups/profiles?group=<群组名>")
+                print(f"  - 突发话题: http://localhost:{port}/api/trends?group=<群组名>")
+                print(f"  - 快照增量: http://localhost:{port}/api/delta?since=<版本>")
+                print(f"  - 用户列表导出: http://localhost:{port}/api/export?dimension=content_type&type=<类型>&format=csv")
                 print("\n[成功] 所有功能已统一到端口 {}\n".format(port))
 
                 # 自动打开浏览器
@@ -163,11 +551,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='小小纺用户画像分析平台统一服务器')
     parser.add_argument('--port', type=int, default=8080, help='服务器端口 (默认: 8080)')
     parser.add_argument('--stop-conflicts', action='store_true', help='自动停止冲突的服务')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f'SQLite消息数据库路径 (默认: {DEFAULT_DB_PATH})')
+    parser.add_argument('--profile-cache-size', type=int, default=DEFAULT_PROFILE_CACHE_SIZE,
+                        help=f'详细画像LRU缓存的用户数 (默认: {DEFAULT_PROFILE_CACHE_SIZE})')
 
     args = parser.parse_args()
+    UnifiedRequestHandler.profile_cache = ProfileDetailCache(args.profile_cache_size)
 
     if args.stop_conflicts:
         stop_conflicting_services()
 
     print("[启动] 启动统一服务器...")
-    start_unified_server(args.port)
\ No newline at end of file
+    start_unified_server(args.port, db_path=args.db)
\ No newline at end of file
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户列表流式导出
+分析数据加载后按 (维度, 类型标签) 和群组建立行号索引，导出时逐批生成 CSV/JSONL 文本并可边生成边gzip压缩，
+统一服务器以分块传输发送，服务器和浏览器都不需要在内存中拼出整个文件
+"""
+
+import argparse
+import csv
+import io
+import json
+import zlib
+
+import numpy as np
+
+from columnar_bundle import dimension_label
+from compact_payload import decode_compact
+
+DEFAULT_ANALYTICS_PATH = "data/analytics_with_content_types.json"
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_BATCH_ROWS = 500  # 每个分块包含的行数
+CSV_FIELDS = ['user_id', 'nickname', 'main_group', 'group_count', 'message_count', 'avg_message_length']
+
+
+def _groups_of(user):
+    """与前端按群组筛选一致：有 all_groups 列表时用它，否则用 main_group"""
+    if isinstance(user.get('all_groups'), list):
+        return [group for group in user['all_groups'] if isinstance(group, str)]
+    return [user['main_group']] if isinstance(user.get('main_group'), str) else []
+
+
+class UserExportIndex:
+    """分析数据中的用户列表，以及 维度 -> 类型标签 -> 行号、群组 -> 行号 的索引"""
+
+    def __init__(self, users):
+        self.users = users
+        self.dimensions = sorted({name for user in users for name in user.get('dimensions', {})})
+
+        label_rows = {name: {} for name in self.dimensions}
+        group_rows = {}
+        for row, user in enumerate(users):
+            for name, dimension in user.get('dimensions', {}).items():
+                label = dimension_label(dimension)
+                if label is not None:
+                    label_rows[name].setdefault(label, []).append(row)
+            for group in set(_groups_of(user)):
+                group_rows.setdefault(group, []).append(row)
+
+        self.label_rows = {name: {label: np.array(rows, dtype=np.int64) for label, rows in labels.items()}
+                           for name, labels in label_rows.items()}
+        self.group_rows = {group: np.array(rows, dtype=np.int64) for group, rows in group_rows.items()}
+
+    @classmethod
+    def load(cls, path=DEFAULT_ANALYTICS_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            # 分析JSON可能已转换为紧凑格式（README 中的原地转换），先还原字典编码
+            return cls(decode_compact(json.load(f))['users'])
+
+    def select(self, dimension=None, label=None, group=None):
+        """符合条件的行号（升序）；条件为空表示不筛选，未知的类型/群组得到空结果，按类型筛选时维度必须存在"""
+        rows = None
+        if label:
+            if dimension not in self.label_rows:
+                raise ValueError(f'dimension 只能是 {self.dimensions}')
+            rows = self.label_rows[dimension].get(label, np.empty(0, dtype=np.int64))
+        if group:
+            group_rows = self.group_rows.get(group, np.empty(0, dtype=np.int64))
+            rows = group_rows if rows is None else np.intersect1d(rows, group_rows, assume_unique=True)
+        return np.arange(len(self.users)) if rows is None else rows
+
+    def csv_fields(self):
+        return CSV_FIELDS + self.dimensions
+
+    def csv_row(self, user):
+        dimensions = user.get('dimensions', {})
+        return [
+            user.get('user_id'),
+            user.get('nickname'),
+            user.get('main_group'),
+            len(_groups_of(user)),
+            user.get('message_count', dimensions.get('message_volume', {}).get('total_messages', 0)),
+            user.get('avg_message_length', dimensions.get('message_volume', {}).get('avg_length')),
+            *[dimension_label(dimensions.get(name)) or '' for name in self.dimensions]
+        ]
+
+    def iter_csv(self, rows):
+        """逐批生成CSV（带BOM，Excel可直接打开中文）"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write('\ufeff')
+        writer.writerow(self.csv_fields())
+        for start in range(0, len(rows), EXPORT_BATCH_ROWS):
+            writer.writerows(self.csv_row(self.users[row]) for row in rows[start:start + EXPORT_BATCH_ROWS])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def iter_jsonl(self, rows):
+        """逐批生成JSONL，每行一个完整的用户画像"""
+        for start in range(0, len(rows), EXPORT_BATCH_ROWS):
+            lines = [json.dumps(self.users[row], ensure_ascii=False, separators=(',', ':'))
+                     for row in rows[start:start + EXPORT_BATCH_ROWS]]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def iter_export(self, rows, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'format 只能是 {EXPORT_FORMATS}')
+        return self.iter_csv(rows) if export_format == 'csv' else self.iter_jsonl(rows)
+
+
+def gzip_chunks(chunks, level=6):
+    """边生成边压缩为gzip流"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按维度类型/群组导出用户列表')
+    parser.add_argument('input', nargs='?', default=DEFAULT_ANALYTICS_PATH)
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--dimension', help='维度名，如 content_type')
+    parser.add_argument('--type', help='维度的类型标签，如 技术型')
+    parser.add_argument('--group', help='群组名')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true', help='输出gzip压缩文件')
+    args = parser.parse_args()
+
+    index = UserExportIndex.load(args.input)
+    rows = index.select(args.dimension, args.type, args.group)
+    chunks = index.iter_export(rows, args.format)
+    with open(args.output, 'wb') as f:
+        for chunk in gzip_chunks(chunks) if args.gzip else chunks:
+            f.write(chunk)
+    print(f"已导出 {len(rows)} 个用户到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()